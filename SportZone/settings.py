@@ -18,7 +18,12 @@ def get_env_variable(var_name, default=None):
 
 SECRET_KEY = get_env_variable('SECRET_KEY', 'your-secret-key-here-change-in-production')
 
-DEBUG = get_env_variable('DEBUG', 'True') == 'True'
+# Производственный профиль (PRODUCTION=True): DEBUG выключен по умолчанию, шаблоны
+# загружаются через кэширующий загрузчик и прогреваются при старте (см. wsgi.py),
+# статика отдается из collectstatic с хэшами в именах файлов.
+PRODUCTION = get_env_variable('PRODUCTION', 'False') == 'True'
+
+DEBUG = get_env_variable('DEBUG', 'False' if PRODUCTION else 'True') == 'True'
 
 ALLOWED_HOSTS = get_env_variable('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
 
@@ -38,6 +43,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'sport_shop.cart.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -48,14 +54,22 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Скомпилированные шаблоны хранятся в памяти процесса; без PRODUCTION
+            # кэш сбрасывается автоперезагрузкой runserver при изменении файлов
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'sport_shop.context_processors.categories_and_settings',
+                'sport_shop.context_processors.cart',
             ],
         },
     },
@@ -63,12 +77,115 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'SportZone.wsgi.application'
 
-DATABASES = {
-    'default': {
+# Профиль базы данных (переменная DB_PROFILE):
+#   sqlite          - SQLite в режиме WAL с прагмами для нескольких процессов (по умолчанию);
+#   sqlite-default  - SQLite без прагм и ожидания блокировок (для сравнения в команде loadtest;
+#                     режим журнала хранится в файле базы и остается прежним);
+#   mysql           - MySQL через mysql-connector с пулом соединений.
+# Соединения постоянные (CONN_MAX_AGE) и проверяются перед повторным использованием.
+DB_PROFILE = get_env_variable('DB_PROFILE', 'sqlite')
+DB_CONN_MAX_AGE = int(get_env_variable('DB_CONN_MAX_AGE', '60'))
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # читатели не блокируют писателя
+    'synchronous': 'NORMAL',  # в режиме WAL безопасно и без fsync на каждый коммит
+    'mmap_size': get_env_variable('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)),
+    'cache_size': get_env_variable('SQLITE_CACHE_SIZE', '-20000'),  # в КиБ, если отрицательное
+    'temp_store': 'MEMORY',
+}
+
+DATABASE_PROFILES = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Блокировка записи берется в начале транзакции, а не при первой записи,
+            # поэтому конкурирующие транзакции ждут (timeout), а не падают с "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': int(get_env_variable('SQLITE_BUSY_TIMEOUT', '20')),
+        },
+    },
+    'sqlite-default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    'mysql': {
+        'ENGINE': 'mysql.connector.django',
+        'NAME': get_env_variable('DB_NAME', 'sportzone'),
+        'USER': get_env_variable('DB_USER', 'sportzone'),
+        'PASSWORD': get_env_variable('DB_PASSWORD', ''),
+        'HOST': get_env_variable('DB_HOST', '127.0.0.1'),
+        'PORT': get_env_variable('DB_PORT', '3306'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'charset': 'utf8mb4',
+            'pool_name': 'sportzone',
+            'pool_size': int(get_env_variable('DB_POOL_SIZE', '5')),
+        },
+    },
+}
+
+if DB_PROFILE not in DATABASE_PROFILES:
+    raise ImproperlyConfigured(f'Неизвестный профиль базы данных DB_PROFILE={DB_PROFILE}')
+
+DATABASES = {
+    'default': DATABASE_PROFILES[DB_PROFILE],
+}
+
+# Кэш (переменная CACHE_BACKEND): locmem (по умолчанию, отдельный в каждом процессе),
+# file, redis, memcached или путь к классу бэкенда (например, заглушка для тестов).
+# Все бэкенды оборачиваются в MetricsCache со счетчиками по пространствам имен.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'sportzone'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'memcached': ('django.core.cache.backends.memcached.PyMemcacheCache', '127.0.0.1:11211'),
 }
+CACHE_BACKEND = get_env_variable('CACHE_BACKEND', 'locmem')
+_cache_backend, _cache_location = CACHE_BACKENDS.get(CACHE_BACKEND, (CACHE_BACKEND, ''))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'sport_shop.cache_backends.MetricsCache',
+        'LOCATION': get_env_variable('CACHE_LOCATION', _cache_location),
+        # Префикс ключей, чтобы разные развертывания не делили общий кэш
+        'KEY_PREFIX': get_env_variable('CACHE_KEY_PREFIX', 'sportzone'),
+        'TIMEOUT': int(get_env_variable('CACHE_TIMEOUT', '300')),
+        'OPTIONS': {
+            'BACKEND': _cache_backend,
+        },
+    },
+}
+
+# Кэш страниц каталога для анонимных посетителей (см. sport_shop/page_cache.py):
+# срок хранения в общем кэше и max-age для браузеров и прокси, в секундах
+PAGE_CACHE_TIMEOUT = int(get_env_variable('PAGE_CACHE_TIMEOUT', '600'))
+PAGE_CACHE_MAX_AGE = int(get_env_variable('PAGE_CACHE_MAX_AGE', '60'))
+
+# Срок хранения счетчиков фасетов каталога для конкретных фильтров, в секундах (см. sport_shop/facets.py)
+FACETS_TIMEOUT = int(get_env_variable('FACETS_TIMEOUT', '600'))
+
+# Фоновые задачи (см. sport_shop/tasks.py). В режиме TASKS_EAGER задачи выполняются
+# сразу после фиксации транзакции в процессе запроса (разработка, тесты); иначе
+# их выполняет воркер: python manage.py run_tasks. Задержки повторов - в секундах.
+TASKS_EAGER = get_env_variable('TASKS_EAGER', 'False' if PRODUCTION else 'True') == 'True'
+TASKS_CONCURRENCY = int(get_env_variable('TASKS_CONCURRENCY', '4'))
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_DELAY = 10
+TASKS_RETRY_MAX_DELAY = 3600
+TASKS_LOCK_TIMEOUT = 600
+TASKS_KEEP_DAYS = 7
+
+# Корзина (см. sport_shop/cart.py): хранилище cookie (подписанная cookie), cache (нужен
+# общий кэш: redis или memcached) или session; ограничения размера корзины
+CART_STORE = get_env_variable('CART_STORE', 'cookie')
+CART_MAX_LINES = int(get_env_variable('CART_MAX_LINES', '50'))
+CART_MAX_QUANTITY = int(get_env_variable('CART_MAX_QUANTITY', '99'))
+CART_TIMEOUT = 30 * 24 * 60 * 60
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -97,6 +214,23 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# В производственном профиле имена файлов статики содержат хэш содержимого
+# (нужен collectstatic), поэтому браузеры могут кэшировать их без срока
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.ManifestStaticFilesStorage' if PRODUCTION
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
+# Компиляция всех шаблонов при запуске приложения (см. sport_shop/template_warmup.py)
+WARM_TEMPLATES = get_env_variable('WARM_TEMPLATES', 'True' if PRODUCTION else 'False') == 'True'
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -109,3 +243,28 @@ LOGOUT_REDIRECT_URL = 'home'
 ACCOUNT_LOGOUT_ON_GET = True
 
 SITE_DOMAIN = get_env_variable('SITE_DOMAIN', 'http://127.0.0.1:8000')
+
+# Клиент API ЮKassa (см. sport_shop/payment_gateway.py): адрес API (для тестов и
+# нагрузочных прогонов - фейковый сервер, команда fake_yookassa), таймауты в секундах
+# и размер пула соединений на один магазин. WEBHOOK_IPS - сети, с которых принимаются
+# уведомления (опубликованы ЮKassa; вне PRODUCTION добавлен localhost для фейкового сервера).
+# TRUSTED_PROXIES - адреса обратных прокси (nginx), от которых принимается X-Forwarded-For
+YOOKASSA_WEBHOOK_IPS = (
+    '185.71.76.0/27,185.71.77.0/27,77.75.153.0/25,77.75.156.11,77.75.156.35,77.75.154.128/25,2a02:5180::/32'
+    + ('' if PRODUCTION else ',127.0.0.1,::1')
+)
+YOOKASSA = {
+    'ENDPOINT': get_env_variable('YOOKASSA_ENDPOINT', 'https://api.yookassa.ru/v3'),
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': float(get_env_variable('YOOKASSA_READ_TIMEOUT', '10')),
+    'POOL_SIZE': 10,
+    'WEBHOOK_IPS': get_env_variable('YOOKASSA_WEBHOOK_IPS', YOOKASSA_WEBHOOK_IPS).split(','),
+    'TRUSTED_PROXIES': get_env_variable('YOOKASSA_TRUSTED_PROXIES', '127.0.0.1,::1').split(','),
+}
+
+# Рейтинг популярности на главной (см. sport_shop/popularity.py)
+POPULARITY = {
+    'TOP_N': 50,
+    'HALF_LIFE_DAYS': 30,
+    'NEUTRAL_RATING': 0.0,
+}
@@ -7,6 +7,7 @@ from sport_shop import views
 urlpatterns = [
     path('admin/', admin_site.urls),
     path('panel/', views.panel_dashboard, name='panel_dashboard'),
+    path('panel/cache-stats/', views.panel_cache_stats, name='panel_cache_stats'),
     path('panel/products/', views.panel_products, name='panel_products'),
     path('panel/products/add/', views.panel_product_edit, name='panel_product_add'),
     path('panel/products/<int:product_id>/edit/', views.panel_product_edit, name='panel_product_edit'),
@@ -1,5 +1,5 @@
 """
-WSGI config for nut_market project.
+WSGI config for SportZone project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
 
@@ -11,6 +11,13 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nut_market.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SportZone.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_TEMPLATES:
+    # Шаблоны компилируются до первого запроса (см. sport_shop/template_warmup.py)
+    from sport_shop.template_warmup import warm_on_startup  # noqa: E402
+    warm_on_startup()
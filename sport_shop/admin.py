@@ -3,8 +3,8 @@ from django.db import models
 from django.forms import Textarea, TextInput
 from django.utils.html import format_html
 from django.shortcuts import get_object_or_404
-from .models import Category, Product, ProductVariant, Order, OrderItem, PaymentMethod, UserProfile, ProductImage, Review, SiteSettings
-from .templatetags.custom_filters import custom_format
+from django.utils import timezone
+from .models import Category, Product, ProductVariant, Order, OrderItem, PaymentMethod, UserProfile, ProductImage, Review, SiteSettings, ProductStats, Task
 from django.urls import path, reverse
 from django.template.response import TemplateResponse
 
@@ -45,8 +45,8 @@ class ProductAdmin(admin.ModelAdmin):
         return custom_urls + urls
 
     def product_preview(self, request, product_id):
-        product = get_object_or_404(Product, id=product_id)
-        formatted_description = custom_format(product.formatted_description())
+        product = get_object_or_404(Product.objects.with_card_data(), id=product_id)
+        formatted_description = product.formatted_description()
         context = {
             'product': product,
             'formatted_description': formatted_description,
@@ -60,13 +60,28 @@ class ProductAdmin(admin.ModelAdmin):
         )
     preview_button.short_description = 'Предпросмотр'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_card_data()
+
     def average_rating(self, obj):
-        reviews = obj.reviews.all()
-        if reviews:
-            return sum(review.rating for review in reviews) / len(reviews)
-        return 0
+        try:
+            return round(obj.stats.avg_rating, 2)
+        except ProductStats.DoesNotExist:
+            return 0
     average_rating.short_description = 'Средний рейтинг'
 
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'key', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    search_fields = ('key',)
+    readonly_fields = ('name', 'args', 'kwargs', 'key', 'attempts', 'locked_at', 'finished_at', 'last_error', 'created_at')
+    actions = ['retry']
+
+    @admin.action(description='Повторить выбранные задачи')
+    def retry(self, request, queryset):
+        count = queryset.exclude(status='running').update(status='pending', attempts=0, run_at=timezone.now(), last_error='')
+        self.message_user(request, f'Задач поставлено в очередь: {count}')
+
 # Регистрация моделей
 admin_site.register(Category)
 admin_site.register(Product, ProductAdmin)
@@ -78,6 +93,7 @@ admin_site.register(UserProfile)
 admin_site.register(ProductImage)
 admin_site.register(Review)
 admin_site.register(SiteSettings)
+admin_site.register(Task, TaskAdmin)
 
 from .models import Discount
 admin_site.register(Discount)
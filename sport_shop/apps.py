@@ -7,6 +7,7 @@ class NutShopConfig(AppConfig):
 
     def ready(self):
         import sport_shop.templatetags.custom_filters
+        import sport_shop.signals
 
 class NutShopAdminConfig(AdminConfig):
     default_site = 'sport_shop.admin.SportShopAdminSite'
@@ -0,0 +1,168 @@
+"""Обертка над бэкендом кэша со счетчиками попаданий, промахов и времени.
+
+Настоящий бэкенд указывается в ``OPTIONS['BACKEND']`` (см. CACHES в
+settings.py), остальные параметры передаются ему без изменений. Счетчики
+ведутся по пространствам имен — части ключа до первого двоеточия (для
+фрагментов шаблонов — имя фрагмента). Каждый процесс копит счетчики
+локально и раз в ``FLUSH_INTERVAL`` секунд добавляет их в общий кэш, откуда
+их читает ``get_metrics()``.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+METRICS_NAMESPACE = 'metrics'
+FIELDS = ('hits', 'misses', 'local_hits', 'microseconds')
+FLUSH_INTERVAL = 10
+
+_counters = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def namespace_of(key):
+    if ':' in key:
+        return key.split(':', 1)[0]
+    if key.startswith('template.cache.'):
+        return '.'.join(key.split('.')[:3])
+    return key.rsplit('.', 1)[0] if '.' in key else key
+
+
+def record(namespace, field, count=1):
+    if namespace == METRICS_NAMESPACE:
+        return
+    with _lock:
+        _counters[namespace][field] += count
+    if time.monotonic() - _last_flush > FLUSH_INTERVAL:
+        flush_metrics()
+
+
+def flush_metrics(alias='default'):
+    """Добавить накопленные счетчики процесса в общий кэш."""
+    global _last_flush
+    with _lock:
+        counters = {namespace: dict(values) for namespace, values in _counters.items()}
+        _counters.clear()
+        _last_flush = time.monotonic()
+    if not counters:
+        return
+
+    cache = caches[alias]
+    namespaces_key = f'{METRICS_NAMESPACE}:namespaces'
+    namespaces = cache.get(namespaces_key) or set()
+    if not set(counters) <= namespaces:
+        cache.set(namespaces_key, namespaces | set(counters), None)
+    for namespace, values in counters.items():
+        for field, value in values.items():
+            if not value:
+                continue
+            key = f'{METRICS_NAMESPACE}:{namespace}:{field}'
+            if not cache.add(key, value, None):
+                try:
+                    cache.incr(key, value)
+                except ValueError:
+                    cache.set(key, value, None)
+
+
+def get_metrics(alias='default'):
+    """Счетчики всех процессов по пространствам имен."""
+    flush_metrics(alias)
+    cache = caches[alias]
+    result = {}
+    for namespace in sorted(cache.get(f'{METRICS_NAMESPACE}:namespaces') or ()):
+        keys = {field: f'{METRICS_NAMESPACE}:{namespace}:{field}' for field in FIELDS}
+        stored = cache.get_many(keys.values())
+        values = {field: stored.get(key, 0) for field, key in keys.items()}
+        lookups = values['hits'] + values['misses']
+        result[namespace] = {
+            'hits': values['hits'],
+            'misses': values['misses'],
+            'local_hits': values['local_hits'],
+            'hit_ratio': round(values['hits'] / lookups, 3) if lookups else None,
+            'avg_ms': round(values['microseconds'] / lookups / 1000, 3) if lookups else None,
+        }
+    return result
+
+
+def reset_metrics(alias='default'):
+    cache = caches[alias]
+    namespaces = cache.get(f'{METRICS_NAMESPACE}:namespaces') or ()
+    cache.delete_many([f'{METRICS_NAMESPACE}:{namespace}:{field}' for namespace in namespaces for field in FIELDS])
+    cache.delete(f'{METRICS_NAMESPACE}:namespaces')
+    with _lock:
+        _counters.clear()
+
+
+class MetricsCache(BaseCache):
+    """Кэш, делегирующий все операции бэкенду из OPTIONS['BACKEND'] и считающий чтения."""
+
+    def __init__(self, location, params):
+        params = dict(params)
+        options = dict(params.get('OPTIONS', {}))
+        backend = options.pop('BACKEND')
+        params['OPTIONS'] = options
+        super().__init__(params)
+        self._cache = import_string(backend)(location, params)
+
+    def _timed_read(self, key, read, is_hit):
+        started = time.perf_counter()
+        value = read()
+        elapsed = int((time.perf_counter() - started) * 1_000_000)
+        namespace = namespace_of(key)
+        record(namespace, 'hits' if is_hit(value) else 'misses')
+        record(namespace, 'microseconds', elapsed)
+        return value
+
+    def get(self, key, default=None, version=None):
+        missing = object()
+        value = self._timed_read(key, lambda: self._cache.get(key, missing, version), lambda v: v is not missing)
+        return default if value is missing else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        started = time.perf_counter()
+        found = self._cache.get_many(keys, version)
+        elapsed = int((time.perf_counter() - started) * 1_000_000)
+        for key in keys:
+            record(namespace_of(key), 'hits' if key in found else 'misses')
+        if keys:
+            record(namespace_of(keys[0]), 'microseconds', elapsed)
+        return found
+
+    def has_key(self, key, version=None):
+        return self._timed_read(key, lambda: self._cache.has_key(key, version), bool)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.add(key, value, timeout, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.set(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.touch(key, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.set_many(data, timeout, version)
+
+    def delete(self, key, version=None):
+        return self._cache.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        return self._cache.delete_many(keys, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self._cache.incr(key, delta, version)
+
+    def decr(self, key, delta=1, version=None):
+        return self._cache.decr(key, delta, version)
+
+    def clear(self):
+        return self._cache.clear()
+
+    def close(self, **kwargs):
+        return self._cache.close(**kwargs)
+
@@ -0,0 +1,77 @@
+"""Вспомогательные функции для версионированных ключей кэша.
+
+Вместо удаления закэшированных данных при изменениях увеличивается номер
+версии пространства имен; старые ключи просто перестают использоваться.
+Поэтому значения можно хранить без срока жизни: после изменения данных
+(сигналы увеличивают версию) они просто перестают читаться.
+"""
+from django.core.cache import cache
+
+from .cache_backends import record
+
+# Локальный кэш процесса поверх общего: {(пространство имен, имя): (версия, значение)}
+_local = {}
+
+
+def version_key(namespace):
+    return f'version:{namespace}'
+
+
+def get_version(namespace):
+    """Текущая версия пространства имен кэша."""
+    key = version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, None)
+        version = cache.get(key, 1)
+    return version
+
+
+def get_versions(namespaces):
+    """Версии нескольких пространств имен одним обращением к кэшу: {namespace: версия}."""
+    keys = {version_key(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(keys)
+    versions = {}
+    for key, namespace in keys.items():
+        if key in found:
+            versions[namespace] = found[key]
+        else:
+            versions[namespace] = get_version(namespace)
+    return versions
+
+
+def bump_version(namespace):
+    """Увеличить версию, сделав недействительными все ключи пространства имен."""
+    key = version_key(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, None)
+        return cache.get(key, 2)
+
+
+def versioned_key(namespace, version, name):
+    return f'{namespace}:{version}:{name}'
+
+
+def cached(namespace, name, loader):
+    """Значение name из пространства имен namespace; при промахе вычисляется loader().
+
+    Сначала проверяется локальный кэш процесса (без десериализации), затем
+    общий кэш. Версия пространства имен читается из общего кэша при каждом
+    вызове, поэтому изменения видны всем процессам сразу.
+    """
+    version = get_version(namespace)
+    local = _local.get((namespace, name))
+    if local is not None and local[0] == version:
+        record(namespace, 'local_hits')
+        return local[1]
+
+    key = versioned_key(namespace, version, name)
+    missing = object()
+    value = cache.get(key, missing)
+    if value is missing:
+        value = loader()
+        cache.set(key, value, None)
+    _local[(namespace, name)] = (version, value)
+    return value
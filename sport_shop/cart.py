@@ -0,0 +1,283 @@
+"""Корзина покупателя.
+
+Корзина — словарь {id варианта: количество}, который хранится в компактном
+виде (строка ``"12:1,57:3"``) в одном из хранилищ (настройка ``CART_STORE``):
+
+    cookie  -- подписанная cookie (по умолчанию): ни одного обращения к базе
+               или кэшу, подпись привязана к пользователю;
+    cache   -- общий кэш (redis, memcached); с locmem корзина видна только
+               одному процессу;
+    session -- сессия, как раньше (запись строки сессии при каждом изменении).
+
+Хранилище читается лениво и записывается только при изменении корзины,
+поэтому страницы, которые показывают лишь количество позиций, ничего не
+пишут. Количество позиций ограничено ``CART_MAX_LINES``, количество одного
+варианта — ``CART_MAX_QUANTITY``.
+
+Все варианты корзины загружаются одним запросом (``in_bulk``) вместе с
+товаром и его статистикой (главное изображение), а устаревшие id
+(удаленные варианты) молча убираются из корзины. Цены позиций — со
+скидками (см. pricing.py).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from . import pricing
+from .models import ProductVariant
+
+SESSION_KEY = 'cart'
+COOKIE_NAME = 'cart'
+CACHE_NAMESPACE = 'cart'
+
+
+class CartError(Exception):
+    """Недопустимое изменение корзины (неверное количество, превышен размер)."""
+
+
+def max_lines():
+    return getattr(settings, 'CART_MAX_LINES', 50)
+
+
+def max_quantity():
+    return getattr(settings, 'CART_MAX_QUANTITY', 99)
+
+
+def parse_quantity(value):
+    """Количество из запроса: целое от 1 до CART_MAX_QUANTITY, иначе CartError."""
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise CartError('Неверное количество товара.')
+    if not 1 <= quantity <= max_quantity():
+        raise CartError(f'Количество товара должно быть от 1 до {max_quantity()}.')
+    return quantity
+
+
+def encode(data):
+    return ','.join(f'{variant_id}:{quantity}' for variant_id, quantity in data.items())
+
+
+def decode(value):
+    """Разобрать сохраненную корзину; поврежденные элементы пропускаются."""
+    if isinstance(value, dict):
+        # Корзины, сохраненные в сессии до перехода на компактный формат
+        items = value.items()
+    elif value:
+        items = (item.partition(':')[::2] for item in str(value).split(','))
+    else:
+        return {}
+    data = {}
+    for variant_id, quantity in items:
+        try:
+            variant_id, quantity = int(variant_id), int(quantity)
+        except (TypeError, ValueError):
+            continue
+        if variant_id > 0 and quantity > 0 and len(data) < max_lines():
+            data[variant_id] = min(quantity, max_quantity())
+    return data
+
+
+class SessionCartStore:
+    def __init__(self, request):
+        self.session = request.session
+
+    def load(self):
+        return self.session.get(SESSION_KEY)
+
+    def save(self, value):
+        self.session[SESSION_KEY] = value
+
+    def apply(self, response):
+        pass
+
+
+class CacheCartStore:
+    """Корзина в общем кэше под ключом пользователя."""
+
+    def __init__(self, request):
+        self.key = f'{CACHE_NAMESPACE}:{request.user.pk}'
+
+    def load(self):
+        return cache.get(self.key)
+
+    def save(self, value):
+        if value:
+            cache.set(self.key, value, getattr(settings, 'CART_TIMEOUT', 30 * 86400))
+        else:
+            cache.delete(self.key)
+
+    def apply(self, response):
+        pass
+
+
+class CookieCartStore:
+    """Корзина в подписанной cookie; записывается в ответ CartMiddleware."""
+
+    def __init__(self, request):
+        self.request = request
+        # Cookie другого пользователя того же браузера не пройдет проверку подписи
+        self.salt = f'sport_shop.cart.{request.user.pk}'
+        self.pending = None
+
+    def load(self):
+        return self.request.get_signed_cookie(COOKIE_NAME, default=None, salt=self.salt)
+
+    def save(self, value):
+        self.pending = value
+
+    def apply(self, response):
+        if self.pending is None:
+            return
+        if self.pending:
+            response.set_signed_cookie(
+                COOKIE_NAME, self.pending, salt=self.salt,
+                max_age=getattr(settings, 'CART_TIMEOUT', 30 * 86400),
+                httponly=True, samesite='Lax', secure=self.request.is_secure(),
+            )
+        else:
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+
+
+STORES = {
+    'session': SessionCartStore,
+    'cache': CacheCartStore,
+    'cookie': CookieCartStore,
+}
+
+
+def store_class():
+    name = getattr(settings, 'CART_STORE', 'cookie')
+    return STORES[name] if name in STORES else import_string(name)
+
+
+class Cart:
+    def __init__(self, store):
+        self.store = store
+        self._data = None
+        self.dropped = 0
+        self._lines = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = decode(self.store.load())
+        return self._data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __bool__(self):
+        return bool(self.data)
+
+    def save(self):
+        self.store.save(encode(self.data))
+        self._lines = None
+
+    def add(self, variant_id, quantity=1):
+        variant_id = int(variant_id)
+        if variant_id not in self.data and len(self.data) >= max_lines():
+            raise CartError(f'В корзине может быть не больше {max_lines()} позиций.')
+        total = self.data.get(variant_id, 0) + quantity
+        if total > max_quantity():
+            raise CartError(f'Количество одного товара в корзине - не больше {max_quantity()}.')
+        self.data[variant_id] = total
+        self.save()
+
+    def set(self, variant_id, quantity):
+        """Заменить количество варианта (позиция добавляется, если ее нет)."""
+        variant_id = int(variant_id)
+        if variant_id not in self.data and len(self.data) >= max_lines():
+            raise CartError(f'В корзине может быть не больше {max_lines()} позиций.')
+        if quantity > max_quantity():
+            raise CartError(f'Количество одного товара в корзине - не больше {max_quantity()}.')
+        self.data[variant_id] = quantity
+        self.save()
+
+    def remove(self, variant_id):
+        try:
+            variant_id = int(variant_id)
+        except (TypeError, ValueError):
+            return
+        if self.data.pop(variant_id, None) is not None:
+            self.save()
+
+    def clear(self):
+        self._data = {}
+        self.save()
+
+    def lines(self):
+        """Позиции корзины: [{'variant', 'quantity', 'price', 'item_total'}], один запрос к базе."""
+        if self._lines is not None:
+            return self._lines
+
+        variants = ProductVariant.objects.select_related('product', 'product__stats').in_bulk(list(self.data))
+
+        lines = []
+        stale = []
+        for variant_id, quantity in self.data.items():
+            variant = variants.get(variant_id)
+            if variant is None:
+                stale.append(variant_id)
+                continue
+            price = pricing.effective_price(variant)
+            lines.append({
+                'variant': variant,
+                'quantity': quantity,
+                'price': price,
+                'item_total': price * Decimal(quantity),
+            })
+
+        if stale:
+            for variant_id in stale:
+                del self.data[variant_id]
+            self.dropped = len(stale)
+            self.save()
+        self._lines = lines
+        return lines
+
+    @property
+    def total(self):
+        return sum((line['item_total'] for line in self.lines()), Decimal('0'))
+
+    def summary(self):
+        """Состояние корзины для JSON API: позиции с ценами со скидкой и итог."""
+        return {
+            'count': len(self.lines()),
+            'total': self.total,
+            'lines': [
+                {
+                    'variant_id': line['variant'].pk,
+                    'product': line['variant'].product.name,
+                    'weight': line['variant'].weight,
+                    'quantity': line['quantity'],
+                    'price': line['price'],
+                    'base_price': line['variant'].price,
+                    'item_total': line['item_total'],
+                }
+                for line in self.lines()
+            ],
+        }
+
+
+def get_cart(request):
+    """Корзина текущего запроса (один объект на запрос)."""
+    if not hasattr(request, '_cart'):
+        request._cart = Cart(store_class()(request))
+    return request._cart
+
+
+class CartMiddleware:
+    """Записывает измененную корзину в ответ (для хранилища cookie)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        cart = getattr(request, '_cart', None)
+        if cart is not None:
+            cart.store.apply(response)
+        return response
@@ -1,28 +1,53 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import caching
 from .models import Category, SiteSettings
-from django.core.cache import cache
+from .cart import get_cart
+
+CATEGORIES_NAMESPACE = 'categories'
+SITE_SETTINGS_NAMESPACE = 'site_settings'
+
+
+def load_categories():
+    """Категории для меню: простые словари, а не экземпляры моделей."""
+    return list(Category.objects.values('id', 'name'))
+
+
+def active_category_id(request):
+    """id категории из ?category=, если такая категория есть, иначе None."""
+    category_id = request.GET.get('category', '')
+    if not category_id.isdigit():
+        return None
+    # Проверка по первичному ключу: список категорий меню при этом не загружается
+    category_id = int(category_id)
+    return category_id if Category.objects.filter(pk=category_id).exists() else None
 
 
 def categories_and_settings(request):
     """
     Контекстный процессор для категорий и настроек сайта.
     
-    Примечание: Для улучшения производительности можно использовать кэширование:
-    - Категории кэшируются на 1 час (они редко меняются)
-    - Логотип кэшируется на 1 час
+    Данные кэшируются без срока жизни под версионированными ключами
+    (см. caching.py); версии увеличиваются сигналами при изменении
+    категорий и настроек сайта (см. signals.py). Меню категорий в base.html
+    кэшируется фрагментом по categories_version, поэтому список категорий
+    загружается лениво - только при промахе кэша фрагмента.
+
+    Активная категория меню входит в ключ фрагмента, поэтому это id
+    существующей категории или None, а не произвольный параметр запроса;
+    она проверяется отдельным запросом по первичному ключу.
     """
-    # Кэшируем категории на 1 час (3600 секунд)
-    categories = cache.get('all_categories')
-    if categories is None:
-        categories = list(Category.objects.all())
-        cache.set('all_categories', categories, 3600)
-    
-    # Кэшируем логотип на 1 час
-    logo_url = cache.get('site_logo_url')
-    if logo_url is None:
-        logo_url = SiteSettings.get_logo()
-        cache.set('site_logo_url', logo_url, 3600)
-    
+    categories = SimpleLazyObject(lambda: caching.cached(CATEGORIES_NAMESPACE, 'menu', load_categories))
     return {
         'categories': categories,
-        'logo_url': logo_url
+        'categories_version': caching.get_version(CATEGORIES_NAMESPACE),
+        'active_category_id': active_category_id(request),
+        'logo': caching.cached(SITE_SETTINGS_NAMESPACE, 'logo', SiteSettings.get_logo),
     }
+
+
+def cart(request):
+    """Количество позиций корзины для значка в шапке (без запросов к базе)."""
+    if not request.user.is_authenticated:
+        return {'cart_count': 0}
+    return {'cart_count': len(get_cart(request))}
@@ -0,0 +1,105 @@
+"""Фасеты боковой панели фильтров каталога.
+
+Границы цены (минимальная цена товара со скидкой, см. ProductStats) и веса
+вариантов считаются сразу для всех категорий двумя запросами с GROUP BY и
+хранятся в кэше под версионированным ключом (см. caching.py); общие границы
+каталога получаются из границ категорий без обращения к базе.
+
+Количество товаров по категориям и по порогам рейтинга зависит от текущих
+фильтров, поэтому кэшируется по нормализованным параметрам запроса с
+ограниченным сроком жизни (``FACETS_TIMEOUT``). Версия пространства имен
+``facets`` увеличивается сигналами при изменении товаров, вариантов,
+отзывов, категорий и скидок (см. signals.py).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+
+from . import caching
+from .models import ProductStats, ProductVariant
+
+NAMESPACE = 'facets'
+RATING_BUCKETS = (4, 3, 2)
+# Параметры запроса, от которых зависят счетчики (страница и сортировка - нет)
+FILTER_PARAMS = ('query', 'category', 'min_price', 'max_price', 'min_weight', 'max_weight', 'min_rating')
+
+
+def load_ranges():
+    """Границы цены и веса: {id категории или None (весь каталог): {...}}."""
+    ranges = {}
+
+    def bounds(category_id):
+        return ranges.setdefault(category_id, dict.fromkeys(('min_price', 'max_price', 'min_weight', 'max_weight')))
+
+    prices = ProductStats.objects.order_by().values('product__category_id').annotate(
+        low=Min('min_effective_price'), high=Max('min_effective_price'),
+    )
+    for row in prices:
+        entry = bounds(row['product__category_id'])
+        entry['min_price'], entry['max_price'] = row['low'], row['high']
+
+    weights = ProductVariant.objects.order_by().values('product__category_id').annotate(
+        low=Min('weight'), high=Max('weight'),
+    )
+    for row in weights:
+        entry = bounds(row['product__category_id'])
+        entry['min_weight'], entry['max_weight'] = row['low'], row['high']
+
+    total = {}
+    for field, pick in (('min_price', min), ('max_price', max), ('min_weight', min), ('max_weight', max)):
+        values = [entry[field] for entry in ranges.values() if entry[field] is not None]
+        total[field] = pick(values) if values else None
+    ranges[None] = total
+    return ranges
+
+
+def get_ranges(category_id=None):
+    """Границы цены и веса для категории (или всего каталога)."""
+    ranges = caching.cached(NAMESPACE, 'ranges', load_ranges)
+    try:
+        category_id = int(category_id) if category_id else None
+    except (TypeError, ValueError):
+        category_id = None
+    return ranges.get(category_id) or ranges[None]
+
+
+def _counts_key(params):
+    normalized = sorted((name, str(params.get(name) or '')) for name in FILTER_PARAMS if params.get(name))
+    digest = hashlib.md5(repr(normalized).encode()).hexdigest()
+    return caching.versioned_key(NAMESPACE, caching.get_version(NAMESPACE), f'counts:{digest}')
+
+
+def get_counts(products, params):
+    """Счетчики для текущих фильтров: {'categories': {id: n}, 'ratings': {порог: n}}.
+
+    products - товары со всеми фильтрами, кроме категории и рейтинга, с
+    аннотацией avg_rating; счетчик категорий учитывает фильтр рейтинга, а
+    счетчики рейтинга - фильтр категории, как это принято для фасетов.
+    """
+    key = _counts_key(params)
+    counts = cache.get(key)
+    if counts is not None:
+        return counts
+
+    by_category = products.order_by()
+    if params.get('min_rating'):
+        by_category = by_category.filter(avg_rating__gte=params['min_rating'])
+    by_rating = products.order_by()
+    if params.get('category'):
+        by_rating = by_rating.filter(category_id=params['category'])
+
+    ratings = by_rating.aggregate(**{
+        f'rating_{bucket}': Count('pk', filter=Q(avg_rating__gte=bucket)) for bucket in RATING_BUCKETS
+    })
+    counts = {
+        'categories': dict(by_category.values('category_id').annotate(count=Count('pk')).values_list('category_id', 'count')),
+        'ratings': {str(bucket): ratings[f'rating_{bucket}'] for bucket in RATING_BUCKETS},
+    }
+    cache.set(key, counts, getattr(settings, 'FACETS_TIMEOUT', 600))
+    return counts
+
+
+def invalidate():
+    caching.bump_version(NAMESPACE)
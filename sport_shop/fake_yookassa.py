@@ -0,0 +1,210 @@
+"""Локальный фейковый сервер API ЮKassa для тестов и нагрузочных прогонов.
+
+Поддерживает то, чем пользуется магазин (см. payment_gateway.py):
+
+    POST /v3/payments        -- создать платеж (нужен заголовок Idempotence-Key;
+                                повтор с тем же ключом возвращает тот же платеж);
+    GET  /v3/payments/<id>   -- получить платеж;
+    GET  /v3/payments        -- список платежей (created_at.gte, status, limit, cursor);
+    GET  /checkout/<id>      -- "страница оплаты": платеж становится succeeded
+                                (canceled с параметром ?cancel=1), покупатель
+                                перенаправляется на return_url.
+
+Если задан ``webhook_url``, при смене статуса платежа магазину отправляется
+уведомление, как это делает ЮKassa.
+
+Задержка ответа (``latency``) и доля ответов 500 (``failure_rate``)
+позволяют проверить таймауты и повторы. Запуск: команда ``fake_yookassa``
+и переменная ``YOOKASSA_ENDPOINT=http://127.0.0.1:8765/v3`` у магазина;
+в тестах — ``start_server()`` в отдельном потоке.
+"""
+import base64
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeYooKassa:
+    """Состояние сервера: платежи и использованные ключи идемпотентности."""
+
+    def __init__(self, base_url, latency=0, failure_rate=0, webhook_url=None):
+        self.base_url = base_url
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.webhook_url = webhook_url
+        self.payments = {}
+        self.idempotence_keys = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def create_payment(self, shop_id, key, params):
+        with self.lock:
+            if (shop_id, key) in self.idempotence_keys:
+                return self.payments[self.idempotence_keys[shop_id, key]]
+            payment_id = str(uuid.uuid4())
+            payment = {
+                'id': payment_id,
+                'status': 'pending',
+                'paid': False,
+                'amount': params.get('amount'),
+                'description': params.get('description', ''),
+                'metadata': params.get('metadata', {}),
+                'created_at': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+                'confirmation': {
+                    'type': 'redirect',
+                    'return_url': params.get('confirmation', {}).get('return_url', ''),
+                    'confirmation_url': f'{self.base_url}/checkout/{payment_id}',
+                },
+                'test': True,
+                'shop_id': shop_id,
+            }
+            self.payments[payment_id] = payment
+            self.idempotence_keys[shop_id, key] = payment_id
+            return payment
+
+    def set_status(self, payment_id, status):
+        with self.lock:
+            payment = self.payments[payment_id]
+            payment['status'] = status
+            payment['paid'] = status == 'succeeded'
+        if self.webhook_url:
+            threading.Thread(target=self.notify, args=(f'payment.{status}', dict(payment)), daemon=True).start()
+        return payment
+
+    def notify(self, event, payment):
+        body = json.dumps({'type': 'notification', 'event': event, 'object': payment}).encode()
+        request = urllib.request.Request(self.webhook_url, body, {'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=5).close()
+        except OSError:
+            pass
+
+    def list_payments(self, shop_id, query):
+        """Страница списка платежей магазина в порядке создания."""
+        limit = min(int(query.get('limit', 10)), 100)
+        offset = int(query.get('cursor', 0))
+        with self.lock:
+            items = [
+                payment for payment in self.payments.values()
+                if payment['shop_id'] == shop_id
+                and payment['created_at'] >= query.get('created_at.gte', '')
+                and payment['status'] == query.get('status', payment['status'])
+            ]
+        page = {'type': 'list', 'items': items[offset:offset + limit]}
+        if offset + limit < len(items):
+            page['next_cursor'] = str(offset + limit)
+        return page
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = 'FakeYooKassa/1.0'
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, code, description):
+        self.send_json(status, {'type': 'error', 'code': code, 'description': description})
+
+    def shop_id(self):
+        """shop_id из Basic-авторизации (пароль не проверяется)."""
+        header = self.headers.get('Authorization', '')
+        if not header.startswith('Basic '):
+            return None
+        try:
+            return base64.b64decode(header[6:]).decode().partition(':')[0] or None
+        except ValueError:
+            return None
+
+    def simulate(self):
+        """Задержка и случайный отказ; True, если ответ уже отправлен."""
+        with self.state.lock:
+            self.state.requests += 1
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.failure_rate and random.random() < self.state.failure_rate:
+            self.send_error_json(500, 'internal_server_error', 'Simulated failure')
+            return True
+        return False
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v3/payments':
+            return self.send_error_json(404, 'not_found', 'Unknown endpoint')
+        shop_id = self.shop_id()
+        if shop_id is None:
+            return self.send_error_json(401, 'invalid_credentials', 'Authentication required')
+        key = self.headers.get('Idempotence-Key')
+        if not key:
+            return self.send_error_json(400, 'invalid_request', 'Idempotence-Key header is required')
+        try:
+            params = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        except ValueError:
+            return self.send_error_json(400, 'invalid_request', 'Invalid JSON')
+        if self.simulate():
+            return
+        self.send_json(200, self.state.create_payment(shop_id, key, params))
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path.rstrip('/') == '/v3/payments':
+            shop_id = self.shop_id()
+            if shop_id is None:
+                return self.send_error_json(401, 'invalid_credentials', 'Authentication required')
+            if self.simulate():
+                return
+            return self.send_json(200, self.state.list_payments(shop_id, query))
+
+        match = re.fullmatch(r'/v3/payments/([\w-]+)', url.path)
+        if match:
+            if self.shop_id() is None:
+                return self.send_error_json(401, 'invalid_credentials', 'Authentication required')
+            if self.simulate():
+                return
+            payment = self.state.payments.get(match.group(1))
+            if payment is None:
+                return self.send_error_json(404, 'not_found', 'Payment not found')
+            return self.send_json(200, payment)
+
+        match = re.fullmatch(r'/checkout/([\w-]+)', url.path)
+        if match and match.group(1) in self.state.payments:
+            payment = self.state.set_status(match.group(1), 'canceled' if query.get('cancel') else 'succeeded')
+            self.send_response(302)
+            self.send_header('Location', payment['confirmation']['return_url'])
+            self.end_headers()
+            return
+        self.send_error_json(404, 'not_found', 'Unknown endpoint')
+
+
+def make_server(host='127.0.0.1', port=8765, latency=0, failure_rate=0, webhook_url=None):
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.state = FakeYooKassa(f'http://{host}:{server.server_port}', latency, failure_rate, webhook_url)
+    return server
+
+
+def start_server(**kwargs):
+    """Запустить сервер в фоновом потоке (порт 0 - любой свободный). Возвращает сервер;
+    адрес API для настройки YOOKASSA['ENDPOINT'] - server.state.base_url + '/v3'."""
+    kwargs.setdefault('port', 0)
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
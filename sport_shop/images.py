@@ -0,0 +1,252 @@
+"""Производные изображения (renditions) для товаров, аватаров и логотипа.
+
+После загрузки изображения (сигналы, см. signals.py) в очередь фоновых
+задач (см. tasks.py) ставится обработка:
+
+* оригинал поворачивается по EXIF Orientation и перезаписывается без
+  метаданных EXIF (координаты съемки, модель камеры и т.п.);
+* в модель записываются ширина и высота оригинала;
+* для каждого пресета из ``PRESETS`` создаются уменьшенные копии в форматах
+  AVIF и WebP (если их поддерживает сборка Pillow) и в исходном формате
+  (JPEG или PNG).
+
+Имена производных файлов однозначно получаются из имени оригинала, пресета
+и размера, поэтому шаблонам не нужны запросы к базе: тег ``{% picture %}``
+(см. templatetags/custom_filters.py) выводит ``<picture>`` с ``srcset`` и
+атрибутами width/height, а пока производные не готовы — обычный ``<img>``
+с оригиналом. Производные готовы, когда в модели записаны размеры
+оригинала: их сохраняет задача после создания всех файлов, а при замене
+файла они сбрасываются вместе с удалением прежних производных (см.
+signals.py). Поэтому при выводе хранилище не проверяется. Команда
+``generate_renditions`` создает производные для уже загруженных
+изображений.
+"""
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+from PIL import Image, ImageOps, features
+
+from . import caching, page_cache, stats, tasks
+from .context_processors import SITE_SETTINGS_NAMESPACE
+
+RENDITIONS_DIR = 'renditions'
+
+# sizes - размеры для плотностей 1x и 2x; crop - обрезать до точного размера,
+# иначе вписать в прямоугольник без увеличения; media_sizes - атрибут sizes
+# (тогда srcset строится по ширине, а не по плотности)
+PRESETS = {
+    'card': {'sizes': [(320, 240), (640, 480)], 'crop': True, 'media_sizes': '(max-width: 576px) 100vw, 320px'},
+    'thumb': {'sizes': [(100, 100), (200, 200)], 'crop': True},
+    'large': {'sizes': [(800, 800), (1600, 1600)], 'crop': False, 'media_sizes': '(max-width: 768px) 100vw, 50vw'},
+    'avatar': {'sizes': [(50, 50), (100, 100)], 'crop': True},
+    'logo': {'sizes': [(200, 50), (400, 100)], 'crop': False},
+}
+
+# Модель -> (поле изображения, поле ширины, поле высоты, пресеты)
+TARGETS = {
+    'sport_shop.ProductImage': ('image', 'width', 'height', ('card', 'thumb', 'large')),
+    'sport_shop.UserProfile': ('avatar', 'avatar_width', 'avatar_height', ('avatar',)),
+    'sport_shop.SiteSettings': ('logo', 'logo_width', 'logo_height', ('logo',)),
+}
+
+# Модель -> (поле изображения, поле ширины, поле высоты): откуда тег picture
+# берет размеры оригинала; ProductStats хранит копию главного изображения товара
+DIMENSION_FIELDS = {
+    **{label: target[:3] for label, target in TARGETS.items()},
+    'sport_shop.ProductStats': ('main_image', 'main_image_width', 'main_image_height'),
+}
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+SAVE_OPTIONS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 80, 'method': 4},
+    'jpg': {'quality': 85, 'optimize': True, 'progressive': True},
+    'png': {'optimize': True},
+}
+PIL_FORMATS = {'avif': 'AVIF', 'webp': 'WEBP', 'jpg': 'JPEG', 'png': 'PNG'}
+
+
+def modern_formats():
+    """Дополнительные форматы, которые умеет записывать установленный Pillow."""
+    return [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+
+
+def fallback_format(name):
+    """Формат для браузеров без AVIF/WebP: PNG для прозрачных форматов, иначе JPEG."""
+    return 'png' if os.path.splitext(name)[1].lower() in ('.png', '.gif', '.webp') else 'jpg'
+
+
+def rendition_name(name, preset, size, fmt):
+    stem = os.path.splitext(name)[0]
+    return f'{RENDITIONS_DIR}/{stem}.{preset}-{size[0]}x{size[1]}.{fmt}'
+
+
+def fit_size(width, height, box):
+    """Размер изображения width x height, вписанного в box без увеличения."""
+    scale = min(1, box[0] / width, box[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def output_size(preset, box, width=None, height=None):
+    """Фактический размер производного файла (None, если размер оригинала неизвестен)."""
+    if PRESETS[preset]['crop']:
+        return box
+    if width and height:
+        return fit_size(width, height, box)
+    return None
+
+
+def stored_size(image):
+    """Размеры оригинала из модели, которой принадлежит FieldFile image; (None, None), пока он не обработан."""
+    instance = getattr(image, 'instance', None)
+    fields = DIMENSION_FIELDS.get(instance._meta.label) if instance is not None else None
+    if fields is None or image.field.name != fields[0]:
+        return None, None
+    return getattr(instance, fields[1]), getattr(instance, fields[2])
+
+
+def _save(image, name, fmt):
+    if fmt == 'jpg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, PIL_FORMATS[fmt], **SAVE_OPTIONS[fmt])
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def strip_metadata(name):
+    """Повернуть оригинал по EXIF и перезаписать его без EXIF. Возвращает изображение."""
+    with default_storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image.load()
+    pil_format = image.format
+    if not image.getexif():
+        return image
+    image = ImageOps.exif_transpose(image)
+    image.info.pop('exif', None)
+    buffer = BytesIO()
+    options = {'quality': 90} if pil_format == 'JPEG' else {}
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.save(buffer, pil_format, **options)
+    with default_storage.open(name, 'wb') as target:
+        target.write(buffer.getvalue())
+    return image
+
+
+def generate(name, presets):
+    """Создать производные оригинала name. Возвращает (ширина, высота) оригинала."""
+    image = strip_metadata(name)
+    formats = modern_formats() + [fallback_format(name)]
+    for preset in presets:
+        spec = PRESETS[preset]
+        for box in spec['sizes']:
+            if spec['crop']:
+                resized = ImageOps.fit(image, box, Image.Resampling.LANCZOS)
+            else:
+                resized = image.resize(fit_size(image.width, image.height, box), Image.Resampling.LANCZOS)
+            for fmt in formats:
+                _save(resized, rendition_name(name, preset, box, fmt), fmt)
+    return image.width, image.height
+
+
+def delete_renditions(name, presets):
+    for preset in presets:
+        for box in PRESETS[preset]['sizes']:
+            for fmt in ('avif', 'webp', fallback_format(name)):
+                rendition = rendition_name(name, preset, box, fmt)
+                if default_storage.exists(rendition):
+                    default_storage.delete(rendition)
+
+
+def process(label, pk, force=False):
+    """Обработать изображение объекта модели label. Возвращает True, если файлы созданы."""
+    model = apps.get_model(label)
+    field, width_field, height_field, presets = TARGETS[label]
+    instance = model.objects.filter(pk=pk).first()
+    name = getattr(instance, field).name if instance is not None else None
+    if not name or not default_storage.exists(name):
+        return False
+    if not force and getattr(instance, width_field):
+        return False
+
+    width, height = generate(name, presets)
+    # Условие по имени: файл могли заменить, пока шла обработка
+    model.objects.filter(pk=pk, **{field: name}).update(**{width_field: width, height_field: height})
+    _after_process(label, instance)
+    return True
+
+
+def _after_process(label, instance):
+    """Сбросить кэши, в которых изображение могло попасть без производных."""
+    if label == 'sport_shop.ProductImage':
+        # Пересчет статистики меняет ProductStats.updated_at - ключ фрагмента карточки
+        stats.refresh_product_stats(instance.product_id)
+        page_cache.purge_products([instance.product_id])
+    elif label == 'sport_shop.SiteSettings':
+        caching.bump_version(SITE_SETTINGS_NAMESPACE)
+        page_cache.purge_all()
+
+
+def schedule(label, pk):
+    """Поставить обработку изображения в очередь фоновых задач."""
+    tasks.enqueue('sport_shop.images.process', args=[label, pk], key=f'images:{label}:{pk}')
+
+
+def picture(image, preset, alt='', css_class='', width=None, height=None, lazy=True):
+    """HTML-разметка ``<picture>`` для изображения (FieldFile или имя файла).
+
+    Размеры оригинала width и height берутся из модели FieldFile, если не
+    переданы; без них производные считаются неготовыми.
+    """
+    name = getattr(image, 'name', image) or ''
+    if not name:
+        return ''
+    if not width:
+        width, height = stored_size(image)
+    spec = PRESETS[preset]
+    loading = 'lazy' if lazy else 'eager'
+    class_attr = format_html(' class="{}"', css_class) if css_class else ''
+    first = output_size(preset, spec['sizes'][0], width, height)
+
+    if not width:
+        return format_html(
+            '<img src="{}" alt="{}"{}{} loading="{}" decoding="async">',
+            default_storage.url(name), alt, class_attr, _dimensions(first), loading,
+        )
+
+    media_sizes = spec.get('media_sizes')
+    by_width = bool(media_sizes) and all(output_size(preset, box, width, height) for box in spec['sizes'])
+
+    def srcset(fmt):
+        candidates = []
+        for density, box in enumerate(spec['sizes'], start=1):
+            descriptor = f'{output_size(preset, box, width, height)[0]}w' if by_width else f'{density}x'
+            candidates.append(f'{default_storage.url(rendition_name(name, preset, box, fmt))} {descriptor}')
+        return ', '.join(candidates)
+
+    sizes_attr = format_html(' sizes="{}"', media_sizes) if by_width else ''
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}"{}>',
+        ((MIME_TYPES[fmt], srcset(fmt), sizes_attr) for fmt in modern_formats()),
+    )
+    fallback = fallback_format(name)
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}"{} alt="{}"{}{} loading="{}" decoding="async"></picture>',
+        sources,
+        default_storage.url(rendition_name(name, preset, spec['sizes'][0], fallback)),
+        srcset(fallback), sizes_attr, alt, class_attr, _dimensions(first), loading,
+    )
+
+
+def _dimensions(size):
+    if not size:
+        return ''
+    return format_html(' width="{}" height="{}"', size[0], size[1])
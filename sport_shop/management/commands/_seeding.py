@@ -0,0 +1,83 @@
+"""Генерация синтетического каталога и заказов для команд-бенчмарков."""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from sport_shop.models import Category, Order, OrderItem, Product, ProductVariant, Review
+
+WORDS = ['Протеин', 'Гейнер', 'Креатин', 'Гантели', 'Коврик', 'Эспандер', 'Шейкер', 'Перчатки', 'Скакалка', 'Батончик']
+WEIGHTS = [250, 500, 1000, 2000, 5000]
+
+
+def seed_catalog(products, categories=20, variants_per_product=3, reviews_per_product=2, batch_size=5000, rng=None):
+    """Создать каталог из products товаров с вариантами и отзывами (bulk_create, без сигналов)."""
+    rng = rng or random.Random(42)
+    category_objs = Category.objects.bulk_create(
+        [Category(name=f'Категория {i}') for i in range(categories)]
+    )
+    reviewer, _ = User.objects.get_or_create(username='bench_reviewer')
+
+    created = []
+    for start in range(0, products, batch_size):
+        chunk = [
+            Product(
+                name=f'{rng.choice(WORDS)} {i}',
+                description=f'Описание товара {i}',
+                category=rng.choice(category_objs),
+            )
+            for i in range(start, min(start + batch_size, products))
+        ]
+        for product in chunk:
+            product.render_description()
+        chunk = Product.objects.bulk_create(chunk)
+        ProductVariant.objects.bulk_create([
+            ProductVariant(product=product, weight=weight, price=Decimal(rng.randint(100, 10000)))
+            for product in chunk
+            for weight in rng.sample(WEIGHTS, variants_per_product)
+        ], batch_size=batch_size)
+        Review.objects.bulk_create([
+            Review(product=product, user=reviewer, rating=rng.randint(1, 5), text='Отзыв')
+            for product in chunk
+            for _ in range(reviews_per_product)
+        ], batch_size=batch_size)
+        created.extend(product.pk for product in chunk)
+    return created
+
+
+def seed_orders(count, items_per_order=2, users=100, days=365, batch_size=5000, rng=None):
+    """Создать count заказов, распределенных по последним days дням."""
+    rng = rng or random.Random(42)
+    user_objs = [
+        User.objects.get_or_create(username=f'bench_user_{i}')[0]
+        for i in range(users)
+    ]
+    variant_ids = list(ProductVariant.objects.values_list('pk', flat=True))
+    statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+    now = timezone.now()
+
+    for start in range(0, count, batch_size):
+        size = min(batch_size, count - start)
+        orders = Order.objects.bulk_create([
+            Order(
+                user=rng.choice(user_objs),
+                total_price=Decimal(rng.randint(500, 20000)),
+                status=rng.choice(statuses),
+                full_name='Бенчмарк',
+                address='Москва',
+                is_completed=rng.random() < 0.5,
+            )
+            for _ in range(size)
+        ])
+        # created_at с auto_now_add нельзя задать при создании, поэтому раскладываем даты отдельно
+        for order in orders:
+            order.created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+        Order.objects.bulk_update(orders, ['created_at'], batch_size=1000)
+        if variant_ids:
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_variant_id=rng.choice(variant_ids), quantity=rng.randint(1, 3), price=Decimal(1000))
+                for order in orders
+                for _ in range(items_per_order)
+            ], batch_size=batch_size)
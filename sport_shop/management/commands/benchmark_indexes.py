@@ -0,0 +1,108 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from sport_shop.models import Discount, Order, Product, ProductImage, ProductVariant, Review
+
+from ._seeding import seed_catalog, seed_orders
+
+INDEXED_MODELS = [Order, Review, ProductVariant, ProductImage, Discount]
+
+
+def hot_queries(user, product):
+    """Запросы с горячих страниц: (название, queryset, функция выполнения)."""
+    now = timezone.now()
+    week_ago = now - timedelta(days=7)
+    return [
+        ('заказы пользователя', Order.objects.filter(user=user, status='delivered', is_completed=True), lambda qs: qs.exists()),
+        ('заказы за 7 дней', Order.objects.filter(created_at__gte=week_ago), lambda qs: qs.count()),
+        ('выручка за 7 дней', Order.objects.filter(created_at__gte=week_ago, is_completed=True), lambda qs: qs.aggregate(Sum('total_price'))),
+        ('последние заказы', Order.objects.order_by('-created_at')[:10], list),
+        ('фильтр по статусу', Order.objects.filter(status='processing').order_by('-created_at')[:20], list),
+        ('отзыв пользователя', Review.objects.filter(user=user, product=product), lambda qs: qs.exists()),
+        ('самый дешевый вариант', ProductVariant.objects.filter(product=product).order_by('price')[:1], list),
+        ('главное изображение', ProductImage.objects.filter(product=product).order_by('order')[:1], list),
+        ('активные скидки', Discount.objects.filter(is_active=True, start_date__lte=now, end_date__gte=now), list),
+    ]
+
+
+def explain(queryset, phase):
+    if connection.vendor != 'sqlite':
+        return queryset.explain()
+    # sqlite3 кэширует подготовленные выражения по тексту SQL, и план EXPLAIN
+    # не перестраивается после DROP INDEX, поэтому текст запроса уникален для этапа
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql} /* {phase} */', params)
+        return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает планы и время горячих запросов с составными индексами и без них '
+        'на синтетической базе заказов. Данные создаются в транзакции и откатываются; '
+        'индексы удаляются внутри той же транзакции, поэтому нужна СУБД с транзакционным DDL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000000, help='Количество заказов')
+        parser.add_argument('--products', type=int, default=5000, help='Количество товаров')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов каждого запроса')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_rollback_ddl:
+            raise CommandError('СУБД не поддерживает откат DDL в транзакции; запустите бенчмарк на SQLite.')
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            seed_catalog(options['products'])
+            seed_orders(options['orders'])
+            self.stdout.write(
+                f'Создано {options["orders"]} заказов и {options["products"]} товаров '
+                f'за {time.perf_counter() - started:.1f} с'
+            )
+
+            if connection.vendor in ('sqlite', 'postgresql'):
+                # Статистика для планировщика, иначе выбор индекса зависит от эвристик
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+
+            order = Order.objects.order_by('?').first()
+            product = Product.objects.order_by('?').first()
+            queries = hot_queries(order.user, product)
+
+            with_indexes = self.measure(queries, options['repeat'], 'С индексами')
+            # schema_editor в SQLite нельзя открыть внутри транзакции, поэтому DROP INDEX напрямую
+            with connection.cursor() as cursor:
+                for model in INDEXED_MODELS:
+                    for index in model._meta.indexes:
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+            without_indexes = self.measure(queries, options['repeat'], 'Без индексов')
+
+            self.stdout.write('\nИтог (мс, лучшее из повторов):')
+            for name, _, _ in queries:
+                before, after = without_indexes[name], with_indexes[name]
+                speedup = before / after if after else float('inf')
+                self.stdout.write(f'  {name:<24} {before:9.2f} -> {after:9.2f}  x{speedup:.1f}')
+
+            transaction.set_rollback(True)
+
+    def measure(self, queries, repeat, title):
+        self.stdout.write(f'\n=== {title} ===')
+        timings = {}
+        for name, queryset, run in queries:
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run(queryset.all())
+                elapsed = (time.perf_counter() - started) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+            self.stdout.write(f'{name:<24} {best:9.2f} мс')
+            for line in explain(queryset, title).splitlines():
+                self.stdout.write(f'    {line}')
+        return timings
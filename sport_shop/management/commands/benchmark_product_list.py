@@ -0,0 +1,89 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Min
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from sport_shop.models import Product
+from sport_shop.search import get_backend
+from sport_shop.stats import rebuild_product_stats
+
+from ._seeding import seed_catalog
+
+SCENARIOS = [
+    ('каталог', {}),
+    ('цена по возрастанию', {'sort_by': 'price_asc'}),
+    ('популярность', {'sort_by': 'popularity'}),
+    ('фильтры', {'min_price': '500', 'max_price': '5000', 'min_rating': '3', 'min_weight': '500', 'max_weight': '2000'}),
+    ('поиск', {'query': 'Протеин'}),
+    ('последняя страница', {'sort_by': 'price_desc', 'page': '1000000'}),
+]
+
+
+def legacy_queryset():
+    """Прежний запрос каталога: GROUP BY по JOIN вариантов, отзывов и позиций заказов."""
+    return Product.objects.annotate(
+        min_price=Min('variants__price'),
+        avg_rating=Avg('reviews__rating'),
+        order_count=Count('variants__orderitems'),
+    ).order_by('min_price')
+
+
+class Command(BaseCommand):
+    help = (
+        'Регрессионный бенчмарк страницы каталога на синтетическом каталоге. '
+        'Данные создаются в транзакции и откатываются после замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50000, help='Количество товаров в каталоге')
+        parser.add_argument('--repeat', type=int, default=3, help='Повторов каждого сценария (выводится медиана времени и наибольшее число запросов)')
+        parser.add_argument('--max-ms', type=float, default=0, help='Порог времени ответа, мс (0 - без проверки)')
+        parser.add_argument('--max-queries', type=int, default=10, help='Порог количества SQL-запросов на страницу')
+        parser.add_argument('--legacy', action='store_true', help='Также замерить прежний запрос с GROUP BY')
+
+    def handle(self, *args, **options):
+        failures = []
+        with transaction.atomic():
+            started = time.perf_counter()
+            seed_catalog(options['products'])
+            rebuild_product_stats()
+            get_backend().rebuild()
+            self.stdout.write(f'Каталог из {options["products"]} товаров создан за {time.perf_counter() - started:.1f} с')
+
+            client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            # Кэш страниц отключен: иначе все повторы, кроме первого, - попадания в кэш
+            with override_settings(PAGE_CACHE_TIMEOUT=0):
+                for name, params in SCENARIOS:
+                    timings = []
+                    query_counts = []
+                    for _ in range(options['repeat']):
+                        with CaptureQueriesContext(connection) as queries:
+                            started = time.perf_counter()
+                            response = client.get('/products/', params)
+                            timings.append((time.perf_counter() - started) * 1000)
+                        query_counts.append(len(queries))
+                        if response.status_code != 200:
+                            raise CommandError(f'{name}: ответ {response.status_code}')
+                    median = statistics.median(timings)
+                    most_queries = max(query_counts)
+                    self.stdout.write(f'{name:<22} {median:9.1f} мс  {most_queries:3d} запросов')
+                    if options['max_ms'] and median > options['max_ms']:
+                        failures.append(f'{name}: {median:.1f} мс > {options["max_ms"]} мс')
+                    if most_queries > options['max_queries']:
+                        failures.append(f'{name}: {most_queries} запросов > {options["max_queries"]}')
+
+            if options['legacy']:
+                started = time.perf_counter()
+                list(legacy_queryset()[:12])
+                self.stdout.write(f'{"прежний GROUP BY":<22} {(time.perf_counter() - started) * 1000:9.1f} мс')
+
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError('Регрессия производительности:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Бенчмарк пройден.'))
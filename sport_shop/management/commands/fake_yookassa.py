@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from sport_shop.fake_yookassa import make_server
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает локальный фейковый сервер API ЮKassa для тестов и нагрузочных прогонов. '
+        'Магазин направляется на него переменной YOOKASSA_ENDPOINT=http://<host>:<port>/v3.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0, help='Задержка ответа API, с')
+        parser.add_argument('--failure-rate', type=float, default=0, help='Доля ответов с ошибкой 500')
+        parser.add_argument(
+            '--webhook-url', help='Адрес для уведомлений, например http://127.0.0.1:8000/api/payments/yookassa/webhook/',
+        )
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options['host'], options['port'], options['latency'], options['failure_rate'], options['webhook_url'],
+        )
+        self.stdout.write(f'Фейковый API ЮKassa: {server.state.base_url}/v3')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
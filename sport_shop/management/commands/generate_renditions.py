@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from sport_shop import images
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает производные изображения (AVIF/WebP/JPEG разных размеров) для уже '
+        'загруженных изображений товаров, аватаров и логотипа.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать производные, даже если они уже есть.',
+        )
+
+    def handle(self, *args, **options):
+        for label, (field, _, _, _) in images.TARGETS.items():
+            model = apps.get_model(label)
+            pks = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).values_list('pk', flat=True)
+            processed = failed = 0
+            for pk in pks.iterator():
+                try:
+                    processed += images.process(label, pk, force=options['force'])
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{label} #{pk}: {error}')
+            self.stdout.write(self.style.SUCCESS(f'{label}: обработано {processed}, ошибок {failed}'))
@@ -0,0 +1,113 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+
+from sport_shop.models import Product
+from sport_shop.stats import refresh_product_stats
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест профилей базы данных (DB_PROFILE): для каждого профиля '
+        'запускается несколько процессов, которые одновременно открывают страницы '
+        'каталога и пересчитывают статистику товаров (запись). Данные не изменяются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='sqlite-default,sqlite', help='Профили через запятую')
+        parser.add_argument('--workers', type=int, default=4, help='Количество процессов')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность теста, с')
+        parser.add_argument('--write-ratio', type=float, default=0.1, help='Доля операций записи')
+        parser.add_argument('--worker', action='store_true', help='Внутренний режим: один процесс нагрузки')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self.run_worker(options)
+
+        self.stdout.write(f'{"профиль":<16} {"запр/с":>8} {"p50, мс":>8} {"p95, мс":>8} {"ошибки":>7}')
+        for profile in options['profiles'].split(','):
+            result = self.run_profile(profile.strip(), options)
+            self.stdout.write(
+                f'{profile:<16} {result["throughput"]:8.1f} {result["p50"]:8.1f} '
+                f'{result["p95"]:8.1f} {result["errors"]:7d}'
+            )
+            for error, count in result['error_types'].items():
+                self.stdout.write(f'    {count} x {error}')
+
+    def run_profile(self, profile, options):
+        env = dict(os.environ, DB_PROFILE=profile)
+        command = [
+            sys.executable, sys.argv[0], 'loadtest', '--worker',
+            '--duration', str(options['duration']),
+            '--write-ratio', str(options['write_ratio']),
+        ]
+        processes = [
+            subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True)
+            for _ in range(options['workers'])
+        ]
+
+        latencies = []
+        errors = 0
+        error_types = {}
+        for process in processes:
+            output, _ = process.communicate()
+            if process.returncode:
+                raise CommandError(f'Процесс нагрузки завершился с кодом {process.returncode}')
+            report = json.loads(output.strip().splitlines()[-1])
+            latencies.extend(report['latencies'])
+            errors += report['errors']
+            for error, count in report['error_types'].items():
+                error_types[error] = error_types.get(error, 0) + count
+        return {
+            'throughput': len(latencies) / options['duration'],
+            'p50': percentile(latencies, 0.5),
+            'p95': percentile(latencies, 0.95),
+            'errors': errors,
+            'error_types': error_types,
+        }
+
+    def run_worker(self, options):
+        rng = random.Random()
+        product_ids = list(Product.objects.values_list('pk', flat=True)[:1000])
+        if not product_ids:
+            raise CommandError('В базе нет товаров')
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        pages = ['/', '/products/', '/products/?sort_by=price_asc']
+
+        latencies = []
+        errors = 0
+        error_types = {}
+        deadline = time.perf_counter() + options['duration']
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                if rng.random() < options['write_ratio']:
+                    with transaction.atomic():
+                        refresh_product_stats(rng.choice(product_ids))
+                elif rng.random() < 0.5:
+                    client.get(f'/product/{rng.choice(product_ids)}/')
+                else:
+                    client.get(rng.choice(pages))
+            except Exception as e:
+                errors += 1
+                error = f'{type(e).__name__}: {e}'
+                error_types[error] = error_types.get(error, 0) + 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(json.dumps({'latencies': latencies, 'errors': errors, 'error_types': error_types}))
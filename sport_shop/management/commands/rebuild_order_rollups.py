@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from sport_shop.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересчитывает дневные сводки заказов и новых пользователей для дашборда панели управления.'
+
+    def handle(self, *args, **options):
+        total = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Сводки пересчитаны: {total} строк (день и статус).'))
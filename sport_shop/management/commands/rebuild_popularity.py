@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from sport_shop.popularity import rebuild_popularity
+
+
+class Command(BaseCommand):
+    help = (
+        'Полностью пересчитывает популярность товаров по всем заказам. '
+        'Запускайте по расписанию (cron) или после изменения настроек POPULARITY.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Размер пакета записи')
+
+    def handle(self, *args, **options):
+        total = rebuild_popularity(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Популярность пересчитана для {total} товаров.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from sport_shop.stats import rebuild_product_stats
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересчитывает таблицу статистики товаров (рейтинг, цены, заказы, главное изображение).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пакета записи')
+
+    def handle(self, *args, **options):
+        total = rebuild_product_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Статистика пересчитана для {total} товаров.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from sport_shop.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Полностью пересобирает полнотекстовый индекс товаров.'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        total = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс {backend.__class__.__name__} пересобран: {total} товаров.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from sport_shop.payments import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет с API ЮKassa заказы, ожидающие оплаты, и отмечает оплаченные. '
+        'Запускайте по расписанию (например, каждые 10 минут) на случай потерянных уведомлений.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=3, help='Сверять заказы не старше стольких дней')
+
+    def handle(self, *args, **options):
+        checked, paid = reconcile(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Проверено платежей: {checked}, оплачено заказов: {paid}'))
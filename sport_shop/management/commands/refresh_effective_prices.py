@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from sport_shop.pricing import refresh_effective_prices
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает минимальные цены товаров со скидками для каталога. '
+        'Запускайте после миграции и по расписанию (cron), чтобы начало и '
+        'окончание скидок отражались в каталоге без обращений к сайту.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пакета записи')
+
+    def handle(self, *args, **options):
+        total = refresh_effective_prices(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Цены со скидками обновлены для {total} товаров.'))
@@ -0,0 +1,98 @@
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+
+from sport_shop import tasks
+
+PURGE_INTERVAL = 3600
+
+
+def run_task(pk):
+    """Выполнить задачу в потоке или процессе пула со своим соединением с базой."""
+    close_old_connections()
+    try:
+        return tasks.execute(pk)
+    finally:
+        connection.close()
+
+
+def init_process():
+    # Процесс пула не должен пользоваться соединениями, унаследованными от родителя
+    django.setup()
+    for alias in connections:
+        connections[alias].close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер фоновых задач (см. sport_shop/tasks.py): берет готовые задачи из '
+        'очереди в базе данных и выполняет их в пуле потоков или процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=getattr(settings, 'TASKS_CONCURRENCY', 4),
+            help='Количество одновременно выполняемых задач',
+        )
+        parser.add_argument('--pool', choices=('thread', 'process'), default='thread', help='Тип пула')
+        parser.add_argument('--poll', type=float, default=1.0, help='Интервал опроса очереди, с')
+        parser.add_argument('--once', action='store_true', help='Выполнить готовые задачи и завершиться')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        concurrency = options['concurrency']
+        if options['pool'] == 'process':
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=concurrency, initializer=init_process)
+        else:
+            pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='tasks')
+
+        self.stdout.write(f'Воркер запущен: {options["pool"]} x {concurrency}')
+        # Блокировка продлевается несколько раз за TASKS_LOCK_TIMEOUT
+        heartbeat_interval = getattr(settings, 'TASKS_LOCK_TIMEOUT', 600) / 4
+        running = {}
+        done = failed = 0
+        purged_at = heartbeat_at = 0
+        with pool:
+            while not self.stopping:
+                if time.monotonic() - purged_at > PURGE_INTERVAL:
+                    tasks.purge_finished()
+                    purged_at = time.monotonic()
+                if time.monotonic() - heartbeat_at > heartbeat_interval:
+                    tasks.heartbeat(list(running.values()))
+                    heartbeat_at = time.monotonic()
+                tasks.requeue_stale()
+
+                claimed = tasks.claim(concurrency - len(running)) if len(running) < concurrency else []
+                running.update((pool.submit(run_task, pk), pk) for pk in claimed)
+                if options['once'] and not running:
+                    break
+                if not running:
+                    time.sleep(options['poll'])
+                    continue
+
+                finished, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                for future in finished:
+                    del running[future]
+                    if future.exception() is None and future.result():
+                        done += 1
+                    else:
+                        failed += 1
+            # Дожидаемся задач, взятых в работу до остановки, продлевая их блокировку
+            while running:
+                finished, _ = wait(running, timeout=heartbeat_interval)
+                for future in finished:
+                    del running[future]
+                tasks.heartbeat(list(running.values()))
+        self.stdout.write(self.style.SUCCESS(f'Воркер остановлен: выполнено {done}, с ошибкой {failed}'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
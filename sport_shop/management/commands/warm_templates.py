@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sport_shop.template_warmup import warm_templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Компилирует все шаблоны проекта и завершается с ошибкой при синтаксических '
+        'ошибках. Запускайте при развертывании перед перезапуском приложения.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count, errors = warm_templates()
+        for name, error in errors.items():
+            self.stderr.write(f'{name}: {error}')
+        if errors:
+            raise CommandError(f'Ошибки в {len(errors)} из {count} шаблонов')
+        self.stdout.write(self.style.SUCCESS(
+            f'Скомпилировано шаблонов: {count} за {(time.perf_counter() - started) * 1000:.0f} мс'
+        ))
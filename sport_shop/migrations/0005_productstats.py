@@ -0,0 +1,52 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, Min
+
+
+def populate_product_stats(apps, schema_editor):
+    Product = apps.get_model('sport_shop', 'Product')
+    ProductStats = apps.get_model('sport_shop', 'ProductStats')
+    OrderItem = apps.get_model('sport_shop', 'OrderItem')
+    for product in Product.objects.all():
+        reviews = product.reviews.aggregate(avg=Avg('rating'), count=Count('id'))
+        prices = product.variants.aggregate(min=Min('price'), max=Max('price'))
+        main_image = product.images.order_by('order', 'pk').values_list('image', flat=True).first()
+        ProductStats.objects.create(
+            product=product,
+            avg_rating=reviews['avg'] or 0,
+            review_count=reviews['count'],
+            min_price=prices['min'],
+            max_price=prices['max'],
+            order_count=OrderItem.objects.filter(product_variant__product=product).count(),
+            main_image=main_image or '',
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sport_shop', '0004_alter_category_options_alter_order_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='sport_shop.product', verbose_name='Товар')),
+                ('avg_rating', models.FloatField(default=0, verbose_name='Средний рейтинг')),
+                ('review_count', models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Минимальная цена')),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='Максимальная цена')),
+                ('order_count', models.PositiveIntegerField(default=0, verbose_name='Количество заказов')),
+                ('main_image', models.ImageField(blank=True, upload_to='products/', verbose_name='Главное изображение')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Статистика товара',
+                'verbose_name_plural': 'Статистика товаров',
+            },
+        ),
+        migrations.RunPython(populate_product_stats, migrations.RunPython.noop),
+    ]
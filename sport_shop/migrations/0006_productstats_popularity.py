@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:39
+
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Значения по умолчанию и длина эры из popularity.py на момент миграции
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+ERA_HALVINGS = 512
+
+
+def populate_popularity(apps, schema_editor):
+    ProductStats = apps.get_model('sport_shop', 'ProductStats')
+    OrderItem = apps.get_model('sport_shop', 'OrderItem')
+    config = getattr(settings, 'POPULARITY', {})
+    half_life = config.get('HALF_LIFE_DAYS', 30)
+    epoch = config.get('EPOCH', EPOCH)
+    neutral_rating = float(config.get('NEUTRAL_RATING', 0.0))
+
+    def half_lives(moment):
+        return (moment - epoch).total_seconds() / 86400 / half_life
+
+    era = int(half_lives(datetime.now(timezone.utc)) // ERA_HALVINGS) if half_life else 0
+    weights = {}
+    items = OrderItem.objects.values_list('product_variant__product_id', 'order__created_at')
+    for product_id, created_at in items.iterator(chunk_size=5000):
+        weight = 2.0 ** (half_lives(created_at) - era * ERA_HALVINGS) if half_life and created_at else 1.0
+        weights[product_id] = weights.get(product_id, 0.0) + weight
+
+    batch = []
+    for stats in ProductStats.objects.filter(product_id__in=list(weights)):
+        stats.order_weight = weights[stats.product_id]
+        rating = stats.avg_rating if stats.review_count else neutral_rating
+        stats.popularity_score = stats.order_weight * rating
+        batch.append(stats)
+    ProductStats.objects.bulk_update(batch, ['order_weight', 'popularity_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sport_shop', '0005_productstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productstats',
+            name='order_weight',
+            field=models.FloatField(default=0, verbose_name='Вес заказов с затуханием'),
+        ),
+        migrations.AddField(
+            model_name='productstats',
+            name='popularity_score',
+            field=models.FloatField(db_index=True, default=0, verbose_name='Популярность'),
+        ),
+        migrations.RunPython(populate_popularity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+"""Таблица полнотекстового поиска (см. search.py).
+
+Схема и заполнение записаны здесь, а не берутся из search.py, чтобы
+миграция не менялась вместе с кодом приложения. Документы заполняются
+без стемминга: префиксные запросы по основам слов находят и полные
+слова, а нормализованный текст запишут сигналы при изменении товара или
+команда ``rebuild_search_index``.
+"""
+from django.db import migrations
+
+TABLE_NAME = 'sport_shop_product_search'
+
+CREATE_SQL = {
+    'sqlite': (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE_NAME} USING fts5("
+        f"name, category, body, variants, "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+    ),
+    'mysql': (
+        f'CREATE TABLE IF NOT EXISTS {TABLE_NAME} ('
+        f'product_id BIGINT NOT NULL PRIMARY KEY, '
+        f'name TEXT NOT NULL, category TEXT NOT NULL, body LONGTEXT NOT NULL, variants TEXT NOT NULL, '
+        f'FULLTEXT KEY {TABLE_NAME}_all (name, category, body, variants), '
+        f'FULLTEXT KEY {TABLE_NAME}_name (name)'
+        f') ENGINE=InnoDB DEFAULT CHARSET=utf8mb4'
+    ),
+}
+
+FILL_SQL = {
+    'sqlite': (
+        f'INSERT INTO {TABLE_NAME} (rowid, name, category, body, variants) '
+        'SELECT p.id, p.name, c.name, p.description || \' \' || p.formatted_description_text, '
+        'COALESCE((SELECT group_concat(v.weight || \' \' || CAST(ROUND(v.price) AS INTEGER), \' \') '
+        'FROM {variant} v WHERE v.product_id = p.id), \'\') '
+        'FROM {product} p JOIN {category} c ON c.id = p.category_id'
+    ),
+    'mysql': (
+        f'INSERT INTO {TABLE_NAME} (product_id, name, category, body, variants) '
+        'SELECT p.id, p.name, c.name, CONCAT(p.description, \' \', p.formatted_description_text), '
+        'COALESCE((SELECT GROUP_CONCAT(CONCAT(v.weight, \' \', ROUND(v.price)) SEPARATOR \' \') '
+        'FROM {variant} v WHERE v.product_id = p.id), \'\') '
+        'FROM {product} p JOIN {category} c ON c.id = p.category_id'
+    ),
+}
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+    quote = schema_editor.quote_name
+    schema_editor.execute(CREATE_SQL[vendor])
+    schema_editor.execute(FILL_SQL[vendor].format(
+        product=quote(apps.get_model('sport_shop', 'Product')._meta.db_table),
+        category=quote(apps.get_model('sport_shop', 'Category')._meta.db_table),
+        variant=quote(apps.get_model('sport_shop', 'ProductVariant')._meta.db_table),
+    ))
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sport_shop', '0006_productstats_popularity'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:48
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_min_price(apps, schema_editor):
+    # Скидки применяются командой refresh_effective_prices после миграции
+    ProductStats = apps.get_model('sport_shop', 'ProductStats')
+    ProductStats.objects.update(min_effective_price=F('min_price'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sport_shop', '0007_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productstats',
+            name='min_effective_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, max_digits=10, null=True, verbose_name='Минимальная цена со скидкой'),
+        ),
+        migrations.RunPython(copy_min_price, migrations.RunPython.noop),
+    ]
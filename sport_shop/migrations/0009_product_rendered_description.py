@@ -0,0 +1,198 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:50
+"""Готовый HTML и текст описаний товаров (см. markup.py).
+
+Разбор разметки скопирован сюда из markup.py на момент миграции, чтобы
+миграция не менялась вместе с кодом приложения. Описания, сохраненные
+позже, рендерит уже текущий markup.py.
+"""
+import re
+from html import escape
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+
+# Открывающий или закрывающий тег разметки, для link и color - с атрибутом ="..."
+TAG_RE = re.compile(
+    r'<(/?)(b|strong|i|u|p|link|color|image|vid)(?:\s*=\s*["\']([^"\']*)["\'])?\s*>',
+    re.IGNORECASE,
+)
+COLOR_RE = re.compile(r'#?([0-9a-f]{6}|[0-9a-f]{3})', re.IGNORECASE)
+YOUTUBE_RE = re.compile(r'(?:youtube\.com/watch\?v=|youtu\.be/)([a-zA-Z0-9_-]+)')
+VIMEO_RE = re.compile(r'vimeo\.com/(\d+)')
+
+SAFE_SCHEMES = ('http', 'https', 'mailto')
+
+# Простые теги: тег разметки -> (открывающий HTML, закрывающий HTML)
+SIMPLE_TAGS = {
+    'b': ('<strong>', '</strong>'),
+    'i': ('<em>', '</em>'),
+    'u': ('<u>', '</u>'),
+    'p': ('<p class="formatted-paragraph">', '</p>'),
+}
+ALIASES = {'strong': 'b'}
+# Теги, содержимое которых - адрес, а не текст; значение - шаблон закрывающего тега
+URL_TAGS = {
+    'image': re.compile(r'</image\s*>', re.IGNORECASE),
+    'vid': re.compile(r'</vid\s*>', re.IGNORECASE),
+}
+
+
+def safe_url(url):
+    """Вернуть адрес, если он абсолютный http(s)/mailto или относительный от корня, иначе None."""
+    url = url.strip()
+    if not url:
+        return None
+    if url.startswith('/') and not url.startswith('//'):
+        return url
+    try:
+        scheme = urlsplit(url).scheme.lower()
+    except ValueError:
+        return None
+    return url if scheme in SAFE_SCHEMES else None
+
+
+def _text(value):
+    return escape(value).replace('\n', '<br>')
+
+
+def _link_open(url):
+    url = safe_url(url or '')
+    if url is None:
+        return '<span>', '</span>'
+    return (
+        f'<a href="{escape(url)}" target="_blank" rel="noopener noreferrer" class="formatted-link">'
+        f'<i class="fas fa-external-link-alt" style="font-size: 0.85em; margin-right: 3px;"></i>',
+        '</a>',
+    )
+
+
+def _color_open(color):
+    match = COLOR_RE.fullmatch((color or '').strip())
+    if not match:
+        return '<span class="formatted-color">', '</span>'
+    return (
+        f'<span class="formatted-color" style="color: #{match.group(1)} !important; font-weight: 500;">',
+        '</span>',
+    )
+
+
+def _image(url):
+    url = safe_url(url)
+    if url is None:
+        return ''
+    return (
+        f'<div class="formatted-image-wrapper"><img src="{escape(url)}" alt="Изображение" '
+        f'class="formatted-image" loading="lazy"></div>'
+    )
+
+
+def _video(url):
+    url = safe_url(url)
+    if url is None:
+        return ''
+    youtube = YOUTUBE_RE.search(url)
+    if youtube:
+        return (
+            f'<div class="video-container"><iframe width="560" height="315" '
+            f'src="https://www.youtube.com/embed/{youtube.group(1)}" frameborder="0" '
+            f'allow="accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture" '
+            f'allowfullscreen></iframe></div>'
+        )
+    vimeo = VIMEO_RE.search(url)
+    if vimeo:
+        return (
+            f'<div class="video-container"><iframe src="https://player.vimeo.com/video/{vimeo.group(1)}" '
+            f'width="560" height="315" frameborder="0" allow="autoplay; fullscreen; picture-in-picture" '
+            f'allowfullscreen></iframe></div>'
+        )
+    return (
+        f'<div class="video-container"><video width="560" height="315" controls>'
+        f'<source src="{escape(url)}" type="video/mp4">Your browser does not support the video tag.'
+        f'</video></div>'
+    )
+
+
+def parse(value):
+    """Разобрать разметку. Возвращает (html, текст без разметки)."""
+    html = []
+    plain = []
+    stack = []  # открытые теги: (имя, закрывающий HTML)
+    position = 0
+
+    while True:
+        match = TAG_RE.search(value, position)
+        chunk = value[position:match.start() if match else len(value)]
+        html.append(_text(chunk))
+        plain.append(chunk)
+        if match is None:
+            break
+        position = match.end()
+        closing, name, attribute = match.group(1), match.group(2).lower(), match.group(3)
+        name = ALIASES.get(name, name)
+
+        if name in URL_TAGS:
+            if closing:
+                continue
+            end = URL_TAGS[name].search(value, position)
+            url = value[position:end.start() if end else len(value)]
+            position = end.end() if end else len(value)
+            html.append(_image(url) if name == 'image' else _video(url))
+            continue
+
+        if closing:
+            # Закрываем только открытый тег (и все вложенные в него), лишние закрывающие теги пропускаем
+            if any(opened == name for opened, _ in stack):
+                while stack:
+                    opened, close_html = stack.pop()
+                    html.append(close_html)
+                    if opened == name:
+                        break
+            continue
+
+        if name == 'link':
+            open_html, close_html = _link_open(attribute)
+        elif name == 'color':
+            open_html, close_html = _color_open(attribute)
+        else:
+            open_html, close_html = SIMPLE_TAGS[name]
+        html.append(open_html)
+        stack.append((name, close_html))
+
+    while stack:
+        html.append(stack.pop()[1])
+    return ''.join(html), ''.join(plain)
+
+
+def render_descriptions(apps, schema_editor):
+    Product = apps.get_model('sport_shop', 'Product')
+    batch = []
+    for product in Product.objects.only('description', 'formatted_description_text').iterator(chunk_size=500):
+        product.rendered_description, product.description_plain = parse(
+            product.formatted_description_text or product.description or ''
+        )
+        batch.append(product)
+        if len(batch) >= 500:
+            Product.objects.bulk_update(batch, ['rendered_description', 'description_plain'])
+            batch = []
+    Product.objects.bulk_update(batch, ['rendered_description', 'description_plain'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sport_shop', '0008_productstats_min_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='description_plain',
+            field=models.TextField(blank=True, editable=False, verbose_name='Описание (текст)'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rendered_description',
+            field=models.TextField(blank=True, editable=False, verbose_name='Описание (HTML)'),
+        ),
+        migrations.RunPython(render_descriptions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sport_shop', '0012_tasks_and_order_payment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='payment_idempotence_key',
+            field=models.UUIDField(blank=True, editable=False, null=True, verbose_name='Ключ идемпотентности платежа'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sport_shop', '0013_order_payment_idempotence_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='payment_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, verbose_name='ID платежа'),
+        ),
+        migrations.CreateModel(
+            name='PaymentNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payment_id', models.CharField(max_length=100, verbose_name='ID платежа')),
+                ('event', models.CharField(max_length=50, verbose_name='Событие')),
+                ('payload', models.JSONField(verbose_name='Содержимое')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Получено')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Обработано')),
+            ],
+            options={
+                'verbose_name': 'Уведомление о платеже',
+                'verbose_name_plural': 'Уведомления о платежах',
+                'constraints': [models.UniqueConstraint(fields=('payment_id', 'event'), name='payment_notification_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:26
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollups(apps, schema_editor):
+    # То же, что rollups.rebuild(), на исторических моделях
+    Order = apps.get_model('sport_shop', 'Order')
+    OrderItem = apps.get_model('sport_shop', 'OrderItem')
+    User = apps.get_model('auth', 'User')
+    DailyOrderStats = apps.get_model('sport_shop', 'DailyOrderStats')
+    DailyUserStats = apps.get_model('sport_shop', 'DailyUserStats')
+
+    rollups = {}
+    for row in (Order.objects.order_by().annotate(day=TruncDate('created_at'))
+                .values('day', 'status').annotate(count=Count('pk'), revenue=Sum('total_price'))):
+        rollups[row['day'], row['status']] = DailyOrderStats(
+            date=row['day'], status=row['status'], orders=row['count'], revenue=row['revenue'] or 0,
+        )
+    for row in (OrderItem.objects.order_by().annotate(day=TruncDate('order__created_at'))
+                .values('day', 'order__status').annotate(quantity=Sum('quantity'))):
+        if (row['day'], row['order__status']) in rollups:
+            rollups[row['day'], row['order__status']].items = row['quantity']
+    DailyOrderStats.objects.bulk_create(rollups.values(), batch_size=1000)
+    DailyUserStats.objects.bulk_create([
+        DailyUserStats(date=row['day'], new_users=row['count'])
+        for row in (User.objects.filter(is_staff=False).order_by().annotate(day=TruncDate('date_joined'))
+                    .values('day').annotate(count=Count('pk')))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('sport_shop', '0014_payment_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Дата')),
+                ('new_users', models.IntegerField(default=0, verbose_name='Новых пользователей')),
+            ],
+            options={
+                'verbose_name': 'Пользователи за день',
+                'verbose_name_plural': 'Пользователи по дням',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyOrderStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('status', models.CharField(choices=[('pending_payment', 'Ожидает оплаты'), ('processing', 'Подготовка'), ('shipped', 'Отправлено'), ('delivered', 'Доставлено')], max_length=20, verbose_name='Статус')),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма')),
+                ('items', models.IntegerField(default=0, verbose_name='Единиц товара')),
+            ],
+            options={
+                'verbose_name': 'Заказы за день',
+                'verbose_name_plural': 'Заказы по дням',
+                'constraints': [models.UniqueConstraint(fields=('date', 'status'), name='daily_order_stats_unique')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
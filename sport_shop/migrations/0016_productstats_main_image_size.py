@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:39
+
+from django.db import migrations, models
+
+
+def populate_main_image_size(apps, schema_editor):
+    ProductStats = apps.get_model('sport_shop', 'ProductStats')
+    ProductImage = apps.get_model('sport_shop', 'ProductImage')
+    sizes = {
+        (product_id, image): (width, height)
+        for product_id, image, width, height in ProductImage.objects.filter(width__isnull=False)
+        .values_list('product_id', 'image', 'width', 'height').iterator(chunk_size=5000)
+    }
+    batch = []
+    for stats in ProductStats.objects.exclude(main_image='').iterator(chunk_size=5000):
+        size = sizes.get((stats.product_id, stats.main_image.name))
+        if size:
+            stats.main_image_width, stats.main_image_height = size
+            batch.append(stats)
+    ProductStats.objects.bulk_update(batch, ['main_image_width', 'main_image_height'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sport_shop', '0015_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productstats',
+            name='main_image_height',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Высота главного изображения'),
+        ),
+        migrations.AddField(
+            model_name='productstats',
+            name='main_image_width',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Ширина главного изображения'),
+        ),
+        migrations.RunPython(populate_main_image_size, migrations.RunPython.noop),
+    ]
@@ -2,8 +2,11 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models import Avg, Min
 from math import ceil
+from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
-import re
+
+from . import markup
 
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name='Название')
@@ -15,6 +18,12 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class ProductQuerySet(models.QuerySet):
+    def with_card_data(self):
+        """Все, что нужно карточке товара (категория, цены, рейтинг, изображение), одним запросом."""
+        return self.select_related('category', 'stats')
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200, verbose_name='Название')
     description = models.TextField(verbose_name='Описание')
@@ -24,7 +33,11 @@ class Product(models.Model):
         verbose_name='Форматированное описание',
         help_text="Используйте теги <i>, <u>, <link>, <color>, <p>, <image> для форматирования"
     )
+    rendered_description = models.TextField(blank=True, editable=False, verbose_name='Описание (HTML)')
+    description_plain = models.TextField(blank=True, editable=False, verbose_name='Описание (текст)')
     
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
@@ -32,74 +45,77 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
-    @property
+    def _loaded_stats(self):
+        """ProductStats, если она уже загружена (select_related/with_card_data), иначе None."""
+        if self._state.fields_cache.get('stats') is not None:
+            return self.stats
+        return None
+
+    def _prefetched(self, name):
+        return getattr(self, '_prefetched_objects_cache', {}).get(name)
+
+    @cached_property
     def main_image(self):
+        images = self._prefetched('images')
+        if images is not None:
+            return min(images, key=lambda image: (image.order, image.pk), default=None)
         return self.images.first()
 
-    @property
+    @cached_property
     def average_rating(self):
-        avg = self.reviews.aggregate(Avg('rating'))['rating__avg'] or 0
-        return ceil(avg)
+        # Порядок источников: аннотация запроса, ProductStats, предзагруженные отзывы, запрос к базе
+        if 'avg_rating' in self.__dict__:
+            avg = self.__dict__['avg_rating']
+        elif self._loaded_stats() is not None:
+            avg = self.stats.avg_rating
+        elif self._prefetched('reviews') is not None:
+            reviews = self._prefetched('reviews')
+            avg = sum(review.rating for review in reviews) / len(reviews) if reviews else 0
+        else:
+            avg = self.reviews.aggregate(Avg('rating'))['rating__avg']
+        return ceil(avg or 0)
 
     def get_cheapest_variant(self):
-        return self.variants.order_by('price').first()
-
-    @staticmethod
-    def _video_preview(match):
-        """Обработка тега <vid> для вставки видео."""
-        video_url = match.group(1)
-        
-        # YouTube
-        youtube_match = re.search(r'(?:youtube\.com\/watch\?v=|youtu\.be\/)([a-zA-Z0-9_-]+)', video_url)
-        if youtube_match:
-            video_id = youtube_match.group(1)
-            return f'''
-            <div class="video-container">
-                <iframe width="560" height="315" src="https://www.youtube.com/embed/{video_id}" 
-                        frameborder="0" allow="accelerometer; autoplay; clipboard-write; encrypted-media; 
-                        gyroscope; picture-in-picture" allowfullscreen></iframe>
-            </div>
-            '''
-        
-        # Vimeo
-        vimeo_match = re.search(r'vimeo\.com\/(\d+)', video_url)
-        if vimeo_match:
-            video_id = vimeo_match.group(1)
-            return f'''
-            <div class="video-container">
-                <iframe src="https://player.vimeo.com/video/{video_id}" width="560" height="315" 
-                        frameborder="0" allow="autoplay; fullscreen; picture-in-picture" allowfullscreen></iframe>
-            </div>
-            '''
-        
-        # Другие видео (используем HTML5 video player)
-        return f'''
-        <div class="video-container">
-            <video width="560" height="315" controls>
-                <source src="{video_url}" type="video/mp4">
-                Your browser does not support the video tag.
-            </video>
-        </div>
-        '''
+        if '_cheapest_variant' not in self.__dict__:
+            variants = self._prefetched('variants')
+            if variants is not None:
+                self._cheapest_variant = min(variants, key=lambda variant: variant.price, default=None)
+            else:
+                self._cheapest_variant = self.variants.order_by('price').first()
+        return self._cheapest_variant
+
+    def render_description(self):
+        """Отформатировать описание и сохранить результат в полях модели (см. markup.py)."""
+        self.rendered_description, self.description_plain = markup.parse(
+            self.formatted_description_text or self.description or ''
+        )
+
+    def save(self, *args, **kwargs):
+        self.render_description()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'rendered_description', 'description_plain'}
+        super().save(*args, **kwargs)
 
     def formatted_description(self):
         """Возвращает отформатированное описание продукта."""
-        desc = self.formatted_description_text or self.description
-        # Обработка тега <b>
-        desc = re.sub(r'<b>(.*?)</b>', r'<strong>\1</strong>', desc)
-        # Обработка тега <vid>
-        desc = re.sub(r'<vid>(.*?)</vid>', self._video_preview, desc)
-        return mark_safe(desc)
+        return mark_safe(self.rendered_description)
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images', verbose_name='Товар')
     image = models.ImageField(upload_to='products/', verbose_name='Изображение')
     order = models.PositiveIntegerField(default=0, verbose_name='Порядок')
+    # Заполняются при обработке изображения (см. images.py)
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Ширина')
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Высота')
 
     class Meta:
         ordering = ['order']
         verbose_name = 'Изображение товара'
         verbose_name_plural = 'Изображения товаров'
+        indexes = [
+            models.Index(fields=['product', 'order'], name='productimage_product_order_idx'),
+        ]
 
     def __str__(self):
         return f"Изображение {self.order} для {self.product.name}"
@@ -112,6 +128,9 @@ class ProductVariant(models.Model):
     class Meta:
         verbose_name = 'Вариант товара'
         verbose_name_plural = 'Варианты товаров'
+        indexes = [
+            models.Index(fields=['product', 'price'], name='variant_product_price_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.weight}г"
@@ -151,11 +170,24 @@ class Order(models.Model):
     address = models.TextField(verbose_name='Адрес')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     is_completed = models.BooleanField(default=False, verbose_name='Завершен')
+    # Заполняются фоновой задачей создания платежа (см. payments.py); ключ
+    # идемпотентности один на заказ, поэтому повторы не создают новых платежей
+    payment_idempotence_key = models.UUIDField(null=True, blank=True, editable=False, verbose_name='Ключ идемпотентности платежа')
+    payment_id = models.CharField(max_length=100, blank=True, db_index=True, verbose_name='ID платежа')
+    payment_url = models.URLField(max_length=1000, blank=True, verbose_name='Ссылка на оплату')
 
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
         ordering = ['-created_at']
+        indexes = [
+            # Заказы пользователя (история, проверка права оставить отзыв)
+            models.Index(fields=['user', 'status', 'is_completed'], name='order_user_status_idx'),
+            # Сортировка по дате и окно «за 7 дней» на дашборде
+            models.Index(fields=['created_at'], name='order_created_at_idx'),
+            # Фильтр по статусу в панели с сортировкой по дате
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self):
         return f"Заказ {self.id} - {self.user.username}"
@@ -176,6 +208,8 @@ class OrderItem(models.Model):
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name='Пользователь')
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, verbose_name='Аватар')
+    avatar_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Ширина аватара')
+    avatar_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Высота аватара')
 
     class Meta:
         verbose_name = 'Профиль пользователя'
@@ -195,12 +229,17 @@ class Review(models.Model):
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'product'], name='review_user_product_idx'),
+        ]
 
     def __str__(self):
         return f"Отзыв на {self.product.name} от {self.user.username}"
 
 class SiteSettings(models.Model):
     logo = models.ImageField(upload_to='logo/', null=True, blank=True)
+    logo_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Ширина логотипа')
+    logo_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Высота логотипа')
 
     class Meta:
         verbose_name = 'Настройки сайта'
@@ -211,9 +250,10 @@ class SiteSettings(models.Model):
 
     @classmethod
     def get_logo(cls):
+        """Логотип для шапки: {'name', 'width', 'height'} или None (см. тег picture)."""
         settings = cls.objects.first()
         if settings and settings.logo:
-            return settings.logo.url
+            return {'name': settings.logo.name, 'width': settings.logo_width, 'height': settings.logo_height}
         return None
 
 
@@ -240,6 +280,9 @@ class Discount(models.Model):
         verbose_name = 'Скидка'
         verbose_name_plural = 'Скидки'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'start_date', 'end_date'], name='discount_active_window_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.discount_percent}%"
@@ -249,3 +292,135 @@ class Discount(models.Model):
         if self.discount_amount:
             return max(0, price - self.discount_amount)
         return price * (1 - self.discount_percent / 100)
+
+
+class ProductStats(models.Model):
+    """Денормализованные показатели товара для карточек в каталоге.
+
+    Обновляется сигналами (см. signals.py) и полностью пересчитывается
+    командой ``rebuild_product_stats``. ``updated_at`` меняется при каждом
+    пересчете и служит версией закэшированной карточки товара
+    (includes/product_card.html).
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stats', verbose_name='Товар')
+    avg_rating = models.FloatField(default=0, verbose_name='Средний рейтинг')
+    review_count = models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Минимальная цена')
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Максимальная цена')
+    min_effective_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, db_index=True, verbose_name='Минимальная цена со скидкой')
+    order_count = models.PositiveIntegerField(default=0, verbose_name='Количество заказов')
+    main_image = models.ImageField(upload_to='products/', blank=True, verbose_name='Главное изображение')
+    # Размеры главного изображения; заданы, когда готовы его производные (см. images.py)
+    main_image_width = models.PositiveIntegerField(null=True, blank=True, verbose_name='Ширина главного изображения')
+    main_image_height = models.PositiveIntegerField(null=True, blank=True, verbose_name='Высота главного изображения')
+    order_weight = models.FloatField(default=0, verbose_name='Вес заказов с затуханием')
+    popularity_score = models.FloatField(default=0, db_index=True, verbose_name='Популярность')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Статистика товара'
+        verbose_name_plural = 'Статистика товаров'
+
+    def __str__(self):
+        return f"Статистика для {self.product_id}"
+
+    @property
+    def average_rating(self):
+        """Рейтинг, округленный вверх, как в Product.average_rating."""
+        return ceil(self.avg_rating)
+
+
+class DailyOrderStats(models.Model):
+    """Заказы за день в одном статусе: количество, сумма, число единиц товара.
+
+    Обновляется инкрементно при сохранении и удалении заказов и позиций
+    (см. rollups.py), полностью пересчитывается командой
+    ``rebuild_order_rollups``.
+    """
+    date = models.DateField(verbose_name='Дата')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name='Статус')
+    orders = models.IntegerField(default=0, verbose_name='Заказов')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Сумма')
+    items = models.IntegerField(default=0, verbose_name='Единиц товара')
+
+    class Meta:
+        verbose_name = 'Заказы за день'
+        verbose_name_plural = 'Заказы по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='daily_order_stats_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.orders}"
+
+
+class DailyUserStats(models.Model):
+    """Новые покупатели (не сотрудники) за день (см. rollups.py)."""
+    date = models.DateField(unique=True, verbose_name='Дата')
+    new_users = models.IntegerField(default=0, verbose_name='Новых пользователей')
+
+    class Meta:
+        verbose_name = 'Пользователи за день'
+        verbose_name_plural = 'Пользователи по дням'
+
+    def __str__(self):
+        return f"{self.date}: {self.new_users}"
+
+
+class PaymentNotification(models.Model):
+    """Уведомление ЮKassa о событии платежа (см. payments.py).
+
+    Уникальность пары платеж/событие отсекает повторные доставки одного
+    уведомления.
+    """
+    payment_id = models.CharField(max_length=100, verbose_name='ID платежа')
+    event = models.CharField(max_length=50, verbose_name='Событие')
+    payload = models.JSONField(verbose_name='Содержимое')
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name='Получено')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='Обработано')
+
+    class Meta:
+        verbose_name = 'Уведомление о платеже'
+        verbose_name_plural = 'Уведомления о платежах'
+        constraints = [
+            models.UniqueConstraint(fields=['payment_id', 'event'], name='payment_notification_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.payment_id}"
+
+
+class Task(models.Model):
+    """Задача фоновой очереди (см. tasks.py)."""
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Выполнена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name='Функция')
+    args = models.JSONField(default=list, blank=True, verbose_name='Аргументы')
+    kwargs = models.JSONField(default=dict, blank=True, verbose_name='Именованные аргументы')
+    # Ключ для поиска задачи и объединения одинаковых задач в очереди
+    key = models.CharField(max_length=200, blank=True, verbose_name='Ключ')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попытки')
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name='Максимум попыток')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='Запустить после')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='Взята в работу')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='Завершена')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            # Выбор готовых к запуску задач воркером
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+            models.Index(fields=['key', 'status'], name='task_key_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,57 @@
+"""Оформление заказа.
+
+Заказ и все его позиции создаются в одной транзакции: варианты корзины
+блокируются (SELECT ... FOR UPDATE), цены со скидками (см. pricing.py)
+считаются по заблокированным строкам, позиции вставляются одним
+``bulk_create``. ``bulk_create`` не отправляет сигналы, поэтому
+статистика и популярность товаров обновляются здесь же после фиксации
+транзакции, а дневная сводка заказов (см. rollups.py) - в самой транзакции.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from . import popularity, pricing, rollups, stats
+from .models import OrderItem, ProductVariant
+
+
+class OrderError(Exception):
+    """Заказ не может быть оформлен (пустая корзина, товар недоступен)."""
+
+
+def place_order(order, quantities):
+    """Сохранить заказ order (еще не сохраненный) с позициями {id варианта: количество}.
+
+    Возвращает сохраненный заказ с рассчитанной суммой. При ошибке
+    ничего не записывается в базу.
+    """
+    quantities = {int(variant_id): int(quantity) for variant_id, quantity in quantities.items()}
+    if not quantities or any(quantity <= 0 for quantity in quantities.values()):
+        raise OrderError('Корзина пуста или содержит неверное количество товара.')
+
+    with transaction.atomic():
+        # Блокируем варианты в порядке id, чтобы параллельные заказы не взаимоблокировались
+        variants = ProductVariant.objects.select_for_update().select_related('product').order_by('pk').in_bulk(list(quantities))
+        missing = set(quantities) - set(variants)
+        if missing:
+            raise OrderError('Некоторые товары из корзины больше недоступны.')
+
+        items = [
+            OrderItem(product_variant=variants[variant_id], quantity=quantity, price=pricing.effective_price(variants[variant_id]))
+            for variant_id, quantity in quantities.items()
+        ]
+        order.total_price = sum((item.price * Decimal(item.quantity) for item in items), Decimal('0'))
+        order.save()
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items)
+        rollups.add_orders(rollups.order_day(order), order.status, items=sum(quantities.values()))
+
+        weight = popularity.order_weight(order.created_at)
+        product_weights = {}
+        for item in items:
+            product_id = item.product_variant.product_id
+            product_weights[product_id] = product_weights.get(product_id, 0) + weight
+        transaction.on_commit(lambda: popularity.add_order_items(product_weights))
+        transaction.on_commit(lambda: stats.refresh_products(product_weights))
+    return order
@@ -0,0 +1,124 @@
+"""Кэш целых страниц каталога для анонимных посетителей.
+
+Ключ страницы — путь, нормализованные параметры запроса (отсортированные,
+без пустых значений) и версии пространств имен, от которых страница
+зависит. Сигналы (см. signals.py) увеличивают версии точечно:
+
+    pages.catalog       -- все страницы (скидки, категории, настройки сайта);
+    pages.listing       -- главная и каталог без фильтра по категории;
+    pages.category.<id> -- каталог категории и страницы ее товаров (рекомендации);
+    pages.product.<id>  -- страница товара.
+
+Кэш обходится для авторизованных пользователей, запросов с непоказанными
+сообщениями и всего, кроме GET/HEAD. Ответы получают ETag и Cache-Control
+(public для анонимных, private для остальных), на If-None-Match с
+совпадающим ETag возвращается 304. Счетчики заказов на карточках
+обновляются не сигналами, а по истечении ``PAGE_CACHE_TIMEOUT``.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+
+from . import caching
+
+CACHE_NAMESPACE = 'pages'
+CATALOG = 'pages.catalog'
+LISTING = 'pages.listing'
+
+
+def category(category_id):
+    return f'pages.category.{category_id}'
+
+
+def product(product_id):
+    return f'pages.product.{product_id}'
+
+
+def get_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 600)
+
+
+def is_cacheable(request):
+    if request.method not in ('GET', 'HEAD') or not get_timeout():
+        return False
+    if request.user.is_authenticated:
+        return False
+    # len() не помечает сообщения как прочитанные
+    return len(messages.get_messages(request)) == 0
+
+
+def page_key(request, versions):
+    params = sorted(
+        (name, value)
+        for name, values in request.GET.lists()
+        for value in values
+        if value != ''
+    )
+    raw = repr((request.path, params, sorted(versions.items())))
+    return f'{CACHE_NAMESPACE}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def _not_modified(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    return bool(if_none_match) and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*')
+
+
+def _public(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'PAGE_CACHE_MAX_AGE', 60))
+    return response
+
+
+def cache_anonymous_page(dependencies):
+    """Декоратор представления. dependencies(request, *args, **kwargs) -> список пространств имен."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                response = view_func(request, *args, **kwargs)
+                if not response.has_header('Cache-Control'):
+                    patch_cache_control(response, private=True)
+                return response
+
+            versions = caching.get_versions([CATALOG, *dependencies(request, *args, **kwargs)])
+            key = page_key(request, versions)
+            entry = cache.get(key)
+            if entry is not None:
+                content, content_type, etag = entry
+                if _not_modified(request, etag):
+                    return _public(HttpResponseNotModified(), etag)
+                return _public(HttpResponse(content, content_type=content_type), etag)
+
+            response = view_func(request, *args, **kwargs)
+            # Не кэшируем ошибки, редиректы и ответы, устанавливающие cookie (например, CSRF)
+            if response.status_code != 200 or response.streaming or response.cookies:
+                return response
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+            etag = quote_etag(hashlib.md5(response.content).hexdigest())
+            cache.set(key, (response.content, response['Content-Type'], etag), get_timeout())
+            if _not_modified(request, etag):
+                return _public(HttpResponseNotModified(), etag)
+            return _public(response, etag)
+        return wrapper
+    return decorator
+
+
+def purge_products(product_ids, category_ids=()):
+    """Сбросить страницы товаров, их категорий и общие списки."""
+    for product_id in set(product_ids):
+        caching.bump_version(product(product_id))
+    for category_id in set(category_ids):
+        if category_id:
+            caching.bump_version(category(category_id))
+    caching.bump_version(LISTING)
+
+
+def purge_all():
+    caching.bump_version(CATALOG)
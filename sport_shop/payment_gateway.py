@@ -0,0 +1,126 @@
+"""HTTP-клиент API ЮKassa.
+
+SDK ``yookassa`` хранит учетные данные в глобальной ``Configuration`` (при
+нескольких способах оплаты и потоках запросы уходят не от того магазина),
+открывает новое соединение на каждый запрос и не ограничивает время
+ожидания. Здесь вместо него:
+
+* отдельный клиент на каждую пару shop_id/secret_key (``get_client``),
+  клиенты переиспользуются между запросами и потоками;
+* ``requests.Session`` с пулом соединений (keep-alive, ``POOL_SIZE``);
+* таймауты на соединение и чтение (``CONNECT_TIMEOUT``, ``READ_TIMEOUT``);
+* заголовок ``Idempotence-Key`` для запросов, изменяющих данные: ключ
+  задает вызывающий код, поэтому повтор после таймаута не создаст второй
+  платеж;
+* ошибки — исключение ``GatewayError`` с признаком ``retryable``
+  (сетевые ошибки, 429 и 5xx можно повторить, остальные 4xx — нет).
+
+Повторы выполняет очередь задач (см. tasks.py), сам клиент не повторяет
+запросы.
+
+Настройки — словарь ``YOOKASSA`` (ENDPOINT позволяет направить запросы на
+локальный фейковый сервер, см. fake_yookassa.py).
+"""
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+DEFAULTS = {
+    'ENDPOINT': 'https://api.yookassa.ru/v3',
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'POOL_SIZE': 10,
+    'WEBHOOK_IPS': [],
+    'TRUSTED_PROXIES': [],
+}
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def get_setting(name):
+    return getattr(settings, 'YOOKASSA', {}).get(name, DEFAULTS[name])
+
+
+class GatewayError(Exception):
+    """Ошибка запроса к ЮKassa."""
+
+    def __init__(self, message, status=None, code='', retryable=False):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.retryable = retryable
+
+
+class YooKassaClient:
+    def __init__(self, shop_id, secret_key, endpoint=None, timeout=None, pool_size=None):
+        self.shop_id = shop_id
+        self.endpoint = (endpoint or get_setting('ENDPOINT')).rstrip('/')
+        self.timeout = timeout or (get_setting('CONNECT_TIMEOUT'), get_setting('READ_TIMEOUT'))
+        pool_size = pool_size or get_setting('POOL_SIZE')
+
+        self.session = requests.Session()
+        self.session.auth = (shop_id, secret_key)
+        self.session.headers['Content-Type'] = 'application/json'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, path, body=None, params=None, idempotence_key=None):
+        headers = {'Idempotence-Key': str(idempotence_key)} if idempotence_key else None
+        try:
+            response = self.session.request(
+                method, self.endpoint + path, json=body, params=params, headers=headers, timeout=self.timeout,
+            )
+        except requests.Timeout as error:
+            raise GatewayError(f'Таймаут запроса {method} {path}', retryable=True) from error
+        except requests.RequestException as error:
+            raise GatewayError(f'Ошибка соединения {method} {path}: {error}', retryable=True) from error
+
+        if response.status_code >= 400:
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            raise GatewayError(
+                f'{method} {path}: HTTP {response.status_code} {data.get("description", "")}'.strip(),
+                status=response.status_code,
+                code=data.get('code', ''),
+                retryable=response.status_code in RETRYABLE_STATUSES,
+            )
+        return response.json()
+
+    def create_payment(self, params, idempotence_key):
+        return self.request('POST', '/payments', body=params, idempotence_key=idempotence_key)
+
+    def get_payment(self, payment_id):
+        return self.request('GET', f'/payments/{payment_id}')
+
+    def list_payments(self, params):
+        """Платежи по фильтру params (например, created_at.gte) с переходом по страницам."""
+        params = {'limit': 100, **params}
+        while True:
+            page = self.request('GET', '/payments', params=params)
+            yield from page.get('items', [])
+            if not page.get('next_cursor'):
+                return
+            params['cursor'] = page['next_cursor']
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client(shop_id, secret_key):
+    """Клиент для учетных данных магазина (один на процесс)."""
+    key = (shop_id, secret_key, get_setting('ENDPOINT'))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = YooKassaClient(shop_id, secret_key)
+    return client
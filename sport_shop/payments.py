@@ -0,0 +1,273 @@
+"""Оплата заказов через ЮKassa.
+
+Платеж создается фоновой задачей (см. tasks.py), поэтому оформление заказа
+не ждет ответа платежного API. Покупатель попадает на страницу ожидания
+(``views.order_payment``), которая перенаправляет его на страницу ЮKassa,
+как только задача сохранит ссылку на оплату в заказе.
+
+Ключ идемпотентности хранится в заказе (``Order.payment_idempotence_key``)
+и создается один раз: повторные попытки задачи и повторная постановка в
+очередь не создадут второй платеж. Запросы к API выполняет клиент
+магазина из payment_gateway.py.
+
+Оплату подтверждает только ЮKassa, а не переход покупателя по return_url:
+
+* уведомления (webhook, ``views.yookassa_webhook``) принимаются с адресов
+  ``YOOKASSA['WEBHOOK_IPS']`` (за обратным прокси из
+  ``YOOKASSA['TRUSTED_PROXIES']`` - по X-Forwarded-For), сохраняются в
+  ``PaymentNotification``
+  (повторная доставка того же события отбрасывается) и обрабатываются
+  фоновой задачей, которая запрашивает актуальное состояние платежа у API:
+  содержимому уведомления не доверяем;
+* возврат покупателя на return_url ставит в очередь такую же сверку;
+* команда ``reconcile_payments`` по расписанию сверяет все ожидающие
+  оплаты заказы постраничным списком платежей (на случай потерянных
+  уведомлений).
+
+Статус заказа меняет ``apply_payment`` в транзакции с блокировкой строки
+заказа, поэтому повторная обработка одного платежа ничего не меняет.
+"""
+import ipaddress
+import logging
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import payment_gateway, tasks
+from .models import Order, PaymentNotification
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentError(tasks.PermanentError):
+    """Платеж не может быть создан (не настроен способ оплаты, запрос отклонен)."""
+
+
+def task_key(order_id):
+    return f'payment:{order_id}'
+
+
+def start_payment(order):
+    """Назначить заказу ключ идемпотентности и поставить создание платежа в очередь."""
+    Order.objects.filter(pk=order.pk, payment_idempotence_key__isnull=True).update(payment_idempotence_key=uuid.uuid4())
+    return tasks.enqueue(
+        'sport_shop.payments.create_payment',
+        args=[order.pk],
+        key=task_key(order.pk),
+        max_attempts=3,
+    )
+
+
+def payment_params(order):
+    return {
+        "amount": {
+            "value": str(order.total_price),
+            "currency": "RUB"
+        },
+        "confirmation": {
+            "type": "redirect",
+            "return_url": f"{settings.SITE_DOMAIN}/payment-success/{order.id}/"
+        },
+        "capture": True,
+        "description": f"Оплата заказа №{order.id} в Орех Маркет",
+        "metadata": {
+            "order_id": order.id
+        }
+    }
+
+
+def _credentials(order):
+    payment_method = order.payment_method
+    if payment_method is None or not payment_method.shop_id or not payment_method.secret_key:
+        raise PaymentError(f'Отсутствует shop_id или secret_key для заказа {order.id}')
+    return payment_method.shop_id, payment_method.secret_key
+
+
+def _prepare(order):
+    """Учетные данные магазина для заказа или None, если платеж создавать не нужно."""
+    if order.payment_url or order.status != 'pending_payment':
+        return None
+    credentials = _credentials(order)
+    if order.payment_idempotence_key is None:
+        raise PaymentError(f'У заказа {order.id} нет ключа идемпотентности платежа')
+    return credentials
+
+
+def _reraise(order, error):
+    """Повторяемые ошибки API - задаче на повтор, остальные - PaymentError."""
+    logger.warning('Ошибка запроса к ЮKassa для заказа %s: %s', order.id, error)
+    if error.retryable:
+        raise error
+    raise PaymentError(str(error)) from error
+
+
+def _payment_fields(payment):
+    return {
+        'payment_id': payment['id'],
+        'payment_url': payment['confirmation']['confirmation_url'],
+    }
+
+
+def create_payment(order_id):
+    """Задача: создать платеж ЮKassa и сохранить в заказе id платежа и ссылку на оплату."""
+    order = Order.objects.select_related('payment_method').get(pk=order_id)
+    credentials = _prepare(order)
+    if credentials is None:
+        return
+    try:
+        payment = payment_gateway.get_client(*credentials).create_payment(
+            payment_params(order), order.payment_idempotence_key,
+        )
+    except payment_gateway.GatewayError as error:
+        _reraise(order, error)
+    Order.objects.filter(pk=order_id).update(**_payment_fields(payment))
+
+
+def apply_payment(payment):
+    """Применить состояние платежа из API к заказу. Возвращает True, если заказ оплачен сейчас."""
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(payment_id=payment['id']).first()
+        if order is None or order.status != 'pending_payment':
+            return False
+        if payment['status'] == 'succeeded':
+            amount = payment.get('amount') or {}
+            if Decimal(str(amount.get('value', '0'))) != order.total_price or amount.get('currency') != 'RUB':
+                logger.error('Сумма платежа %s не совпадает с суммой заказа %s', payment['id'], order.id)
+                return False
+            order.status = 'processing'
+            order.save(update_fields=['status'])
+            return True
+        if payment['status'] == 'canceled':
+            # Покупатель сможет оплатить заказ заново новым платежом
+            order.payment_id = ''
+            order.payment_url = ''
+            order.payment_idempotence_key = None
+            order.save(update_fields=['payment_id', 'payment_url', 'payment_idempotence_key'])
+    return False
+
+
+def sync_payment(order_id):
+    """Задача: сверить платеж заказа с API. Возвращает платеж или None, если сверять нечего."""
+    order = Order.objects.select_related('payment_method').get(pk=order_id)
+    if order.status != 'pending_payment' or not order.payment_id:
+        return None
+    try:
+        payment = payment_gateway.get_client(*_credentials(order)).get_payment(order.payment_id)
+    except payment_gateway.GatewayError as error:
+        _reraise(order, error)
+    apply_payment(payment)
+    return payment
+
+
+def _in_networks(ip, setting):
+    try:
+        address = ipaddress.ip_address(ip.strip())
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network.strip(), strict=False)
+               for network in payment_gateway.get_setting(setting) if network.strip())
+
+
+def webhook_ip_allowed(ip):
+    return _in_networks(ip, 'WEBHOOK_IPS')
+
+
+def webhook_client_ip(request):
+    """Адрес отправителя уведомления с учетом доверенных прокси.
+
+    X-Forwarded-For учитывается, только если запрос пришел от прокси из
+    ``YOOKASSA['TRUSTED_PROXIES']``: адреса в заголовке просматриваются
+    справа налево, и первый адрес не из доверенных прокси - отправитель.
+    Левые элементы заголовка задает сам клиент, поэтому им не доверяем.
+    """
+    ip = request.META.get('REMOTE_ADDR', '')
+    if not _in_networks(ip, 'TRUSTED_PROXIES'):
+        return ip
+    forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+    for address in reversed([address for address in forwarded if address]):
+        ip = address
+        if not _in_networks(ip, 'TRUSTED_PROXIES'):
+            break
+    return ip
+
+
+def receive_notification(data):
+    """Сохранить уведомление и поставить его обработку в очередь.
+
+    Возвращает False для повторной доставки уже полученного события;
+    ValueError - уведомление не похоже на уведомление ЮKassa.
+    """
+    if not isinstance(data, dict) or data.get('type') != 'notification':
+        raise ValueError('Неверный тип уведомления')
+    event = data.get('event')
+    payment_id = (data.get('object') or {}).get('id')
+    if not isinstance(event, str) or not event.startswith('payment.') or not isinstance(payment_id, str):
+        raise ValueError('Неверное событие уведомления')
+    try:
+        with transaction.atomic():
+            notification = PaymentNotification.objects.create(payment_id=payment_id, event=event, payload=data)
+            tasks.enqueue('sport_shop.payments.process_notification', args=[notification.pk])
+    except IntegrityError:
+        return False
+    return True
+
+
+def process_notification(notification_id):
+    """Задача: проверить уведомление запросом к API и применить состояние платежа."""
+    notification = PaymentNotification.objects.get(pk=notification_id)
+    order = Order.objects.filter(payment_id=notification.payment_id).values_list('pk', flat=True).first()
+    payment = sync_payment(order) if order is not None else None
+    if payment is not None and f'payment.{payment["status"]}' != notification.event:
+        # Событие не подтвердилось: удаляем запись, чтобы не отбросить
+        # настоящее уведомление как повторное
+        logger.warning('Уведомление %s для платежа %s не подтверждено API', notification.event, notification.payment_id)
+        notification.delete()
+        return
+    PaymentNotification.objects.filter(pk=notification_id).update(processed_at=timezone.now())
+
+
+def reconcile(days=3):
+    """Сверить с API заказы, ожидающие оплаты не дольше days дней.
+
+    Платежи запрашиваются списком (страницами по 100) для каждого магазина,
+    отдельно - только те, которых нет в списке. Возвращает (проверено, оплачено).
+    """
+    orders = (Order.objects.filter(status='pending_payment', created_at__gte=timezone.now() - timedelta(days=days))
+              .exclude(payment_id='').select_related('payment_method'))
+    by_shop = defaultdict(list)
+    for order in orders:
+        try:
+            by_shop[_credentials(order)].append(order)
+        except PaymentError as error:
+            logger.warning('%s', error)
+
+    checked = paid = 0
+    for credentials, shop_orders in by_shop.items():
+        client = payment_gateway.get_client(*credentials)
+        pending = {order.payment_id for order in shop_orders}
+        since = min(order.created_at for order in shop_orders) - timedelta(minutes=5)
+        payments = client.list_payments({'created_at.gte': since.isoformat(timespec='milliseconds').replace('+00:00', 'Z')})
+        try:
+            for payment in payments:
+                if payment['id'] in pending:
+                    pending.discard(payment['id'])
+                    checked += 1
+                    paid += apply_payment(payment)
+                if not pending:
+                    break
+        except payment_gateway.GatewayError as error:
+            logger.warning('Не удалось получить список платежей магазина %s: %s', credentials[0], error)
+        for payment_id in pending:
+            try:
+                payment = client.get_payment(payment_id)
+            except payment_gateway.GatewayError as error:
+                logger.warning('Не удалось получить платеж %s: %s', payment_id, error)
+                continue
+            checked += 1
+            paid += apply_payment(payment)
+    return checked, paid
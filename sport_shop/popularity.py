@@ -0,0 +1,134 @@
+"""Рейтинг популярности товаров для главной страницы.
+
+Популярность = рейтинг товара * взвешенное количество заказов. Вес позиции
+заказа растет экспоненциально от фиксированной эпохи (``EPOCH``), поэтому
+старые заказы относительно «затухают» с периодом полураспада
+``HALF_LIFE_DAYS``, а уже накопленные значения не нужно пересчитывать со
+временем: порядок товаров от текущей даты не зависит. Это позволяет
+обновлять рейтинг инкрементально при каждом заказе и отзыве.
+
+Чтобы показатель степени не превысил диапазон float (2 ** 1024), веса
+считаются от начала текущей эры — каждые ``ERA_HALVINGS`` периодов
+полураспада от ``EPOCH``. Процесс, первым заметивший новую эру, ставит в
+очередь задач полный пересчет (``rebuild_popularity``), который переводит
+накопленные веса в масштаб новой эры.
+
+Настройки (``settings.POPULARITY``):
+    TOP_N           -- сколько товаров показывать на главной;
+    HALF_LIFE_DAYS  -- период полураспада веса заказа, None отключает затухание;
+    NEUTRAL_RATING  -- рейтинг для товаров без отзывов;
+    EPOCH           -- точка отсчета для весов.
+"""
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+from . import tasks
+from .models import Order, OrderItem, Product, ProductStats
+
+DEFAULTS = {
+    'TOP_N': 50,
+    'HALF_LIFE_DAYS': 30,
+    'NEUTRAL_RATING': 0.0,
+    'EPOCH': datetime(2025, 1, 1, tzinfo=timezone.utc),
+}
+# Длина эры в периодах полураспада: вес не превышает 2 ** ERA_HALVINGS
+ERA_HALVINGS = 512
+
+_era = 0
+
+
+def get_setting(name):
+    return getattr(settings, 'POPULARITY', {}).get(name, DEFAULTS[name])
+
+
+def order_weight(created_at):
+    """Вес одной позиции заказа, оформленного в момент created_at."""
+    half_life = get_setting('HALF_LIFE_DAYS')
+    if not half_life or created_at is None:
+        return 1.0
+    return 2.0 ** (_half_lives(created_at, half_life) - current_era(half_life) * ERA_HALVINGS)
+
+
+def _half_lives(moment, half_life):
+    return (moment - get_setting('EPOCH')).total_seconds() / 86400 / half_life
+
+
+def current_era(half_life):
+    """Номер текущей эры весов; при смене эры ставит в очередь пересчет весов."""
+    global _era
+    era = int(_half_lives(datetime.now(timezone.utc), half_life) // ERA_HALVINGS)
+    if era != _era:
+        _era = era
+        # Пересчет нужен один раз на эру, cache.add отсекает остальные процессы
+        if cache.add(f'popularity:era:{era}', True, None):
+            tasks.enqueue('sport_shop.popularity.rebuild_popularity', key='popularity:rebuild')
+    return era
+
+
+def score_expression(weight=F('order_weight')):
+    """SQL-выражение популярности для UPDATE по таблице ProductStats."""
+    rating = Case(
+        When(review_count=0, then=Value(float(get_setting('NEUTRAL_RATING')))),
+        default=Cast('avg_rating', FloatField()),
+        output_field=FloatField(),
+    )
+    return weight * rating
+
+
+def add_order_items(product_weights):
+    """Добавить веса новых позиций заказа. product_weights: {product_id: вес}."""
+    for product_id, weight in product_weights.items():
+        ProductStats.objects.filter(pk=product_id).update(
+            order_weight=F('order_weight') + weight,
+            popularity_score=score_expression(F('order_weight') + weight),
+        )
+
+
+def order_item_weight(order_item):
+    """Вес позиции заказа по дате оформления заказа."""
+    try:
+        created_at = order_item.order.created_at
+    except Order.DoesNotExist:
+        created_at = None
+    return order_weight(created_at)
+
+
+def refresh_score(product_id):
+    """Пересчитать популярность товара после изменения его рейтинга."""
+    ProductStats.objects.filter(pk=product_id).update(popularity_score=score_expression())
+
+
+def top_products(limit=None):
+    """Топ популярных товаров: одно чтение по индексу popularity_score."""
+    limit = limit or get_setting('TOP_N')
+    stats = ProductStats.objects.select_related('product').order_by('-popularity_score', 'product_id')[:limit]
+    # select_related по OneToOne заполняет и обратную ссылку product.stats
+    return [item.product for item in stats]
+
+
+def rebuild_popularity(batch_size=500):
+    """Полностью пересчитать веса заказов и популярность всех товаров."""
+    weights = {}
+    items = OrderItem.objects.values_list('product_variant__product_id', 'order__created_at')
+    for product_id, created_at in items.iterator(chunk_size=5000):
+        weights[product_id] = weights.get(product_id, 0.0) + order_weight(created_at)
+
+    total = 0
+    batch = []
+    for product_id in Product.objects.values_list('pk', flat=True).iterator(chunk_size=5000):
+        batch.append(ProductStats(product_id=product_id, order_weight=weights.get(product_id, 0.0)))
+        if len(batch) >= batch_size:
+            total += _save_weights(batch, batch_size)
+            batch = []
+    if batch:
+        total += _save_weights(batch, batch_size)
+    ProductStats.objects.update(popularity_score=score_expression())
+    return total
+
+
+def _save_weights(batch, batch_size):
+    return ProductStats.objects.bulk_update(batch, ['order_weight'], batch_size=batch_size)
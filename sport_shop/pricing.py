@@ -0,0 +1,195 @@
+"""Цены со скидками.
+
+Активные скидки (``Discount``) держатся в памяти процесса в виде индекса
+по товару и категории, поэтому цена варианта со скидкой считается без
+запросов к базе. Индекс перестраивается, когда скидки изменяются (версия
+пространства имен кэша ``discounts`` увеличивается сигналами) или когда
+наступает ближайшая граница периода действия какой-либо скидки.
+
+Для сортировки и фильтров каталога минимальная цена товара со скидкой
+хранится в ``ProductStats.min_effective_price`` и пересчитывается при
+изменении скидок, цен вариантов и на границах периодов скидок (лениво при
+первом обращении к индексу после границы или командой
+``refresh_effective_prices`` по расписанию).
+"""
+import threading
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from . import caching, facets, page_cache
+from .models import Discount, Product, ProductStats, ProductVariant
+
+NAMESPACE = 'discounts'
+CENT = Decimal('0.01')
+
+
+class DiscountIndex:
+    """Скидки, действующие в момент построения, сгруппированные по цели."""
+
+    def __init__(self, discounts, now):
+        self.built_at = now
+        self.by_product = defaultdict(list)
+        self.by_category = defaultdict(list)
+        self.common = []
+        # Ближайший момент, когда набор действующих скидок изменится
+        self.expires_at = None
+
+        for discount in discounts:
+            if discount.start_date and discount.start_date > now:
+                self._add_boundary(discount.start_date)
+                continue
+            if discount.end_date:
+                if discount.end_date <= now:
+                    continue
+                self._add_boundary(discount.end_date)
+
+            if discount.discount_type == 'product' and discount.product_id:
+                self.by_product[discount.product_id].append(discount)
+            elif discount.discount_type == 'category' and discount.category_id:
+                self.by_category[discount.category_id].append(discount)
+            elif discount.discount_type == 'all':
+                self.common.append(discount)
+
+    def _add_boundary(self, moment):
+        if self.expires_at is None or moment < self.expires_at:
+            self.expires_at = moment
+
+    def is_expired(self, now):
+        return self.expires_at is not None and now >= self.expires_at
+
+    def discounts_for(self, product_id, category_id):
+        return self.by_product.get(product_id, []) + self.by_category.get(category_id, []) + self.common
+
+    def price(self, price, product_id, category_id):
+        """Лучшая (минимальная) цена с учетом всех применимых скидок."""
+        if price is None:
+            return None
+        best = price
+        for discount in self.discounts_for(product_id, category_id):
+            best = min(best, Decimal(discount.calculate_discount(price)))
+        return best.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def load_discounts(now):
+    return Discount.objects.filter(is_active=True).filter(
+        Q(end_date__isnull=True) | Q(end_date__gt=now)
+    )
+
+
+def get_index():
+    """Индекс скидок текущего процесса; перестраивается при изменении версии или истечении."""
+    global _index, _index_version
+    now = timezone.now()
+    version = caching.get_version(NAMESPACE)
+    index = _index
+    if index is not None and _index_version == version and not index.is_expired(now):
+        return index
+
+    with _lock:
+        if _index is not None and _index_version == version and not _index.is_expired(now):
+            return _index
+        previous = _index
+        _index = DiscountIndex(list(load_discounts(now)), now)
+        _index_version = version
+        index = _index
+
+    if previous is not None and previous.is_expired(now):
+        _sync_window(previous, now)
+    return index
+
+
+def _sync_window(previous, now):
+    """Пересчитать цены товаров, скидки которых начались или закончились после
+    построения индекса previous и до now (за это время могло пройти несколько границ).
+
+    Выполняется одним процессом: отметка о первой границе ставится через cache.add.
+    """
+    if not cache.add(f'{NAMESPACE}:window:{previous.expires_at.timestamp()}', True, 86400):
+        return
+    since = previous.built_at
+    discounts = Discount.objects.filter(is_active=True).filter(
+        Q(start_date__gt=since, start_date__lte=now) | Q(end_date__gt=since, end_date__lte=now)
+    )
+    refresh_discount_targets(discounts)
+    facets.invalidate()
+    page_cache.purge_all()
+
+
+def effective_price(variant):
+    """Цена варианта со скидкой. Ожидает загруженный variant.product (select_related)."""
+    return get_index().price(variant.price, variant.product_id, variant.product.category_id)
+
+
+def discount_target_ids(discount):
+    """id товаров, на которые действует скидка; None - весь каталог."""
+    if discount.discount_type == 'all':
+        return None
+    if discount.discount_type == 'category':
+        if not discount.category_id:
+            return []
+        return list(Product.objects.filter(category_id=discount.category_id).values_list('pk', flat=True))
+    return [discount.product_id] if discount.product_id else []
+
+
+def refresh_discount_targets(discounts):
+    """Пересчитать цены товаров, затронутых скидками discounts."""
+    product_ids = set()
+    for discount in discounts:
+        target_ids = discount_target_ids(discount)
+        if target_ids is None:
+            return refresh_effective_prices()
+        product_ids.update(target_ids)
+    if product_ids:
+        return refresh_effective_prices(product_ids)
+    return 0
+
+
+def refresh_effective_prices(product_ids=None, batch_size=1000):
+    """Пересчитать ProductStats.min_effective_price. Возвращает количество измененных товаров."""
+    index = get_index()
+    if product_ids is None:
+        return _refresh_prices(index, ProductVariant.objects.all(), batch_size)
+    product_ids = list(product_ids)
+    total = 0
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+        total += _refresh_prices(index, ProductVariant.objects.filter(product_id__in=chunk), batch_size)
+    return total
+
+
+def _refresh_prices(index, variants, batch_size):
+    rows = variants.order_by('product_id').values_list(
+        'product_id', 'product__category_id', 'price', 'product__stats__min_effective_price',
+    )
+    # updated_at меняется вместе с ценой: по нему кэшируются карточки товаров
+    now = timezone.now()
+    changed = []
+    current_id = None
+    best = stored = None
+    for product_id, category_id, price, stored_price in rows.iterator(chunk_size=batch_size * 4):
+        if product_id != current_id:
+            if current_id is not None and best != stored:
+                changed.append(ProductStats(pk=current_id, min_effective_price=best, updated_at=now))
+            current_id, best, stored = product_id, None, stored_price
+        price = index.price(price, product_id, category_id)
+        if best is None or price < best:
+            best = price
+    if current_id is not None and best != stored:
+        changed.append(ProductStats(pk=current_id, min_effective_price=best, updated_at=now))
+
+    ProductStats.objects.bulk_update(changed, ['min_effective_price', 'updated_at'], batch_size=batch_size)
+    return len(changed)
+
+
+def invalidate():
+    """Сбросить индексы скидок во всех процессах."""
+    caching.bump_version(NAMESPACE)
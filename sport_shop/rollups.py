@@ -0,0 +1,152 @@
+"""Дневные сводки заказов и пользователей для дашборда панели управления.
+
+``DailyOrderStats`` хранит по строке на день и статус (количество заказов,
+сумма, число единиц товара), ``DailyUserStats`` — число новых покупателей
+за день. Сводки обновляются в той же транзакции, что и заказ (сигналы, см.
+signals.py, и ``place_order``, позиции которого создаются ``bulk_create``
+без сигналов), прибавлением к счетчикам через F(), поэтому параллельные
+заказы не теряют обновлений. Дашборд читает по строке на день и статус
+вместо подсчетов по всей таблице заказов.
+
+Смена флага is_staff у существующего пользователя сводки не меняет —
+расхождения исправляет команда ``rebuild_order_rollups``.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyOrderStats, DailyUserStats, Order, OrderItem
+
+PERIODS = (7, 30, 90, 365)
+# Выручка - заказы в этих статусах (как на дашборде раньше)
+REVENUE_STATUSES = ('shipped', 'delivered')
+
+
+def order_day(order):
+    return timezone.localdate(order.created_at)
+
+
+def _add(model, lookup, **deltas):
+    """Прибавить deltas к счетчикам строки lookup, создав ее при необходимости."""
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    if model.objects.filter(**lookup).update(**{field: F(field) + value for field, value in deltas.items()}):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # Строку успел создать параллельный запрос
+        model.objects.filter(**lookup).update(**{field: F(field) + value for field, value in deltas.items()})
+
+
+def add_orders(day, status, orders=0, revenue=Decimal('0'), items=0):
+    _add(DailyOrderStats, {'date': day, 'status': status}, orders=orders, revenue=revenue, items=items)
+
+
+def order_items(order_id):
+    return OrderItem.objects.filter(order_id=order_id).aggregate(total=Sum('quantity'))['total'] or 0
+
+
+def order_saved(order, previous):
+    """Учесть сохранение заказа; previous - (статус, сумма, дата) до сохранения или None."""
+    current = (order.status, order.total_price, order_day(order))
+    if previous is None:
+        add_orders(current[2], current[0], orders=1, revenue=current[1])
+        return
+    if previous == current:
+        return
+    # Единицы товара переносятся вместе с заказом, если сменился статус или дата
+    items = order_items(order.pk) if previous[0] != current[0] or previous[2] != current[2] else 0
+    add_orders(previous[2], previous[0], orders=-1, revenue=-previous[1], items=-items)
+    add_orders(current[2], current[0], orders=1, revenue=current[1], items=items)
+
+
+def order_deleted(order):
+    # Позиции удаляются раньше заказа и вычитаются своими сигналами
+    add_orders(order_day(order), order.status, orders=-1, revenue=-order.total_price)
+
+
+def items_changed(order_id, quantity):
+    """Прибавить quantity единиц товара к сводке заказа order_id."""
+    order = Order.objects.filter(pk=order_id).values('status', 'created_at').first()
+    if order is not None and quantity:
+        add_orders(timezone.localdate(order['created_at']), order['status'], items=quantity)
+
+
+def user_joined(user, delta=1):
+    if not user.is_staff:
+        _add(DailyUserStats, {'date': timezone.localdate(user.date_joined)}, new_users=delta)
+
+
+def rebuild():
+    """Пересчитать сводки по таблицам заказов и пользователей. Возвращает число строк."""
+    orders = {}
+    rows = (Order.objects.order_by().annotate(day=TruncDate('created_at'))
+            .values('day', 'status').annotate(orders_count=Count('pk'), revenue=Sum('total_price')))
+    for row in rows:
+        orders[row['day'], row['status']] = DailyOrderStats(
+            date=row['day'], status=row['status'], orders=row['orders_count'], revenue=row['revenue'] or 0,
+        )
+    items = (OrderItem.objects.order_by().annotate(day=TruncDate('order__created_at'))
+             .values('day', 'order__status').annotate(quantity=Sum('quantity')))
+    for row in items:
+        stats = orders.get((row['day'], row['order__status']))
+        if stats is not None:
+            stats.items = row['quantity']
+    users = (User.objects.filter(is_staff=False).order_by().annotate(day=TruncDate('date_joined'))
+             .values('day').annotate(count=Count('pk')))
+
+    with transaction.atomic():
+        DailyOrderStats.objects.all().delete()
+        DailyUserStats.objects.all().delete()
+        DailyOrderStats.objects.bulk_create(orders.values(), batch_size=1000)
+        DailyUserStats.objects.bulk_create(
+            [DailyUserStats(date=row['day'], new_users=row['count']) for row in users], batch_size=1000,
+        )
+    return len(orders)
+
+
+def dashboard(days):
+    """Показатели дашборда за последние days дней и за все время."""
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    labels = dict(Order.STATUS_CHOICES)
+
+    totals = DailyOrderStats.objects.aggregate(orders=Sum('orders'))
+    by_status = (DailyOrderStats.objects.order_by('status').values('status')
+                 .annotate(count=Sum('orders')).filter(count__gt=0))
+
+    series = {start + timedelta(days=offset): {'orders': 0, 'revenue': Decimal('0'), 'items': 0}
+              for offset in range(days)}
+    for row in DailyOrderStats.objects.filter(date__gte=start, date__lte=today).values('date', 'status', 'orders', 'revenue', 'items'):
+        day = series[row['date']]
+        day['orders'] += row['orders']
+        day['items'] += row['items']
+        if row['status'] in REVENUE_STATUSES:
+            day['revenue'] += row['revenue']
+
+    peak = max((day['orders'] for day in series.values()), default=0) or 1
+    chart = [
+        {'date': date, 'height': round(day['orders'] * 100 / peak), **day}
+        for date, day in series.items()
+    ]
+    return {
+        'total_orders': totals['orders'] or 0,
+        'total_users': DailyUserStats.objects.aggregate(total=Sum('new_users'))['total'] or 0,
+        'orders_by_status': [
+            {'status': row['status'], 'label': labels.get(row['status'], row['status']), 'count': row['count']}
+            for row in by_status
+        ],
+        'recent_orders': sum(day['orders'] for day in chart),
+        'recent_revenue': sum((day['revenue'] for day in chart), Decimal('0')),
+        'recent_items': sum(day['items'] for day in chart),
+        'recent_users': DailyUserStats.objects.filter(date__gte=start).aggregate(total=Sum('new_users'))['total'] or 0,
+        'chart': chart,
+    }
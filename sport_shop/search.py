@@ -0,0 +1,272 @@
+"""Полнотекстовый поиск товаров.
+
+Индекс хранит для каждого товара нормализованный текст (слова в нижнем
+регистре, русские слова приведены к основе стеммером Snowball), поэтому
+«протеина», «протеином» и «протеин» находят один и тот же товар. Каждое
+слово запроса ищется как префикс, что подходит для поиска по мере ввода.
+
+Бэкенд выбирается настройкой ``SEARCH_BACKEND`` (путь к классу) или по
+типу базы данных: FTS5 для SQLite, FULLTEXT для MySQL, иначе — icontains.
+Таблицы индекса создает миграция 0007, поддерживают сигналы (см.
+signals.py), пересобирает команда ``rebuild_search_index``.
+
+Поиск возвращает не больше ``MAX_RESULTS`` самых релевантных товаров:
+фильтры, фасеты и пагинация каталога применяются уже к ним, а страница
+результатов сообщает, если совпадений было больше.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+MAX_RESULTS = 500
+TABLE_NAME = 'sport_shop_product_search'
+
+WORD_RE = re.compile(r'\w+')
+MARKUP_RE = re.compile(r'<[^>]*>')
+CYRILLIC_RE = re.compile(r'[а-я]')
+
+# Стеммер Snowball для русского языка
+_RV_RE = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+_PERFECTIVE_GERUND_RE = re.compile(r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$')
+_REFLEXIVE_RE = re.compile(r'(с[яь])$')
+_ADJECTIVE_RE = re.compile(r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$')
+_PARTICIPLE_RE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+_VERB_RE = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)'
+    r'|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+_NOUN_RE = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+_DERIVATIONAL_RE = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+_DER_SUFFIX_RE = re.compile(r'ость?$')
+_SUPERLATIVE_RE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    """Привести слово к основе. Нерусские слова только переводятся в нижний регистр."""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.search(word):
+        return word
+    match = _RV_RE.match(word)
+    if not match:
+        return word
+    prefix, rv = match.groups()
+
+    # Шаг 1: деепричастие, либо возвратная частица и прилагательное/глагол/существительное
+    stripped = _PERFECTIVE_GERUND_RE.sub('', rv, 1)
+    if stripped != rv:
+        rv = stripped
+    else:
+        rv = _REFLEXIVE_RE.sub('', rv, 1)
+        stripped = _ADJECTIVE_RE.sub('', rv, 1)
+        if stripped != rv:
+            rv = _PARTICIPLE_RE.sub('', stripped, 1)
+        else:
+            stripped = _VERB_RE.sub('', rv, 1)
+            rv = stripped if stripped != rv else _NOUN_RE.sub('', rv, 1)
+
+    # Шаг 2: окончание «и»
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    # Шаг 3: словообразовательный суффикс в R2
+    if _DERIVATIONAL_RE.match(rv):
+        rv = _DER_SUFFIX_RE.sub('', rv, 1)
+    # Шаг 4: мягкий знак, превосходная степень, двойная «н»
+    if rv.endswith('ь'):
+        rv = rv[:-1]
+    else:
+        rv = _SUPERLATIVE_RE.sub('', rv, 1)
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    """Разбить текст на нормализованные слова, отбросив теги разметки описания."""
+    return [stem(word) for word in WORD_RE.findall(MARKUP_RE.sub(' ', text or ''))]
+
+
+def normalize(text):
+    return ' '.join(tokenize(text))
+
+
+def product_documents(products):
+    """Документы индекса: (id, название, категория, описание, варианты)."""
+    products = products.select_related('category').prefetch_related('variants')
+    for product in products.iterator(chunk_size=1000):
+        variants = ' '.join(
+            f'{variant.weight} {variant.price:.0f}' for variant in product.variants.all()
+        )
+        yield (
+            product.pk,
+            normalize(product.name),
+            normalize(product.category.name),
+            normalize(f'{product.description} {product.formatted_description_text}'),
+            variants,
+        )
+
+
+class BaseSearchBackend:
+    """Интерфейс бэкенда поиска."""
+
+    def index_products(self, product_ids, queryset=None):
+        """Обновить документы товаров; отсутствующие в базе товары удаляются из индекса."""
+        raise NotImplementedError
+
+    def rebuild(self, queryset=None):
+        raise NotImplementedError
+
+    def search(self, query, limit=MAX_RESULTS):
+        """Вернуть id товаров, отсортированные по релевантности."""
+        raise NotImplementedError
+
+
+class TableSearchBackend(BaseSearchBackend):
+    """Общая логика бэкендов, хранящих документы в отдельной таблице."""
+    columns = ('name', 'category', 'body', 'variants')
+    key_column = 'rowid'
+
+    def index_products(self, product_ids, queryset=None):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        queryset = Product.objects.all() if queryset is None else queryset
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE_NAME} WHERE {self.key_column} IN ({placeholders})', product_ids)
+            self._insert(cursor, product_documents(queryset.filter(pk__in=product_ids)))
+
+    def rebuild(self, queryset=None):
+        queryset = Product.objects.all() if queryset is None else queryset
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE_NAME}')
+            return self._insert(cursor, product_documents(queryset.order_by('pk')))
+
+    def _insert(self, cursor, documents, batch_size=500):
+        sql = 'INSERT INTO {table} ({key}, {columns}) VALUES (%s, %s, %s, %s, %s)'.format(
+            table=TABLE_NAME, key=self.key_column, columns=', '.join(self.columns),
+        )
+        total = 0
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            total += len(batch)
+        return total
+
+
+class SQLiteFTSBackend(TableSearchBackend):
+    """Виртуальная таблица FTS5 с префиксным индексом и ранжированием bm25."""
+    # Веса колонок для bm25: название важнее категории, категория важнее описания
+    weights = (10.0, 4.0, 1.0, 1.0)
+
+    def build_query(self, query):
+        # Каждое слово - префиксный терм в кавычках, чтобы спецсимволы FTS5 не ломали запрос
+        return ' '.join(f'"{token}"*' for token in tokenize(query))
+
+    def search(self, query, limit=MAX_RESULTS):
+        match = self.build_query(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {TABLE_NAME} WHERE {TABLE_NAME} MATCH %s '
+                f'ORDER BY bm25({TABLE_NAME}, {weights}) LIMIT %s',
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class MySQLFulltextBackend(TableSearchBackend):
+    """Таблица InnoDB с индексами FULLTEXT и поиском в BOOLEAN MODE.
+
+    Учтите, что InnoDB по умолчанию не индексирует слова короче
+    ``innodb_ft_min_token_size`` (3 символа).
+    """
+    key_column = 'product_id'
+
+    min_token_size = 3
+
+    def build_query(self, query):
+        tokens = [token for token in tokenize(query) if len(token) >= self.min_token_size]
+        return ' '.join(f'+{token}*' for token in tokens)
+
+    def search(self, query, limit=MAX_RESULTS):
+        match = self.build_query(query)
+        if not match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT product_id FROM {TABLE_NAME} '
+                f'WHERE MATCH(name, category, body, variants) AGAINST (%s IN BOOLEAN MODE) '
+                f'ORDER BY MATCH(name) AGAINST (%s IN BOOLEAN MODE) * 3 '
+                f'+ MATCH(name, category, body, variants) AGAINST (%s IN BOOLEAN MODE) DESC '
+                f'LIMIT %s',
+                [match, match, match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Запасной вариант без индекса: icontains по полям товара, без ранжирования."""
+
+    def index_products(self, product_ids, queryset=None):
+        pass
+
+    def rebuild(self, queryset=None):
+        return 0
+
+    def search(self, query, limit=MAX_RESULTS):
+        return list(
+            Product.objects.filter(
+                Q(name__icontains=query) |
+                Q(description__icontains=query) |
+                Q(category__name__icontains=query)
+            ).order_by('name').values_list('pk', flat=True)[:limit]
+        )
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'mysql': MySQLFulltextBackend,
+}
+
+_backend = None
+
+
+def backend_for_vendor(vendor):
+    backend_path = getattr(settings, 'SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    return VENDOR_BACKENDS.get(vendor, LikeSearchBackend)()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = backend_for_vendor(connection.vendor)
+    return _backend
+
+
+def index_products(product_ids):
+    """Задача очереди (см. tasks.py): обновить документы товаров в индексе."""
+    get_backend().index_products(product_ids)
+
+
+def search_products(query, limit=MAX_RESULTS):
+    """id найденных товаров по релевантности (не больше limit) и признак того,
+    что совпадений больше и часть из них отброшена."""
+    found_ids = get_backend().search(query, limit + 1)
+    return found_ids[:limit], len(found_ids) > limit
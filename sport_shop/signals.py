@@ -0,0 +1,252 @@
+"""Обработчики сигналов моделей магазина."""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, facets, images, page_cache, popularity, pricing, rollups, suggest, tasks
+from .context_processors import CATEGORIES_NAMESPACE, SITE_SETTINGS_NAMESPACE
+from .models import Category, Discount, Order, OrderItem, Product, ProductImage, ProductVariant, Review, SiteSettings, UserProfile
+from .stats import refresh_product_stats
+
+
+def schedule_stats_refresh(product_id):
+    """Пересчитать статистику товара после фиксации текущей транзакции."""
+    if product_id:
+        transaction.on_commit(lambda: refresh_product_stats(product_id))
+
+
+def schedule_search_reindex(product_ids):
+    """Поставить обновление документов товаров в поисковом индексе в очередь задач."""
+    product_ids = list(product_ids)
+    if product_ids:
+        # Повторные изменения одного товара до переиндексации объединяются
+        key = f'search:{product_ids[0]}' if len(product_ids) == 1 else ''
+        tasks.enqueue('sport_shop.search.index_products', args=[product_ids], key=key)
+
+
+def schedule_page_purge(product_id, category_ids=()):
+    """Сбросить кэш страниц товара и его категорий после фиксации транзакции."""
+    if not product_id:
+        return
+
+    def purge():
+        current = Product.objects.filter(pk=product_id).values_list('category_id', flat=True).first()
+        page_cache.purge_products([product_id], [current, *category_ids])
+    transaction.on_commit(purge)
+
+
+@receiver(pre_save, sender=Product)
+def product_pre_save(sender, instance, **kwargs):
+    # Прежняя категория: при переносе товара сбрасываются страницы обеих категорий
+    instance._previous_category_id = (
+        Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_pages_changed(sender, instance, **kwargs):
+    schedule_page_purge(instance.pk, [instance.category_id, getattr(instance, '_previous_category_id', None)])
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    # Пересчет и при изменении: от категории товара зависят скидки на категорию
+    schedule_stats_refresh(instance.pk)
+    schedule_search_reindex([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    schedule_search_reindex([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    if not created:
+        schedule_search_reindex(instance.products.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_names_changed(sender, **kwargs):
+    transaction.on_commit(suggest.invalidate)
+
+
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def product_variant_changed(sender, instance, **kwargs):
+    schedule_search_reindex([instance.product_id])
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_child_changed(sender, instance, **kwargs):
+    schedule_stats_refresh(instance.product_id)
+    schedule_page_purge(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def facets_changed(sender, **kwargs):
+    # Подключен после пересчета статистики: рейтинги и цены фасетов берутся из ProductStats
+    transaction.on_commit(facets.invalidate)
+
+
+@receiver(pre_save, sender=ProductImage)
+@receiver(pre_save, sender=UserProfile)
+@receiver(pre_save, sender=SiteSettings)
+def image_pre_save(sender, instance, **kwargs):
+    # При замене файла размеры сбрасываются (производных нового файла еще нет),
+    # а производные прежнего файла удаляются после сохранения
+    field, width_field, height_field, _ = images.TARGETS[sender._meta.label]
+    previous = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first() if instance.pk else None
+    instance._replaced_image = None
+    if previous != getattr(instance, field).name:
+        setattr(instance, width_field, None)
+        setattr(instance, height_field, None)
+        instance._replaced_image = previous or None
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_save, sender=SiteSettings)
+def image_saved(sender, instance, **kwargs):
+    replaced = getattr(instance, '_replaced_image', None)
+    if replaced:
+        presets = images.TARGETS[sender._meta.label][3]
+        transaction.on_commit(lambda: images.delete_renditions(replaced, presets))
+    images.schedule(sender._meta.label, instance.pk)
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_delete, sender=SiteSettings)
+def image_deleted(sender, instance, **kwargs):
+    field, _, _, presets = images.TARGETS[sender._meta.label]
+    name = getattr(instance, field).name
+    if name:
+        transaction.on_commit(lambda: images.delete_renditions(name, presets))
+
+
+def _order_item_product_id(order_item):
+    return ProductVariant.objects.filter(pk=order_item.product_variant_id).values_list('product_id', flat=True).first()
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_saved(sender, instance, created, **kwargs):
+    product_id = _order_item_product_id(instance)
+    if created and product_id:
+        weight = popularity.order_item_weight(instance)
+        transaction.on_commit(lambda: popularity.add_order_items({product_id: weight}))
+    schedule_stats_refresh(product_id)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_deleted(sender, instance, **kwargs):
+    product_id = _order_item_product_id(instance)
+    if product_id:
+        weight = popularity.order_item_weight(instance)
+        transaction.on_commit(lambda: popularity.add_order_items({product_id: -weight}))
+    schedule_stats_refresh(product_id)
+
+
+@receiver(pre_save, sender=Order)
+def order_pre_save(sender, instance, **kwargs):
+    # Прежние статус, сумма и дата заказа - чтобы перенести его в сводках
+    previous = Order.objects.filter(pk=instance.pk).values('status', 'total_price', 'created_at').first() if instance.pk else None
+    instance._rollup_previous = (
+        (previous['status'], previous['total_price'], timezone.localdate(previous['created_at'])) if previous else None
+    )
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, created, **kwargs):
+    rollups.order_saved(instance, None if created else getattr(instance, '_rollup_previous', None))
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    rollups.order_deleted(instance)
+
+
+@receiver(pre_save, sender=OrderItem)
+def order_item_pre_save(sender, instance, **kwargs):
+    instance._rollup_previous = (
+        OrderItem.objects.filter(pk=instance.pk).values_list('order_id', 'quantity').first() if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=OrderItem)
+def order_item_rollup(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, '_rollup_previous', None)
+    if previous is not None:
+        rollups.items_changed(previous[0], -previous[1])
+    rollups.items_changed(instance.order_id, instance.quantity)
+
+
+@receiver(post_delete, sender=OrderItem)
+def order_item_rollup_deleted(sender, instance, **kwargs):
+    rollups.items_changed(instance.order_id, -instance.quantity)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        rollups.user_joined(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    rollups.user_joined(instance, delta=-1)
+
+
+@receiver(pre_save, sender=Discount)
+def discount_pre_save(sender, instance, **kwargs):
+    # Запоминаем прежнюю цель скидки, чтобы пересчитать цены и у нее
+    instance._previous = Discount.objects.filter(pk=instance.pk).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def discount_changed(sender, instance, **kwargs):
+    discounts = [instance]
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        discounts.append(previous)
+
+    def refresh():
+        pricing.invalidate()
+        pricing.refresh_discount_targets(discounts)
+        facets.invalidate()
+        page_cache.purge_all()
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def categories_changed(sender, **kwargs):
+    transaction.on_commit(lambda: caching.bump_version(CATEGORIES_NAMESPACE))
+    transaction.on_commit(page_cache.purge_all)
+
+
+@receiver(post_save, sender=SiteSettings)
+@receiver(post_delete, sender=SiteSettings)
+def site_settings_changed(sender, **kwargs):
+    transaction.on_commit(lambda: caching.bump_version(SITE_SETTINGS_NAMESPACE))
+    transaction.on_commit(page_cache.purge_all)
@@ -0,0 +1,121 @@
+// Корзина без перезагрузки страницы (эндпоинты /api/cart/...).
+// Формы с атрибутом data-cart-api отправляются в JSON API; без JavaScript
+// они работают как обычные формы.
+(function () {
+    'use strict';
+
+    function formatPrice(value) {
+        return Math.round(Number(value)) + ' ₽';
+    }
+
+    function showMessage(text, level) {
+        var main = document.querySelector('main');
+        if (!text || !main) {
+            return;
+        }
+        var alert = document.createElement('div');
+        var close = document.createElement('button');
+        alert.className = 'alert alert-' + level + ' alert-dismissible fade show';
+        alert.setAttribute('role', 'alert');
+        alert.textContent = text;
+        close.type = 'button';
+        close.className = 'btn-close';
+        close.setAttribute('data-bs-dismiss', 'alert');
+        close.setAttribute('aria-label', 'Close');
+        alert.appendChild(close);
+        main.insertBefore(alert, main.firstChild);
+    }
+
+    function updateBadge(count) {
+        var icon = document.querySelector('.cart-icon');
+        if (!icon) {
+            return;
+        }
+        var badge = icon.querySelector('.cart-badge');
+        if (!count) {
+            if (badge) {
+                badge.remove();
+            }
+            return;
+        }
+        if (!badge) {
+            badge = document.createElement('span');
+            badge.className = 'cart-badge';
+            icon.appendChild(badge);
+        }
+        badge.textContent = count;
+    }
+
+    function updateCartPage(cart) {
+        var lines = {};
+        cart.lines.forEach(function (line) {
+            lines[line.variant_id] = line;
+        });
+        document.querySelectorAll('[data-cart-line]').forEach(function (element) {
+            var line = lines[element.dataset.cartLine];
+            if (!line) {
+                element.remove();
+                return;
+            }
+            element.querySelectorAll('[data-cart-line-total]').forEach(function (node) {
+                node.textContent = formatPrice(line.item_total);
+            });
+            element.querySelectorAll('[data-cart-line-quantity]').forEach(function (node) {
+                node.textContent = line.quantity;
+            });
+        });
+        document.querySelectorAll('[data-cart-count]').forEach(function (node) {
+            node.textContent = cart.count;
+        });
+        document.querySelectorAll('[data-cart-total]').forEach(function (node) {
+            node.textContent = formatPrice(cart.total);
+        });
+        if (!cart.count && document.querySelector('[data-cart-total]')) {
+            // Пустая корзина показывается отдельной разметкой
+            window.location.reload();
+        }
+    }
+
+    function submit(event) {
+        var form = event.target.closest('form[data-cart-api]');
+        if (!form) {
+            return;
+        }
+        event.preventDefault();
+        var button = form.querySelector('[type="submit"]');
+        if (button) {
+            button.disabled = true;
+        }
+        fetch(form.dataset.cartApi, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: {'X-Requested-With': 'XMLHttpRequest'},
+            credentials: 'same-origin'
+        })
+            .then(function (response) {
+                return response.json().then(function (data) {
+                    if (response.status === 401 && data.login_url) {
+                        window.location.href = data.login_url + '?next=' + encodeURIComponent(window.location.pathname);
+                        return;
+                    }
+                    if (data.cart) {
+                        updateBadge(data.cart.count);
+                        updateCartPage(data.cart);
+                        document.dispatchEvent(new CustomEvent('cart:updated', {detail: data.cart}));
+                    }
+                    showMessage(data.error || data.message, response.ok ? 'success' : 'danger');
+                });
+            })
+            .catch(function () {
+                // Сеть или неожиданный ответ: отправляем форму обычным способом
+                form.submit();
+            })
+            .finally(function () {
+                if (button) {
+                    button.disabled = false;
+                }
+            });
+    }
+
+    document.addEventListener('submit', submit);
+})();
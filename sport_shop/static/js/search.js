@@ -1 +1,81 @@
- 
\ No newline at end of file
+// Подсказки для строки поиска (эндпоинт /api/suggest/)
+(function () {
+    'use strict';
+
+    var DELAY = 120;
+
+    function setupSuggest(input) {
+        var form = input.form;
+        var url = input.dataset.suggestUrl;
+        var list = document.createElement('ul');
+        var timer = null;
+        var lastQuery = '';
+        var controller = null;
+
+        list.className = 'search-suggest';
+        list.hidden = true;
+        form.appendChild(list);
+
+        function hide() {
+            list.hidden = true;
+            list.innerHTML = '';
+        }
+
+        function render(results) {
+            list.innerHTML = '';
+            results.forEach(function (item) {
+                var li = document.createElement('li');
+                var link = document.createElement('a');
+                var icon = document.createElement('i');
+                icon.className = item.type === 'category' ? 'fas fa-tag' : 'fas fa-search';
+                link.href = item.url;
+                link.appendChild(icon);
+                link.appendChild(document.createTextNode(' ' + item.name));
+                li.appendChild(link);
+                list.appendChild(li);
+            });
+            list.hidden = results.length === 0;
+        }
+
+        function fetchSuggestions() {
+            var query = input.value.trim();
+            if (query === lastQuery) {
+                return;
+            }
+            lastQuery = query;
+            if (query.length < 2) {
+                hide();
+                return;
+            }
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            fetch(url + '?q=' + encodeURIComponent(query), {signal: controller.signal})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (data.query.trim() === input.value.trim()) {
+                        render(data.results);
+                    }
+                })
+                .catch(function () {});
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(fetchSuggestions, DELAY);
+        });
+        input.addEventListener('keydown', function (event) {
+            if (event.key === 'Escape') {
+                hide();
+            }
+        });
+        document.addEventListener('click', function (event) {
+            if (!form.contains(event.target)) {
+                hide();
+            }
+        });
+    }
+
+    document.querySelectorAll('input[data-suggest-url]').forEach(setupSuggest);
+})();
@@ -0,0 +1,111 @@
+"""Пересчет денормализованной статистики товаров (ProductStats)."""
+from django.db.models import Avg, Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import popularity, pricing
+from .models import OrderItem, Product, ProductImage, ProductStats, ProductVariant, Review
+
+STATS_FIELDS = [
+    'avg_rating', 'review_count', 'min_price', 'max_price', 'order_count',
+    'main_image', 'main_image_width', 'main_image_height', 'updated_at',
+]
+
+
+def refresh_product_stats(product_id):
+    """Пересчитать статистику одного товара. Возвращает ProductStats или None, если товар удален."""
+    category_id = Product.objects.filter(pk=product_id).values_list('category_id', flat=True).first()
+    if category_id is None:
+        return None
+
+    reviews = Review.objects.filter(product_id=product_id).aggregate(avg=Avg('rating'), count=Count('id'))
+    prices = list(ProductVariant.objects.filter(product_id=product_id).values_list('price', flat=True))
+    index = pricing.get_index()
+    effective_prices = [index.price(price, product_id, category_id) for price in prices]
+    order_count = OrderItem.objects.filter(product_variant__product_id=product_id).count()
+    main_image = ProductImage.objects.filter(product_id=product_id).order_by('order', 'pk').values_list('image', 'width', 'height').first()
+    main_image, main_image_width, main_image_height = main_image or ('', None, None)
+
+    stats, _ = ProductStats.objects.update_or_create(
+        product_id=product_id,
+        defaults={
+            'avg_rating': reviews['avg'] or 0,
+            'review_count': reviews['count'],
+            'min_price': min(prices, default=None),
+            'max_price': max(prices, default=None),
+            'min_effective_price': min(effective_prices, default=None),
+            'order_count': order_count,
+            'main_image': main_image,
+            'main_image_width': main_image_width,
+            'main_image_height': main_image_height,
+        }
+    )
+    popularity.refresh_score(product_id)
+    return stats
+
+
+def refresh_products(product_ids):
+    """Пересчитать статистику нескольких товаров (например, после bulk_create)."""
+    for product_id in set(product_ids):
+        refresh_product_stats(product_id)
+
+
+def _aggregate_subquery(queryset, expression, group_by='product_id'):
+    """Коррелированный подзапрос с агрегатом по одному товару без GROUP BY по всему каталогу."""
+    return Subquery(
+        queryset.order_by().values(group_by).annotate(value=expression).values('value')[:1]
+    )
+
+
+def rebuild_product_stats(batch_size=1000):
+    """Полностью пересобрать таблицу ProductStats. Возвращает количество обработанных товаров."""
+    reviews = Review.objects.filter(product_id=OuterRef('pk'))
+    variants = ProductVariant.objects.filter(product_id=OuterRef('pk'))
+    order_items = OrderItem.objects.filter(product_variant__product_id=OuterRef('pk'))
+    first_image = ProductImage.objects.filter(product_id=OuterRef('pk')).order_by('order', 'pk')
+
+    products = Product.objects.order_by('pk').annotate(
+        stats_avg_rating=_aggregate_subquery(reviews, Avg('rating')),
+        stats_review_count=_aggregate_subquery(reviews, Count('id')),
+        stats_min_price=_aggregate_subquery(variants, Min('price')),
+        stats_max_price=_aggregate_subquery(variants, Max('price')),
+        stats_order_count=Coalesce(_aggregate_subquery(order_items, Count('id'), 'product_variant__product_id'), 0),
+        stats_main_image=Subquery(first_image.values('image')[:1]),
+        stats_main_image_width=Subquery(first_image.values('width')[:1]),
+        stats_main_image_height=Subquery(first_image.values('height')[:1]),
+    ).values(
+        'pk', 'stats_avg_rating', 'stats_review_count', 'stats_min_price', 'stats_max_price',
+        'stats_order_count', 'stats_main_image', 'stats_main_image_width', 'stats_main_image_height',
+    )
+
+    total = 0
+    batch = []
+    for row in products.iterator(chunk_size=batch_size):
+        batch.append(ProductStats(
+            product_id=row['pk'],
+            avg_rating=row['stats_avg_rating'] or 0,
+            review_count=row['stats_review_count'] or 0,
+            min_price=row['stats_min_price'],
+            max_price=row['stats_max_price'],
+            order_count=row['stats_order_count'],
+            main_image=row['stats_main_image'] or '',
+            main_image_width=row['stats_main_image_width'],
+            main_image_height=row['stats_main_image_height'],
+        ))
+        if len(batch) >= batch_size:
+            total += _save_batch(batch)
+            batch = []
+    if batch:
+        total += _save_batch(batch)
+    ProductStats.objects.update(popularity_score=popularity.score_expression())
+    pricing.refresh_effective_prices(batch_size=batch_size)
+    return total
+
+
+def _save_batch(batch):
+    ProductStats.objects.bulk_create(
+        batch,
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=STATS_FIELDS,
+    )
+    return len(batch)
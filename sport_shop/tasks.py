@@ -0,0 +1,154 @@
+"""Фоновые задачи в очереди на таблице базы данных.
+
+Медленные побочные эффекты (обработка изображений, обращения к платежному
+API, переиндексация) ставятся в очередь функцией ``enqueue``: задача — это
+путь к функции и JSON-аргументы, сохраненные в модели ``Task`` в той же
+транзакции, что и изменения, которые ее породили. Поэтому задача не
+потеряется при сбое после фиксации и не выполнится, если транзакцию
+откатили.
+
+Задачи выполняет команда ``run_tasks`` в пуле потоков или процессов.
+Неудачная попытка повторяется с экспоненциальной задержкой
+(``TASKS_RETRY_DELAY``, ``TASKS_RETRY_MAX_DELAY``) до ``max_attempts``
+раз, после чего задача получает статус failed (сразу — если функция
+выбросила ``PermanentError``: повтор не поможет). Пока задача
+выполняется, воркер продлевает ее блокировку (``heartbeat``), поэтому
+долгая задача не достанется второму воркеру, а задачи упавшего воркера
+возвращаются в очередь через ``TASKS_LOCK_TIMEOUT`` секунд после
+последнего продления.
+
+В режиме ``TASKS_EAGER`` (разработка, тесты) задача выполняется сразу
+после фиксации транзакции в текущем процессе, один раз, без повторов;
+строка успешно выполненной задачи сразу удаляется (в этом режиме нет
+воркера, который чистит таблицу), ошибки остаются для разбора.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentError(Exception):
+    """Ошибка задачи, после которой повторять ее бессмысленно."""
+
+
+def is_eager():
+    return getattr(settings, 'TASKS_EAGER', False)
+
+
+def enqueue(name, args=(), kwargs=None, key='', max_attempts=None, delay=0):
+    """Поставить в очередь вызов функции name (путь для import_string).
+
+    Если задан key и в очереди уже есть ожидающая задача с таким ключом,
+    новая не создается (например, повторное сохранение изображения до
+    его обработки). Возвращает задачу.
+    """
+    if key:
+        existing = Task.objects.filter(key=key, status='pending').first()
+        if existing is not None:
+            return existing
+    task = Task.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        key=key,
+        max_attempts=1 if is_eager() else max_attempts or getattr(settings, 'TASKS_MAX_ATTEMPTS', 5),
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+    if is_eager():
+        transaction.on_commit(lambda: run_eager(task.pk))
+    return task
+
+
+def run_eager(pk):
+    if Task.objects.filter(pk=pk, status='pending').update(
+        status='running', locked_at=timezone.now(), attempts=F('attempts') + 1,
+    ) and execute(pk):
+        Task.objects.filter(pk=pk).delete()
+
+
+def retry_delay(attempts):
+    """Задержка перед попыткой после attempts неудачных, с разбросом до 10%."""
+    base = getattr(settings, 'TASKS_RETRY_DELAY', 10)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'TASKS_RETRY_MAX_DELAY', 3600))
+    return delay * random.uniform(1, 1.1)
+
+
+def claim(limit):
+    """Взять в работу до limit готовых задач. Возвращает их id.
+
+    Задача переводится в статус running условным UPDATE, поэтому одну
+    задачу не возьмут два воркера и без SELECT ... FOR UPDATE.
+    """
+    now = timezone.now()
+    candidates = Task.objects.filter(status='pending', run_at__lte=now).order_by('run_at').values_list('pk', flat=True)
+    claimed = []
+    for pk in candidates[:limit * 2]:
+        if Task.objects.filter(pk=pk, status='pending').update(
+            status='running', locked_at=now, attempts=F('attempts') + 1,
+        ):
+            claimed.append(pk)
+            if len(claimed) == limit:
+                break
+    return claimed
+
+
+def execute(pk):
+    """Выполнить взятую в работу задачу и записать результат."""
+    task = Task.objects.get(pk=pk)
+    try:
+        import_string(task.name)(*task.args, **task.kwargs)
+    except Exception as exception:
+        error = traceback.format_exc()
+        logger.exception('Задача %s #%s завершилась ошибкой (попытка %s)', task.name, pk, task.attempts)
+        if task.attempts < task.max_attempts and not isinstance(exception, PermanentError):
+            Task.objects.filter(pk=pk).update(
+                status='pending', locked_at=None, last_error=error,
+                run_at=timezone.now() + timedelta(seconds=retry_delay(task.attempts)),
+            )
+        else:
+            Task.objects.filter(pk=pk).update(
+                status='failed', locked_at=None, last_error=error, finished_at=timezone.now(),
+            )
+        return False
+    Task.objects.filter(pk=pk).update(status='done', locked_at=None, finished_at=timezone.now())
+    return True
+
+
+def heartbeat(pks):
+    """Продлить блокировку задач, которые воркер еще выполняет."""
+    if not pks:
+        return 0
+    return Task.objects.filter(pk__in=pks, status='running').update(locked_at=timezone.now())
+
+
+def requeue_stale():
+    """Вернуть в очередь задачи, блокировку которых давно не продлевали (воркер упал)."""
+    timeout = timedelta(seconds=getattr(settings, 'TASKS_LOCK_TIMEOUT', 600))
+    stale = Task.objects.filter(status='running', locked_at__lt=timezone.now() - timeout)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', locked_at=None, finished_at=timezone.now(), last_error='Превышено время выполнения',
+    )
+    return failed + stale.update(status='pending', locked_at=None)
+
+
+def purge_finished(days=None):
+    """Удалить выполненные задачи старше days дней (ошибки остаются для разбора)."""
+    days = getattr(settings, 'TASKS_KEEP_DAYS', 7) if days is None else days
+    deleted, _ = Task.objects.filter(status='done', finished_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
+
+
+def latest(key):
+    """Последняя задача с ключом key или None."""
+    return Task.objects.filter(key=key).order_by('-pk').first()
@@ -0,0 +1,49 @@
+"""Прогрев кэша скомпилированных шаблонов.
+
+Кэширующий загрузчик (см. TEMPLATES в settings.py) разбирает шаблон при
+первом обращении и хранит результат в памяти процесса. ``warm_templates()``
+компилирует все шаблоны проекта заранее — при запуске процесса (wsgi.py) и
+командой ``warm_templates`` при развертывании, — чтобы синтаксическая
+ошибка обнаруживалась сразу, а не на первом запросе посетителя.
+"""
+from pathlib import Path
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.template import TemplateSyntaxError, engines
+
+
+def template_dirs(engine):
+    """Каталоги шаблонов проекта: DIRS и templates приложения магазина (без шаблонов Django)."""
+    return [Path(directory) for directory in engine.dirs] + [
+        Path(apps.get_app_config('sport_shop').path) / 'templates',
+    ]
+
+
+def template_names(engine):
+    names = set()
+    for directory in template_dirs(engine):
+        for path in directory.rglob('*.html'):
+            names.add(path.relative_to(directory).as_posix())
+    return sorted(names)
+
+
+def warm_templates(using='django'):
+    """Скомпилировать все шаблоны проекта. Возвращает (количество шаблонов, {имя: ошибка})."""
+    engine = engines[using].engine
+    names = template_names(engine)
+    errors = {}
+    for name in names:
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError as e:
+            errors[name] = e
+    return len(names), errors
+
+
+def warm_on_startup():
+    """Прогреть шаблоны при запуске процесса; при ошибке процесс не стартует."""
+    _, errors = warm_templates()
+    if errors:
+        details = '; '.join(f'{name}: {error}' for name, error in errors.items())
+        raise ImproperlyConfigured(f'Ошибки в шаблонах: {details}')
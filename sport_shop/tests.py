@@ -1,3 +1,1061 @@
-from django.test import TestCase
+import json
+import math
+import shutil
+import tempfile
+import warnings
+from datetime import datetime, timedelta
+from io import BytesIO, StringIO
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import IntegrityError
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from . import (
+    cart as cart_module, facets, images, markup, page_cache, payment_gateway, payments, popularity, pricing, rollups,
+    search, suggest as suggest_module, tasks,
+)
+from .cart import Cart, CartError, CookieCartStore, parse_quantity
+from .context_processors import categories_and_settings
+from .models import (
+    Category, DailyOrderStats, Discount, Order, OrderItem, PaymentMethod, PaymentNotification, Product, ProductImage,
+    ProductStats, ProductVariant, Review, Task,
+)
+from .orders import OrderError, place_order
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ShopTestCase(TestCase):
+    """Общая подготовка: чистый кэш и индекс скидок, фабрики товаров."""
+
+    def setUp(self):
+        cache.clear()
+        pricing._index = None
+
+    def make_product(self, name='Протеин', price='100.00', category=None):
+        """Товар с одним вариантом; обработчики on_commit (статистика и т.п.) выполняются сразу."""
+        with self.captureOnCommitCallbacks(execute=True):
+            category = category or Category.objects.create(name='Протеины')
+            product = Product.objects.create(name=name, description='Описание', category=category)
+            variant = ProductVariant.objects.create(product=product, weight=1000, price=Decimal(price))
+        return product, variant
+
+    def make_user(self, username='buyer'):
+        return User.objects.create_user(username=username, password='password')
+
+    def new_order(self, user, **fields):
+        return Order(user=user, full_name='Иван Иванов', address='Москва', status='pending_payment', **fields)
+
+    def use_temp_media(self):
+        """Загруженные в тесте файлы пишутся во временный MEDIA_ROOT."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, name, size=(40, 30)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class ProductStatsTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product, self.variant = self.make_product(price='100.00')
+
+    def stats(self):
+        return ProductStats.objects.get(pk=self.product.pk)
+
+    def test_review_updates_rating_after_commit(self):
+        user = self.make_user()
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=user, rating=4, text='Хорошо')
+            self.assertEqual(self.stats().review_count, 0)
+        stats = self.stats()
+        self.assertEqual((stats.review_count, stats.avg_rating, stats.average_rating), (1, 4.0, 4))
+
+    def test_variant_price_change_updates_prices_and_version(self):
+        before = self.stats().updated_at
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variant.price = Decimal('80.00')
+            self.variant.save()
+            ProductVariant.objects.create(product=self.product, weight=2000, price=Decimal('150.00'))
+        stats = self.stats()
+        self.assertEqual((stats.min_price, stats.max_price, stats.min_effective_price),
+                         (Decimal('80.00'), Decimal('150.00'), Decimal('80.00')))
+        self.assertGreater(stats.updated_at, before)
+
+    def test_discount_updates_effective_price(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            discount = Discount.objects.create(name='Минус 25%', discount_type='category',
+                                               category=self.product.category, discount_percent=25)
+        self.assertEqual(self.stats().min_effective_price, Decimal('75.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            discount.delete()
+        self.assertEqual(self.stats().min_effective_price, Decimal('100.00'))
+
+    def test_main_image_follows_first_image_and_is_cleared_on_delete(self):
+        self.use_temp_media()
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ProductImage.objects.create(product=self.product, image=self.upload('first.jpg'), order=1)
+            ProductImage.objects.create(product=self.product, image=self.upload('second.jpg', size=(60, 20)), order=2)
+        first.refresh_from_db()
+        stats = self.stats()
+        self.assertEqual(stats.main_image.name, first.image.name)
+        self.assertEqual((stats.main_image_width, stats.main_image_height), (40, 30))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductImage.objects.filter(product=self.product).delete()
+        stats = self.stats()
+        self.assertEqual(stats.main_image.name, '')
+        self.assertIsNone(stats.main_image_width)
+
+
+@override_settings(POPULARITY={'TOP_N': 10, 'HALF_LIFE_DAYS': 30, 'NEUTRAL_RATING': 1.0})
+class PopularityTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(setattr, popularity, '_era', popularity._era)
+        self.user = self.make_user()
+
+    def order_at(self, moment, variant, quantity=1):
+        with mock.patch('django.utils.timezone.now', return_value=moment), \
+                self.captureOnCommitCallbacks(execute=True):
+            place_order(self.new_order(self.user), {variant.pk: quantity})
+
+    def test_recent_orders_outrank_older_ones(self):
+        now = timezone.now()
+        recent, recent_variant = self.make_product('Свежий')
+        old, old_variant = self.make_product('Старый', category=recent.category)
+        unsold, _ = self.make_product('Без заказов', category=recent.category)
+        self.order_at(now, recent_variant)
+        # Два заказа четыре периода полураспада назад весят 2 / 16 одного свежего
+        self.order_at(now - timedelta(days=120), old_variant)
+        self.order_at(now - timedelta(days=120), old_variant)
+
+        self.assertEqual(popularity.top_products(), [recent, old, unsold])
+        weights = dict(ProductStats.objects.values_list('product_id', 'order_weight'))
+        self.assertAlmostEqual(weights[old.pk] / weights[recent.pk], 1 / 8, places=3)
+
+        # Полный пересчет дает те же веса, что и инкрементные обновления
+        popularity.rebuild_popularity()
+        rebuilt = dict(ProductStats.objects.values_list('product_id', 'order_weight'))
+        for product_id, weight in weights.items():
+            self.assertAlmostEqual(rebuilt[product_id], weight, delta=weight * 1e-9)
+        self.assertEqual(popularity.top_products(), [recent, old, unsold])
+
+        # Заполнение в миграции 0006 считает веса так же
+        ProductStats.objects.update(order_weight=0, popularity_score=0)
+        migration = import_module('sport_shop.migrations.0006_productstats_popularity')
+        migration.populate_popularity(django_apps, None)
+        backfilled = dict(ProductStats.objects.values_list('product_id', 'order_weight'))
+        for product_id, weight in weights.items():
+            self.assertAlmostEqual(backfilled[product_id], weight, delta=weight * 1e-9)
+        self.assertEqual(popularity.top_products(), [recent, old, unsold])
+
+    def test_weights_stay_finite_in_later_eras(self):
+        half_life = timedelta(days=30)
+        epoch = popularity.get_setting('EPOCH')
+        # Третья эра: без сдвига показатель степени превысил бы диапазон float
+        later = epoch + half_life * (popularity.ERA_HALVINGS * 2 + 100)
+
+        class LaterDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return later
+
+        with mock.patch.object(popularity, 'datetime', LaterDatetime), \
+                mock.patch.object(popularity.tasks, 'enqueue') as enqueue:
+            latest = popularity.order_weight(later)
+            previous = popularity.order_weight(later - half_life)
+            ancient = popularity.order_weight(epoch)
+            popularity.order_weight(later)
+        self.assertAlmostEqual(latest, 2.0 ** 100)
+        self.assertAlmostEqual(previous / latest, 0.5)
+        self.assertTrue(math.isfinite(ancient))
+        self.assertLess(ancient, previous)
+        # Пересчет весов при смене эры ставится в очередь один раз
+        enqueue.assert_called_once_with('sport_shop.popularity.rebuild_popularity', key='popularity:rebuild')
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_a_stem(self):
+        for forms in (('протеин', 'протеина', 'протеином', 'Протеины'),
+                      ('гантели', 'гантелей'), ('бегущий', 'бегущая'), ('Ёлка', 'елки')):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({search.stem(word) for word in forms}), 1)
+
+    def test_non_cyrillic_words_are_only_lowercased(self):
+        self.assertEqual(search.tokenize('Whey <b>Gold</b> 2000'), ['whey', 'gold', '2000'])
+
+
+class SearchQueryTests(TestCase):
+    def test_fts_syntax_is_quoted_away(self):
+        backend = search.SQLiteFTSBackend()
+        self.assertEqual(backend.build_query('"прот*еин" -соя'), '"прот"* "еин"* "со"*')
+        self.assertEqual(backend.build_query('NEAR(a b) OR c'), '"near"* "a"* "b"* "or"* "c"*')
+
+    def test_mysql_query_requires_every_long_enough_word(self):
+        backend = search.MySQLFulltextBackend()
+        self.assertEqual(backend.build_query('"протеины" -соя +ab'), '+протеин*')
+
+    def test_empty_queries_match_nothing(self):
+        for query in ('', '   ', '*', '"-"'):
+            with self.subTest(query=query):
+                self.assertEqual(search.SQLiteFTSBackend().build_query(query), '')
+                self.assertEqual(search.SQLiteFTSBackend().search(query), [])
+                self.assertEqual(search.MySQLFulltextBackend().build_query(query), '')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ProductSearchTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        search._backend = None
+        self.addCleanup(setattr, search, '_backend', None)
+        self.category = Category.objects.create(name='Спортпит')
+
+    def make_described(self, name, description):
+        product, _ = self.make_product(name, category=self.category)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.description = description
+            product.save()
+        return product
+
+    def test_name_matches_rank_above_description_matches(self):
+        other = self.make_described('Гейнер', 'Смесь с сывороточным протеином')
+        named = self.make_described('Протеин сывороточный', 'Порошок')
+        self.make_described('Креатин', 'Моногидрат')
+
+        self.assertEqual(search.search_products('протеины'), ([named.pk, other.pk], False))
+        self.assertEqual(search.search_products('сывороточн прот'), ([named.pk, other.pk], False))
+        self.assertEqual(search.search_products('протеины', limit=1), ([named.pk], True))
+
+    def test_index_follows_product_save_and_delete(self):
+        product = self.make_described('Гейнер', 'Порошок')
+        self.assertEqual(search.search_products('гейнер')[0], [product.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Изолят'
+            product.save()
+        self.assertEqual(search.search_products('гейнер')[0], [])
+        self.assertEqual(search.search_products('изолят')[0], [product.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(search.search_products('изолят')[0], [])
+
+    def test_empty_relevance_results_are_paginated_in_stable_order(self):
+        self.make_described('Креатин', 'Моногидрат')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            response = self.client.get(reverse('product_list'), {'query': 'несуществующее', 'sort_by': 'relevance'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['products']), [])
+
+
+class SuggestIndexTests(TestCase):
+    def setUp(self):
+        self.index = suggest_module.SuggestIndex([
+            (suggest_module.CATEGORY, 1, 'Протеины'),
+            (suggest_module.PRODUCT, 10, 'Сывороточный протеин'),
+            (suggest_module.PRODUCT, 11, 'Протеиновый батончик'),
+            (suggest_module.PRODUCT, 12, 'Ёршик для шейкера'),
+            (suggest_module.PRODUCT, 13, 'Гейнер'),
+        ])
+
+    def names(self, query, limit=10):
+        return [item['name'] for item in self.index.lookup(query, limit)]
+
+    def test_prefix_matches_word_starts_case_insensitively(self):
+        # Совпадения с начала названия - выше, среди них короткие названия - выше
+        self.assertEqual(self.names('ПРОТ'), ['Протеины', 'Протеиновый батончик', 'Сывороточный протеин'])
+        self.assertEqual(self.names('бат'), ['Протеиновый батончик'])
+        self.assertEqual(self.names('ейнер'), [])
+        self.assertEqual(self.names('   '), [])
+
+    def test_yo_and_e_are_equivalent(self):
+        self.assertEqual(self.names('ерш'), ['Ёршик для шейкера'])
+        self.assertEqual(self.names('шЁйк'), ['Ёршик для шейкера'])
+
+    def test_limit_and_result_shape(self):
+        self.assertEqual(self.names('прот', limit=1), ['Протеины'])
+        self.assertEqual(self.index.lookup('гей'), [{'type': 'product', 'id': 13, 'name': 'Гейнер'}])
+        self.assertEqual(self.index.lookup('протеины')[0]['type'], 'category')
+
+
+class SuggestInvalidationTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        for name, value in (('_index', None), ('_index_version', None), ('_rebuilding', False)):
+            setattr(suggest_module, name, value)
+            self.addCleanup(setattr, suggest_module, name, value)
+
+    def names(self, query):
+        return [item['name'] for item in suggest_module.suggest(query)]
+
+    def rebuild_after(self, change):
+        """Выполнить change; пересборку, которую запрос ставит в фоновый поток, выполнить сразу."""
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        with mock.patch.object(suggest_module.threading, 'Thread') as thread:
+            stale = self.names('гей')
+        thread.assert_called_once()
+        suggest_module._rebuild(*thread.call_args.kwargs['args'])
+        return stale
+
+    def test_rename_and_delete_rebuild_the_index(self):
+        product, _ = self.make_product('Гейнер')
+        self.assertEqual(self.names('гей'), ['Гейнер'])
+
+        def rename():
+            product.name = 'Изолят'
+            product.save()
+        # До пересборки отвечает прежний индекс
+        self.assertEqual(self.rebuild_after(rename), ['Гейнер'])
+        self.assertEqual(self.names('гей'), [])
+        self.assertEqual(self.names('изо'), ['Изолят'])
+
+        self.rebuild_after(product.delete)
+        self.assertEqual(self.names('изо'), [])
+
+
+class PageCacheDecoratorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+        @page_cache.cache_anonymous_page(lambda request: [page_cache.LISTING])
+        def view(request):
+            self.calls += 1
+            return HttpResponse(f'страница {self.calls}')
+        self.view = view
+
+    def request(self, method='get', user=None, **extra):
+        request = getattr(RequestFactory(), method)('/products/', {'b': '2', 'a': '1', 'empty': ''}, **extra)
+        request.user = user or AnonymousUser()
+        return request
+
+    def test_miss_then_hit_with_etag_and_public_cache_control(self):
+        first = self.view(self.request())
+        second = self.view(self.request())
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertIn('public', second['Cache-Control'])
+        self.assertIn('max-age=60', second['Cache-Control'])
+
+    def test_matching_if_none_match_returns_304(self):
+        etag = self.view(self.request())['ETag']
+        response = self.view(self.request(HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.view(self.request(HTTP_IF_NONE_MATCH='"другой"')).status_code, 200)
+        self.assertEqual(self.calls, 1)
+
+    def test_authenticated_and_non_get_requests_bypass_the_cache(self):
+        self.view(self.request())
+        user = User(username='buyer')
+        for request in (self.request(user=user), self.request(method='post'), self.request(user=user)):
+            response = self.view(request)
+            self.assertIn('private', response['Cache-Control'])
+            self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(self.calls, 4)
+
+    def test_purge_invalidates_pages(self):
+        self.view(self.request())
+        page_cache.purge_products([1])
+        self.view(self.request())
+        page_cache.purge_all()
+        self.view(self.request())
+        self.assertEqual(self.calls, 3)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class PageCacheTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product, self.variant = self.make_product('Гейнер')
+        self.other, _ = self.make_product('Креатин', category=Category.objects.create(name='Креатины'))
+        renders = mock.patch('sport_shop.views.render', wraps=render)
+        self.render = renders.start()
+        self.addCleanup(renders.stop)
+
+    def rendered(self, product):
+        """Была ли страница товара отрисована заново, а не взята из кэша."""
+        self.render.reset_mock()
+        response = self.client.get(reverse('product_detail', args=[product.pk]))
+        self.assertEqual(response.status_code, 200)
+        return self.render.called
+
+    def test_product_changes_purge_only_affected_pages(self):
+        self.assertTrue(self.rendered(self.product))
+        self.assertTrue(self.rendered(self.other))
+        self.assertFalse(self.rendered(self.product))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.variant.price = Decimal('80.00')
+            self.variant.save()
+        self.assertTrue(self.rendered(self.product))
+        self.assertFalse(self.rendered(self.other))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.make_user(), rating=5, text='Отлично')
+        self.assertTrue(self.rendered(self.product))
+        self.assertFalse(self.rendered(self.other))
+
+    def test_discount_purges_every_page(self):
+        self.rendered(self.product)
+        self.rendered(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            Discount.objects.create(name='Минус 10%', discount_type='product', product=self.product, discount_percent=10)
+        self.assertTrue(self.rendered(self.other))
+
+    def test_listing_is_purged_when_a_product_is_renamed(self):
+        self.client.get(reverse('product_list'))
+        self.render.reset_mock()
+        self.assertNotContains(self.client.get(reverse('product_list')), 'Изолят')
+        self.assertFalse(self.render.called)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Изолят'
+            self.product.save()
+        self.assertContains(self.client.get(reverse('product_list')), 'Изолят')
+
+    def test_logged_in_visitors_get_fresh_private_pages(self):
+        self.rendered(self.product)
+        self.client.force_login(self.make_user())
+        self.assertTrue(self.rendered(self.product))
+        response = self.client.get(reverse('product_detail', args=[self.product.pk]))
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_benchmark_measures_uncached_pages(self):
+        out = StringIO()
+        call_command('benchmark_product_list', products=30, repeat=2, stdout=out)
+        rows = [line for line in out.getvalue().splitlines() if line.endswith('запросов')]
+        self.assertEqual(len(rows), 6)
+        for row in rows:
+            # Попадание в кэш страниц не выполняет ни одного запроса
+            self.assertGreater(int(row.split()[-2]), 0, row)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class FacetTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.gainers = Category.objects.create(name='Гейнеры')
+        self.creatine = Category.objects.create(name='Креатин')
+        self.cheap = self.make_catalog_product('Дешевый', self.gainers, '100.00', 1000, rating=5)
+        self.expensive = self.make_catalog_product('Дорогой', self.gainers, '300.00', 2000, rating=3)
+        self.light = self.make_catalog_product('Легкий', self.gainers, '150.00', 500)
+        self.other = self.make_catalog_product('Моногидрат', self.creatine, '120.00', 1000, rating=4)
+
+    def make_catalog_product(self, name, category, price, weight, rating=None):
+        product, variant = self.make_product(name, price=price, category=category)
+        with self.captureOnCommitCallbacks(execute=True):
+            variant.weight = weight
+            variant.save()
+            if rating:
+                Review.objects.create(product=product, user=self.make_user(f'user-{name}'), rating=rating, text='Отзыв')
+        return product
+
+    def test_counts_match_filtered_products(self):
+        params = {'category': self.gainers.pk, 'min_weight': '800', 'max_weight': '2500',
+                  'min_price': '90', 'max_price': '200'}
+        response = self.client.get(reverse('product_list'), params)
+        page = response.context['products']
+        self.assertEqual([product.pk for product in page], [self.cheap.pk])
+
+        categories = {facet['id']: facet['count'] for facet in response.context['category_facets']}
+        self.assertEqual(categories, {self.gainers.pk: page.paginator.count, self.creatine.pk: 1})
+        # Счетчики рейтинга учитывают категорию, но не собственный фильтр рейтинга
+        ratings = {facet['value']: facet['count'] for facet in response.context['rating_facets']}
+        self.assertEqual(ratings, {'4': 1, '3': 1, '2': 1})
+
+        rated = self.client.get(reverse('product_list'), {**params, 'min_rating': '4', 'category': self.creatine.pk})
+        self.assertEqual([product.pk for product in rated.context['products']], [self.other.pk])
+        categories = {facet['id']: facet['count'] for facet in rated.context['category_facets']}
+        self.assertEqual(categories, {self.gainers.pk: 1, self.creatine.pk: 1})
+
+    def test_ranges_per_category_and_catalog_follow_price_changes(self):
+        self.assertEqual(facets.get_ranges(self.gainers.pk), {
+            'min_price': Decimal('100.00'), 'max_price': Decimal('300.00'), 'min_weight': 500, 'max_weight': 2000,
+        })
+        self.assertEqual(facets.get_ranges(None)['min_weight'], 500)
+        self.assertEqual(facets.get_ranges('abc'), facets.get_ranges(None))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            variant = ProductVariant.objects.get(product=self.other)
+            variant.price = Decimal('50.00')
+            variant.save()
+        self.assertEqual(facets.get_ranges(None)['min_price'], Decimal('50.00'))
+        self.assertEqual(facets.get_ranges(self.gainers.pk)['min_price'], Decimal('100.00'))
+
+
+class DiscountWindowTests(ShopTestCase):
+    def effective_price(self, product):
+        return ProductStats.objects.get(pk=product.pk).min_effective_price
+
+    def test_all_boundaries_passed_since_build_are_repriced(self):
+        first, _ = self.make_product('Первый')
+        second, _ = self.make_product('Второй', category=first.category)
+        now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            Discount.objects.create(name='Скоро', discount_type='product', product=first,
+                                    discount_percent=10, start_date=now + timedelta(hours=1))
+            Discount.objects.create(name='Позже', discount_type='product', product=second,
+                                    discount_percent=50, start_date=now + timedelta(hours=2))
+        pricing.get_index()
+        self.assertEqual(self.effective_price(second), Decimal('100.00'))
+
+        # Обе скидки начались до следующего обращения к индексу
+        with mock.patch('django.utils.timezone.now', return_value=now + timedelta(hours=3)):
+            pricing.get_index()
+        self.assertEqual(self.effective_price(first), Decimal('90.00'))
+        self.assertEqual(self.effective_price(second), Decimal('50.00'))
+
+
+class MarkupTests(TestCase):
+    def test_html_outside_tags_is_escaped(self):
+        html = markup.render('<script>alert(1)</script><img src=x onerror=alert(1)>')
+        self.assertNotIn('<script', html)
+        self.assertNotIn('<img', html)
+        self.assertIn('&lt;script&gt;', html)
+
+    def test_unsafe_link_keeps_only_text(self):
+        html = markup.render('<link="javascript:alert(1)">нажми</link>')
+        self.assertNotIn('javascript:', html)
+        self.assertNotIn('<a ', html)
+        self.assertIn('нажми', html)
+
+    def test_unsafe_media_urls_are_dropped(self):
+        for value in ('<image>javascript:alert(1)</image>', '<image> JaVaScRiPt:alert(1)</image>',
+                      '<vid>data:text/html,<script>x</script></vid>', '<image>//evil.example/x.png</image>'):
+            with self.subTest(value=value):
+                html = markup.render(value)
+                self.assertNotIn('<img', html)
+                self.assertNotIn('<video', html)
+
+    def test_quotes_in_urls_do_not_break_out_of_attributes(self):
+        html = markup.render('<image>https://example.com/x.png" onerror="alert(1)</image>')
+        self.assertIn('<img src="https://example.com/x.png&quot; onerror=&quot;alert(1)"', html)
+
+    def test_safe_markup_is_rendered_and_unclosed_tags_closed(self):
+        html = markup.render('<b>жирный <link="https://example.com">ссылка')
+        self.assertIn('<strong>жирный ', html)
+        self.assertIn('href="https://example.com"', html)
+        self.assertTrue(html.endswith('</a></strong>'))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ProductDescriptionTests(ShopTestCase):
+    def test_plain_description_is_used_for_meta_description(self):
+        product, _ = self.make_product()
+        product.formatted_description_text = '<b>Сывороточный</b> <link="https://example.com">протеин</link><image>/a.png</image>'
+        product.save()
+        self.assertEqual(product.description_plain, 'Сывороточный протеин')
+
+        response = self.client.get(reverse('product_detail', args=[product.pk]))
+        self.assertContains(response, '<meta name="description" content="Сывороточный протеин">', html=False)
+
+
+class PlaceOrderTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user()
+        self.product, self.variant = self.make_product(price='100.00')
+        _, self.other_variant = self.make_product('Гейнер', price='250.50', category=self.product.category)
+
+    def test_total_uses_discounted_prices_and_quantities(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Discount.objects.create(name='Минус 10%', discount_type='product', product=self.product, discount_percent=10)
+        order = place_order(self.new_order(self.user), {str(self.variant.pk): 2, self.other_variant.pk: '1'})
+
+        self.assertEqual(order.total_price, Decimal('430.50'))
+        items = {item.product_variant_id: item for item in OrderItem.objects.filter(order=order)}
+        self.assertEqual(items[self.variant.pk].price, Decimal('90.00'))
+        self.assertEqual(items[self.variant.pk].quantity, 2)
+        self.assertEqual(items[self.other_variant.pk].price, Decimal('250.50'))
+
+    def test_missing_variant_writes_nothing(self):
+        with self.assertRaises(OrderError):
+            place_order(self.new_order(self.user), {self.variant.pk: 1, self.other_variant.pk + 100: 1})
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(DailyOrderStats.objects.exists())
+
+    def test_invalid_quantities_are_rejected(self):
+        for quantities in ({}, {self.variant.pk: 0}, {self.variant.pk: -1}):
+            with self.subTest(quantities=quantities), self.assertRaises(OrderError):
+                place_order(self.new_order(self.user), quantities)
+        self.assertFalse(Order.objects.exists())
+
+    def test_failure_while_saving_items_rolls_back_order(self):
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=IntegrityError), \
+                self.assertRaises(IntegrityError):
+            place_order(self.new_order(self.user), {self.variant.pk: 1})
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(DailyOrderStats.objects.exists())
+
+
+class OrderRollupTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.make_user()
+        _, self.variant = self.make_product(price='100.00')
+        self.day = timezone.localdate()
+
+    def rows(self):
+        """Непустые строки сводки: {статус: (заказов, сумма, единиц)}."""
+        return {
+            stats.status: (stats.orders, stats.revenue, stats.items)
+            for stats in DailyOrderStats.objects.filter(date=self.day)
+            if stats.orders or stats.revenue or stats.items
+        }
+
+    def assertMatchesRebuild(self):
+        incremental = self.rows()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rows())
+
+    def test_place_order_counts_order_once(self):
+        place_order(self.new_order(self.user), {self.variant.pk: 3})
+        self.assertEqual(self.rows(), {'pending_payment': (1, Decimal('300.00'), 3)})
+        self.assertMatchesRebuild()
+
+    def test_status_change_moves_order_once(self):
+        order = place_order(self.new_order(self.user), {self.variant.pk: 2})
+        for status in ('processing', 'shipped'):
+            order.status = status
+            order.save()
+            self.assertEqual(self.rows(), {status: (1, Decimal('200.00'), 2)})
+
+        # Повторное сохранение без изменений сводку не трогает
+        order.save()
+        Order.objects.get(pk=order.pk).save()
+        self.assertEqual(self.rows(), {'shipped': (1, Decimal('200.00'), 2)})
+        self.assertEqual(rollups.dashboard(7)['recent_revenue'], Decimal('200.00'))
+        self.assertMatchesRebuild()
+
+    def test_item_changes_and_deletion(self):
+        order = place_order(self.new_order(self.user), {self.variant.pk: 2})
+        item = OrderItem.objects.get(order=order)
+        item.quantity = 5
+        item.save()
+        self.assertEqual(self.rows(), {'pending_payment': (1, Decimal('200.00'), 5)})
+        self.assertMatchesRebuild()
+
+        order.delete()
+        self.assertEqual(self.rows(), {})
+        self.assertMatchesRebuild()
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class CategoryMenuTests(ShopTestCase):
+    def active_category(self, value):
+        request = RequestFactory().get('/', {'category': value})
+        return categories_and_settings(request)['active_category_id']
+
+    def test_menu_cache_key_accepts_only_existing_categories(self):
+        category = Category.objects.create(name='Гейнеры')
+        self.assertEqual(self.active_category(str(category.pk)), category.pk)
+        for value in ('', 'abc', '1 OR 1', str(category.pk + 1000)):
+            with self.subTest(value=value):
+                self.assertIsNone(self.active_category(value))
+
+    def test_active_category_does_not_load_the_menu(self):
+        category = Category.objects.create(name='Гейнеры')
+        request = RequestFactory().get('/', {'category': category.pk})
+        with mock.patch('sport_shop.context_processors.load_categories') as load:
+            context = categories_and_settings(request)
+        self.assertEqual(context['active_category_id'], category.pk)
+        load.assert_not_called()
+
+    def test_active_category_is_highlighted(self):
+        product, _ = self.make_product()
+        response = self.client.get(reverse('product_list'), {'category': product.category_id})
+        self.assertContains(response, f'?category={product.category_id}" class="active"')
+
+
+class MemoryCartStore:
+    def __init__(self, value=None):
+        self.value = value
+        self.saves = 0
+
+    def load(self):
+        return self.value
+
+    def save(self, value):
+        self.value = value
+        self.saves += 1
+
+
+@override_settings(CART_MAX_LINES=2, CART_MAX_QUANTITY=5)
+class CartStoreTests(ShopTestCase):
+    def test_parse_quantity_accepts_only_allowed_range(self):
+        self.assertEqual(parse_quantity('3'), 3)
+        self.assertEqual(parse_quantity(5), 5)
+        for value in ('0', '-1', '6', 'abc', '', None, '1.5'):
+            with self.subTest(value=value), self.assertRaises(CartError):
+                parse_quantity(value)
+
+    def test_add_caps_quantity_of_one_variant(self):
+        cart = Cart(MemoryCartStore())
+        cart.add(1, 3)
+        cart.add(1, 2)
+        with self.assertRaises(CartError):
+            cart.add(1, 1)
+        with self.assertRaises(CartError):
+            cart.set(1, 6)
+        self.assertEqual(cart.data, {1: 5})
+
+    def test_number_of_lines_is_capped(self):
+        store = MemoryCartStore()
+        cart = Cart(store)
+        cart.add(1)
+        cart.add(2)
+        with self.assertRaises(CartError):
+            cart.add(3)
+        with self.assertRaises(CartError):
+            cart.set(3, 1)
+        cart.add(2)
+        self.assertEqual(store.value, '1:1,2:2')
+
+    def test_damaged_stored_value_is_sanitized(self):
+        cart = Cart(MemoryCartStore('7:2,x:1,8:-3,9:0,10:500,11:1,12:1'))
+        self.assertEqual(cart.data, {7: 2, 10: 5})
+
+    def test_reading_does_not_write_store(self):
+        store = MemoryCartStore('1:1')
+        cart = Cart(store)
+        self.assertEqual(len(cart), 1)
+        self.assertEqual(store.saves, 0)
+
+    def test_removed_variants_are_dropped_from_lines(self):
+        _, variant = self.make_product(price='10.00')
+        store = MemoryCartStore(f'{variant.pk}:2,{variant.pk + 100}:1')
+        cart = Cart(store)
+        self.assertEqual([line['variant'].pk for line in cart.lines()], [variant.pk])
+        self.assertEqual(cart.total, Decimal('20.00'))
+        self.assertEqual(cart.dropped, 1)
+        self.assertEqual(store.value, f'{variant.pk}:2')
+
+    def test_cookie_is_bound_to_user(self):
+        factory = RequestFactory()
+        owner, other = self.make_user('owner'), self.make_user('other')
+        response = HttpResponse()
+        request = factory.get('/')
+        request.user = owner
+        store = CookieCartStore(request)
+        store.save('1:2')
+        store.apply(response)
+        signed = response.cookies[cart_module.COOKIE_NAME].value
+
+        request = factory.get('/', HTTP_COOKIE=f'{cart_module.COOKIE_NAME}={signed}')
+        request.user = owner
+        self.assertEqual(Cart(CookieCartStore(request)).data, {1: 2})
+        request.user = other
+        self.assertEqual(Cart(CookieCartStore(request)).data, {})
+        request = factory.get('/', HTTP_COOKIE=f'{cart_module.COOKIE_NAME}={signed.replace("1:2", "1:5")}')
+        request.user = owner
+        self.assertEqual(Cart(CookieCartStore(request)).data, {})
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], CART_STORE='cookie', CART_MAX_QUANTITY=5)
+class CartApiTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        _, self.variant = self.make_product(price='10.00')
+        self.client.force_login(self.make_user())
+
+    def post(self, name, **data):
+        return self.client.post(reverse(name), data)
+
+    def test_anonymous_user_gets_401(self):
+        self.client.logout()
+        response = self.post('cart_api_add', variant_id=self.variant.pk)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('login_url', response.json())
+
+    def test_add_update_remove(self):
+        response = self.post('cart_api_add', variant_id=self.variant.pk, quantity=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart']['total'], '20.00')
+
+        response = self.post('cart_api_update', variant_id=self.variant.pk, quantity=4)
+        self.assertEqual(response.json()['cart']['lines'][0]['quantity'], 4)
+
+        response = self.post('cart_api_remove', variant_id=self.variant.pk)
+        self.assertEqual(response.json()['cart']['count'], 0)
+
+    def test_invalid_input_gets_400(self):
+        for name, data in (
+            ('cart_api_add', {'variant_id': 'abc'}),
+            ('cart_api_add', {'variant_id': self.variant.pk, 'quantity': 0}),
+            ('cart_api_add', {'variant_id': self.variant.pk, 'quantity': 'много'}),
+            ('cart_api_add', {'variant_id': self.variant.pk, 'quantity': 6}),
+            ('cart_api_remove', {}),
+        ):
+            with self.subTest(name=name, data=data):
+                response = self.post(name, **data)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_quantity_cap_is_enforced_across_requests(self):
+        self.post('cart_api_add', variant_id=self.variant.pk, quantity=4)
+        response = self.post('cart_api_add', variant_id=self.variant.pk, quantity=2)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['cart']['lines'][0]['quantity'], 4)
+
+    def test_unknown_variant_gets_404(self):
+        response = self.post('cart_api_add', variant_id=self.variant.pk + 100)
+        self.assertEqual(response.status_code, 404)
+        response = self.post('cart_api_update', variant_id=self.variant.pk, quantity=1)
+        self.assertEqual(response.status_code, 404)
+
+    def test_only_post_is_allowed(self):
+        self.assertEqual(self.client.get(reverse('cart_api_add')).status_code, 405)
+
+
+@override_settings(TASKS_EAGER=True)
+class RenditionTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media()
+        self.product, _ = self.make_product()
+
+    def renditions(self, name):
+        return [images.rendition_name(name, preset, box, 'jpg')
+                for preset in ('card', 'thumb', 'large') for box in images.PRESETS[preset]['sizes']]
+
+    def test_picture_does_not_touch_storage(self):
+        image = ProductImage(product=self.product, image='products/a.jpg')
+        with mock.patch.object(default_storage, 'exists', side_effect=AssertionError('exists() вызван')):
+            self.assertTrue(images.picture(image.image, 'thumb').startswith('<img src='))
+            image.width, image.height = 40, 30
+            html = images.picture(image.image, 'large')
+        self.assertTrue(html.startswith('<picture>'))
+        self.assertIn('width="40" height="30"', html)
+
+    def test_replacing_file_resets_size_and_deletes_old_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.product, image=self.upload('first.jpg'))
+        image.refresh_from_db()
+        old_name = image.image.name
+        self.assertEqual((image.width, image.height), (40, 30))
+        self.assertTrue(all(default_storage.exists(name) for name in self.renditions(old_name)))
+        self.assertEqual(ProductStats.objects.get(pk=self.product.pk).main_image_width, 40)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = self.upload('second.jpg', size=(60, 20))
+            image.save()
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (60, 20))
+        self.assertFalse(any(default_storage.exists(name) for name in self.renditions(old_name)))
+        self.assertTrue(all(default_storage.exists(name) for name in self.renditions(image.image.name)))
+
+    def test_size_is_cleared_until_new_file_is_processed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.product, image=self.upload('first.jpg'))
+        image.refresh_from_db()
+        with mock.patch.object(images, 'schedule'):
+            image.image = self.upload('second.jpg')
+            image.save()
+        image.refresh_from_db()
+        self.assertIsNone(image.width)
+        self.assertTrue(images.picture(image.image, 'thumb').startswith('<img src='))
+
+
+task_calls = []
+
+
+def record_task(value):
+    task_calls.append(value)
+
+
+def failing_task():
+    raise RuntimeError('сбой')
+
+
+def permanent_failing_task():
+    raise tasks.PermanentError('повтор не поможет')
+
+
+@override_settings(TASKS_EAGER=False, TASKS_RETRY_DELAY=10, TASKS_RETRY_MAX_DELAY=30, TASKS_LOCK_TIMEOUT=600)
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        task_calls.clear()
+        # Ошибки задач ожидаемы: не засоряем вывод тестов трассировками
+        self.enterContext(mock.patch.object(tasks.logger, 'exception'))
+
+    def run_task(self, task):
+        """Взять задачу в работу, как воркер, и выполнить ее."""
+        self.assertEqual(tasks.claim(1), [task.pk])
+        result = tasks.execute(task.pk)
+        task.refresh_from_db()
+        return result
+
+    def make_ready(self, task):
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+
+    def test_success(self):
+        task = tasks.enqueue('sport_shop.tests.record_task', args=[1])
+        self.assertTrue(self.run_task(task))
+        self.assertEqual(task_calls, [1])
+        self.assertEqual(task.status, 'done')
+        self.assertIsNone(task.locked_at)
+        self.assertIsNotNone(task.finished_at)
+
+    def test_retries_with_exponential_backoff_then_fails(self):
+        task = tasks.enqueue('sport_shop.tests.failing_task', max_attempts=4)
+        expected_delays = [10, 20, 30]  # 10 * 2 ** (n - 1), не больше TASKS_RETRY_MAX_DELAY
+        for attempt, delay in enumerate(expected_delays, start=1):
+            started = timezone.now()
+            self.assertFalse(self.run_task(task))
+            self.assertEqual((task.status, task.attempts), ('pending', attempt))
+            self.assertIsNone(task.locked_at)
+            self.assertIn('RuntimeError', task.last_error)
+            wait = (task.run_at - started).total_seconds()
+            self.assertTrue(delay <= wait <= delay * 1.1 + 1, wait)
+            # До наступления run_at задачу не берут
+            self.assertEqual(tasks.claim(1), [])
+            self.make_ready(task)
+
+        self.assertFalse(self.run_task(task))
+        self.assertEqual((task.status, task.attempts), ('failed', 4))
+        self.assertIsNotNone(task.finished_at)
+
+    def test_permanent_error_is_not_retried(self):
+        task = tasks.enqueue('sport_shop.tests.permanent_failing_task', max_attempts=5)
+        self.assertFalse(self.run_task(task))
+        self.assertEqual((task.status, task.attempts), ('failed', 1))
+
+    def test_pending_task_with_same_key_is_reused(self):
+        first = tasks.enqueue('sport_shop.tests.record_task', args=[1], key='same')
+        self.assertEqual(tasks.enqueue('sport_shop.tests.record_task', args=[2], key='same'), first)
+        self.run_task(first)
+        self.assertNotEqual(tasks.enqueue('sport_shop.tests.record_task', args=[3], key='same'), first)
+
+    def test_heartbeat_keeps_long_task_from_being_requeued(self):
+        long_running = tasks.enqueue('sport_shop.tests.record_task', args=[1])
+        abandoned = tasks.enqueue('sport_shop.tests.record_task', args=[2])
+        self.assertEqual(len(tasks.claim(2)), 2)
+        Task.objects.update(locked_at=timezone.now() - timedelta(seconds=900))
+
+        tasks.heartbeat([long_running.pk])
+        tasks.requeue_stale()
+        long_running.refresh_from_db()
+        abandoned.refresh_from_db()
+        self.assertEqual(long_running.status, 'running')
+        self.assertEqual(abandoned.status, 'pending')
+
+
+@override_settings(TASKS_EAGER=True)
+class EagerTaskTests(TestCase):
+    def setUp(self):
+        task_calls.clear()
+        # Ошибки задач ожидаемы: не засоряем вывод тестов трассировками
+        self.enterContext(mock.patch.object(tasks.logger, 'exception'))
+
+    def test_task_runs_after_commit_and_leaves_no_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue('sport_shop.tests.record_task', args=[1])
+            self.assertEqual(task_calls, [])
+        self.assertEqual(task_calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_task_is_kept_without_retries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue('sport_shop.tests.failing_task', max_attempts=5)
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), ('failed', 1))
+
+
+@override_settings(
+    ALLOWED_HOSTS=['testserver'], TASKS_EAGER=True,
+    YOOKASSA={'ENDPOINT': 'http://yookassa.invalid/v3', 'WEBHOOK_IPS': ['185.71.76.0/27'],
+              'TRUSTED_PROXIES': ['10.0.0.0/8']},
+)
+class PaymentWebhookTests(ShopTestCase):
+    def setUp(self):
+        super().setUp()
+        method = PaymentMethod.objects.create(name='ЮKassa', description='Онлайн', shop_id='1', secret_key='secret')
+        self.order = self.new_order(self.make_user(), total_price=Decimal('100.00'), payment_method=method, payment_id='pay-1')
+        self.order.save()
+        self.get_payment = self.enterContext(mock.patch.object(payment_gateway.YooKassaClient, 'get_payment'))
+        self.get_payment.return_value = self.payment('succeeded')
+
+    def payment(self, status, value='100.00'):
+        return {'id': 'pay-1', 'status': status, 'amount': {'value': value, 'currency': 'RUB'}}
+
+    def notify(self, event='payment.succeeded', ip='185.71.76.10', **headers):
+        body = {'type': 'notification', 'event': event, 'object': {'id': 'pay-1', 'status': 'succeeded'}}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('yookassa_webhook'), json.dumps(body),
+                                    content_type='application/json', REMOTE_ADDR=ip, **headers)
+
+    def order_status(self):
+        self.order.refresh_from_db()
+        return self.order.status
+
+    def test_confirmed_payment_marks_order_paid(self):
+        self.assertEqual(self.notify().status_code, 200)
+        self.assertEqual(self.order_status(), 'processing')
+        self.get_payment.assert_called_once_with('pay-1')
+
+    def test_repeated_delivery_is_processed_once(self):
+        self.notify()
+        self.assertEqual(self.notify().status_code, 200)
+        self.assertEqual(PaymentNotification.objects.filter(payment_id='pay-1', event='payment.succeeded').count(), 1)
+        self.assertEqual(self.get_payment.call_count, 1)
+
+    def test_amount_mismatch_is_rejected(self):
+        self.get_payment.return_value = self.payment('succeeded', value='1.00')
+        with self.assertLogs('sport_shop.payments', 'ERROR'):
+            self.notify()
+        self.assertEqual(self.order_status(), 'pending_payment')
+
+    def test_event_not_confirmed_by_api_is_discarded(self):
+        self.get_payment.return_value = self.payment('pending')
+        with self.assertLogs('sport_shop.payments', 'WARNING'):
+            self.notify()
+        self.assertEqual(self.order_status(), 'pending_payment')
+        # Запись удалена: настоящее уведомление не будет принято за повтор
+        self.assertFalse(PaymentNotification.objects.exists())
+
+    def test_sender_behind_trusted_proxy_is_taken_from_forwarded_header(self):
+        self.assertEqual(self.notify(ip='10.0.0.2', HTTP_X_FORWARDED_FOR='185.71.76.10').status_code, 200)
+        self.assertEqual(self.order_status(), 'processing')
+
+    def test_forwarded_header_is_trusted_only_from_proxies(self):
+        # Заголовок от непроверенного адреса и подставленный клиентом левый элемент игнорируются
+        self.assertEqual(self.notify(ip='203.0.113.5', HTTP_X_FORWARDED_FOR='185.71.76.10').status_code, 403)
+        self.assertEqual(self.notify(ip='10.0.0.2', HTTP_X_FORWARDED_FOR='185.71.76.10, 203.0.113.5').status_code, 403)
+        self.assertEqual(self.notify(ip='10.0.0.2').status_code, 403)
+        self.assertEqual(self.order_status(), 'pending_payment')
+
+        request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='198.51.100.1, 185.71.76.10, 10.0.0.3')
+        self.assertEqual(payments.webhook_client_ip(request), '185.71.76.10')
+
+    def test_unknown_sender_and_malformed_body_are_rejected(self):
+        self.assertEqual(self.notify(ip='203.0.113.5').status_code, 403)
+        self.assertEqual(self.notify(event='refund.succeeded').status_code, 400)
+        self.assertFalse(PaymentNotification.objects.exists())
+        self.assertEqual(self.order_status(), 'pending_payment')
@@ -6,9 +6,14 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('products/', views.product_list, name='product_list'),
+    path('api/suggest/', views.suggest, name='suggest'),
     path('product/<int:pk>/', views.product_detail, name='product_detail'),
     path('cart/', views.cart, name='cart'),
     path('add-to-cart/', views.add_to_cart, name='add_to_cart'),
+    path('api/cart/', views.cart_api_summary, name='cart_api_summary'),
+    path('api/cart/add/', views.cart_api_add, name='cart_api_add'),
+    path('api/cart/update/', views.cart_api_update, name='cart_api_update'),
+    path('api/cart/remove/', views.cart_api_remove, name='cart_api_remove'),
     path('checkout/', views.checkout, name='checkout'),
     path('order-confirmation/<int:order_id>/', views.order_confirmation, name='order_confirmation'),
     path('profile/', views.profile, name='profile'),
@@ -16,7 +21,9 @@ urlpatterns = [
     path('signup/', views.signup, name='signup'),
     path('login/', views.CustomLoginView.as_view(), name='login'),
     path('logout/', views.logout_view, name='logout'),
+    path('payment/<int:order_id>/', views.order_payment, name='order_payment'),
     path('payment-success/<int:order_id>/', views.payment_success, name='payment_success'),
+    path('api/payments/yookassa/webhook/', views.yookassa_webhook, name='yookassa_webhook'),
     path('payment-by-requisites/<int:order_id>/', views.payment_by_requisites, name='payment_by_requisites'),
     path('confirm-payment/<int:order_id>/', views.confirm_payment, name='confirm_payment'),
     path('add-review/<int:product_id>/', views.add_review, name='add_review'),
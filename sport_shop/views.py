@@ -2,17 +2,22 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout, update_session_auth_hash
 from django.contrib import messages
-from django.db.models import Count, Q, Min, Avg, F, ExpressionWrapper, FloatField, Max
+from django.db.models import Count, Q, Min, Avg, F, ExpressionWrapper, FloatField, Max, Exists, OuterRef, Case, When, IntegerField
 from django.db.models.functions import Coalesce
-from .models import Product, Category, ProductVariant, Order, OrderItem, PaymentMethod, UserProfile, Review, Discount
+from .models import Product, Category, ProductVariant, Order, OrderItem, PaymentMethod, UserProfile, Review, Discount, ProductStats
 from django.contrib.auth.models import User, Group
+from . import cache_backends, facets, page_cache, payments, popularity, pricing, rollups, search, tasks
+from . import suggest as suggest_index
+from .cart import CartError, get_cart, max_quantity, parse_quantity
+from .orders import OrderError, place_order
 from .forms import UserProfileForm, OrderForm, SignUpForm, ReviewForm, UserNameForm
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from decimal import Decimal
-from yookassa import Configuration, Payment
-import uuid
+from functools import wraps
 from django.conf import settings
 from django.http import JsonResponse
+from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.contrib.auth.password_validation import validate_password
 from django.contrib.auth.views import LoginView
@@ -20,27 +25,37 @@ from .forms import LoginForm
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib.admin.views.decorators import staff_member_required
 from django.http import Http404
+import json
 import re
 
+def listing_pages(request):
+    """Зависимости кэша страниц каталога: категория или общий список (см. page_cache.py)."""
+    category_id = request.GET.get('category', '')
+    if category_id.isdigit():
+        return [page_cache.category(category_id)]
+    return [page_cache.LISTING]
+
+
+def product_pages(request, pk):
+    category_id = Product.objects.filter(pk=pk).values_list('category_id', flat=True).first()
+    return [page_cache.product(pk), page_cache.category(category_id)]
+
+
+@page_cache.cache_anonymous_page(lambda request: [page_cache.LISTING])
 def home(request):
-    # Выбираем топ 50 товаров по количеству звезд и заказов
-    popular_products = Product.objects.annotate(
-        avg_rating=Coalesce(Avg('reviews__rating'), 0.0),
-        order_count=Count('variants__orderitems'),
-        popularity_score=ExpressionWrapper(
-            F('avg_rating') * F('order_count'),
-            output_field=FloatField()
-        )
-    ).order_by('-popularity_score')[:50]
+    # Топ товаров по популярности (рейтинг * заказы с затуханием), см. popularity.py
+    popular_products = popularity.top_products()
     
     return render(request, 'nut_shop/home.html', {'products': popular_products})
 
+@page_cache.cache_anonymous_page(listing_pages)
 def product_list(request):
     # Примечание: categories уже доступны через context_processors,
     # но загружаем их здесь для явного использования в шаблоне
     categories = Category.objects.all()
     query = request.GET.get('query')
-    sort_by = request.GET.get('sort_by', 'name')
+    # При поиске по умолчанию сортируем по релевантности
+    sort_by = request.GET.get('sort_by', 'relevance' if query else 'name')
     min_price = request.GET.get('min_price')
     max_price = request.GET.get('max_price')
     min_rating = request.GET.get('min_rating')
@@ -48,13 +63,14 @@ def product_list(request):
     max_weight = request.GET.get('max_weight')
     category_id = request.GET.get('category')
     current_category = None
+    found_ids = None
+    search_truncated = False
 
     # Инициализируем products здесь
-    products = Product.objects.all()
+    products = Product.objects.with_card_data()
 
     if category_id:
         current_category = get_object_or_404(Category, id=category_id)
-        products = products.filter(category=current_category)
     
     if query:
         # Проверяем, есть ли в запросе тег id
@@ -64,42 +80,55 @@ def product_list(request):
             product_id = id_match.group(1)
             products = products.filter(id=product_id)
         else:
-            # Если нет, используем обычный поиск
-            products = products.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(category__name__icontains=query) |
-                Q(variants__weight__icontains=query) |
-                Q(variants__price__icontains=query)
-            ).distinct()
-    
-    # Аннотации для сортировки и фильтрации
+            # Если нет, используем полнотекстовый индекс (см. search.py)
+            found_ids, search_truncated = search.search_products(query)
+            products = products.filter(pk__in=found_ids)
+    
+    # Аннотации для сортировки и фильтрации (из денормализованной таблицы ProductStats);
+    # цена - минимальная цена со скидкой (см. pricing.py)
     products = products.annotate(
-        min_price=Min('variants__price'),
-        avg_rating=Avg('reviews__rating'),
-        order_count=Count('variants__orderitems')
+        min_price=F('stats__min_effective_price'),
+        avg_rating=F('stats__avg_rating'),
+        order_count=F('stats__order_count')
     )
     
     if min_price:
         products = products.filter(min_price__gte=min_price)
     if max_price:
         products = products.filter(min_price__lte=max_price)
+    if min_weight or max_weight:
+        # Оба ограничения должны выполняться для одного и того же варианта
+        variants_in_range = ProductVariant.objects.filter(product=OuterRef('pk'))
+        if min_weight:
+            variants_in_range = variants_in_range.filter(weight__gte=min_weight)
+        if max_weight:
+            variants_in_range = variants_in_range.filter(weight__lte=max_weight)
+        products = products.filter(Exists(variants_in_range))
+
+    # Счетчики фасетов считаются без фильтров категории и рейтинга (см. facets.py)
+    facet_counts = facets.get_counts(products, request.GET)
+    if current_category:
+        products = products.filter(category=current_category)
     if min_rating:
         products = products.filter(avg_rating__gte=min_rating)
-    if min_weight:
-        products = products.filter(variants__weight__gte=min_weight)
-    if max_weight:
-        products = products.filter(variants__weight__lte=max_weight)
-    
-    # Сортировка
-    if sort_by == 'name':
-        products = products.order_by('name')
+    
+    # Сортировка; pk в конце - устойчивый порядок страниц при равных значениях
+    if sort_by == 'relevance' and found_ids:
+        products = products.order_by(Case(
+            *[When(pk=product_id, then=position) for position, product_id in enumerate(found_ids)],
+            output_field=IntegerField()
+        ), 'pk')
+    elif sort_by == 'name':
+        products = products.order_by('name', 'pk')
     elif sort_by == 'price_asc':
-        products = products.order_by('min_price')
+        products = products.order_by(F('min_price').asc(nulls_last=True), 'pk')
     elif sort_by == 'price_desc':
-        products = products.order_by('-min_price')
+        products = products.order_by(F('min_price').desc(nulls_last=True), 'pk')
     elif sort_by == 'popularity':
-        products = products.order_by('-order_count', '-avg_rating')
+        products = products.order_by('-order_count', '-avg_rating', 'pk')
+    else:
+        # Поиск без результатов, поиск по id или неизвестная сортировка
+        products = products.order_by('-pk')
     
     # Пагинация
     page = request.GET.get('page', 1)
@@ -111,19 +140,31 @@ def product_list(request):
     except EmptyPage:
         products = paginator.page(paginator.num_pages)
     
-    # Получаем минимальные и максимальные значения цены и веса
-    price_range = Product.objects.aggregate(min_price=Min('variants__price'), max_price=Max('variants__price'))
-    weight_range = ProductVariant.objects.aggregate(min_weight=Min('weight'), max_weight=Max('weight'))
+    # Границы цены и веса для категории или всего каталога (из кэша, см. facets.py)
+    ranges = facets.get_ranges(category_id)
+    price_range = {'min_price': ranges['min_price'], 'max_price': ranges['max_price']}
+    weight_range = {'min_weight': ranges['min_weight'], 'max_weight': ranges['max_weight']}
 
     min_price = request.GET.get('min_price', price_range['min_price'])
     max_price = request.GET.get('max_price', price_range['max_price'])
     min_weight = request.GET.get('min_weight', weight_range['min_weight'])
     max_weight = request.GET.get('max_weight', weight_range['max_weight'])
 
+    category_facets = [
+        {'id': category.id, 'name': category.name, 'count': facet_counts['categories'].get(category.id, 0)}
+        for category in categories
+    ]
+    rating_facets = [
+        {'value': str(bucket), 'count': facet_counts['ratings'][str(bucket)]}
+        for bucket in facets.RATING_BUCKETS
+    ]
+
     context = {
         'products': products,
         'categories': categories,
         'query': query,
+        'search_truncated': search_truncated,
+        'search_limit': search.MAX_RESULTS,
         'sort_by': sort_by,
         'min_price': min_price,
         'max_price': max_price,
@@ -132,14 +173,33 @@ def product_list(request):
         'max_weight': max_weight,
         'price_range': price_range,
         'weight_range': weight_range,
+        'category_facets': category_facets,
+        'rating_facets': rating_facets,
         'category_id': category_id,
         'current_category': current_category,  # Добавляем текущую категорию в контекст
     }
     return render(request, 'nut_shop/product_list.html', context)
 
+def suggest(request):
+    """Подсказки для строки поиска: отвечает из индекса в памяти, без запросов к базе."""
+    query = request.GET.get('q', '')
+    results = suggest_index.suggest(query) if len(query.strip()) >= 2 else []
+    product_list_url = reverse('product_list')
+    for item in results:
+        if item['type'] == 'category':
+            item['url'] = f"{product_list_url}?category={item['id']}"
+        else:
+            item['url'] = reverse('product_detail', args=[item['id']])
+    return JsonResponse({'query': query, 'results': results})
+
+@page_cache.cache_anonymous_page(product_pages)
 def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-    reviews = product.reviews.all().order_by('-created_at')
+    product = get_object_or_404(Product.objects.with_card_data(), pk=pk)
+    variants = list(product.variants.all())
+    for variant in variants:
+        variant.product = product
+        variant.effective_price = pricing.effective_price(variant)
+    reviews = product.reviews.select_related('user__userprofile').order_by('-created_at')
     user_can_review = False
     user_orders = []
 
@@ -153,7 +213,7 @@ def product_detail(request, pk):
         user_can_review = user_orders.exists() and not Review.objects.filter(user=request.user, product=product).exists()
 
     # Получаем рекомендованные товары (максимум 15)
-    recommended_products = Product.objects.filter(category=product.category).exclude(id=product.id)[:15]
+    recommended_products = Product.objects.with_card_data().filter(category=product.category).exclude(id=product.id)[:15]
 
     if request.method == 'POST' and user_can_review:
         form = ReviewForm(request.POST)
@@ -169,6 +229,8 @@ def product_detail(request, pk):
 
     context = {
         'product': product,
+        'images': list(product.images.all()),
+        'variants': variants,
         'reviews': reviews,
         'form': form,
         'user_can_review': user_can_review,
@@ -181,104 +243,183 @@ def product_detail(request, pk):
 def add_to_cart(request):
     if request.method == 'POST':
         variant_id = request.POST.get('variant_id')
-        quantity = int(request.POST.get('quantity', 1))  # Получаем количество из формы
-        variant = get_object_or_404(ProductVariant, id=variant_id)
-        cart = request.session.get('cart', {})
-        cart[variant_id] = cart.get(variant_id, 0) + quantity  # Добавляем выбранное количество
-        request.session['cart'] = cart
+        variant = get_object_or_404(ProductVariant.objects.select_related('product'), id=variant_id)
+        try:
+            quantity = parse_quantity(request.POST.get('quantity', 1))  # Получаем количество из формы
+            get_cart(request).add(variant.id, quantity)  # Добавляем выбранное количество
+        except CartError as e:
+            messages.error(request, str(e))
+            return redirect('product_detail', pk=variant.product_id)
         messages.success(request, f"{variant.product.name} ({variant.weight}г) - {quantity} шт. добавлено в корзину.")
+        return redirect('product_detail', pk=variant.product_id)
     return redirect('product_list')
 
 @login_required
 def cart(request):
-    cart = request.session.get('cart', {})
+    cart = get_cart(request)
     
     if request.method == 'POST':
-        variant_id = request.POST.get('remove_variant')
-        if variant_id:
-            del cart[variant_id]
-            request.session['cart'] = cart
+        # Те же формы без JavaScript; с ним они отправляются в JSON API (static/js/cart.js)
+        action = request.POST.get('action')
+        variant_id = request.POST.get('variant_id', '')
+        if action == 'remove' and variant_id:
+            cart.remove(variant_id)
             messages.success(request, "Товар удален из корзины.")
             return redirect('cart')
+        if action == 'update' and variant_id.isdigit():
+            try:
+                cart.set(variant_id, parse_quantity(request.POST.get('quantity')))
+            except CartError as e:
+                messages.error(request, str(e))
+            return redirect('cart')
     
-    items = []
-    total = 0
-    for variant_id, quantity in cart.items():
-        variant = get_object_or_404(ProductVariant, id=variant_id)
-        item_total = variant.price * quantity
-        items.append({
-            'variant': variant,
-            'quantity': quantity,
-            'item_total': item_total
-        })
-        total += item_total
-    return render(request, 'nut_shop/cart.html', {'items': items, 'total': total})
+    items = cart.lines()
+    if cart.dropped:
+        messages.warning(request, "Некоторые товары больше недоступны и были удалены из корзины.")
+    return render(request, 'nut_shop/cart.html', {'items': items, 'total': cart.total, 'max_quantity': max_quantity()})
+
+def cart_api(view_func):
+    """Декоратор JSON API корзины: только для авторизованных, ошибки корзины - 400."""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Войдите, чтобы пользоваться корзиной.', 'login_url': reverse('login')}, status=401)
+        try:
+            return view_func(request, *args, **kwargs)
+        except CartError as e:
+            return JsonResponse({'error': str(e), 'cart': get_cart(request).summary()}, status=400)
+    return wrapper
+
+
+def _cart_variant(request):
+    variant_id = request.POST.get('variant_id', '')
+    if not variant_id.isdigit():
+        raise CartError('Не выбран товар.')
+    return variant_id
+
+
+@require_http_methods(["GET"])
+@cart_api
+def cart_api_summary(request):
+    return JsonResponse({'cart': get_cart(request).summary()})
+
+
+@require_http_methods(["POST"])
+@cart_api
+def cart_api_add(request):
+    variant = ProductVariant.objects.select_related('product').filter(pk=_cart_variant(request)).first()
+    if variant is None:
+        return JsonResponse({'error': 'Товар не найден.'}, status=404)
+    quantity = parse_quantity(request.POST.get('quantity', 1))
+    cart = get_cart(request)
+    cart.add(variant.pk, quantity)
+    return JsonResponse({
+        'message': f"{variant.product.name} ({variant.weight}г) - {quantity} шт. добавлено в корзину.",
+        'cart': cart.summary(),
+    })
+
+
+@require_http_methods(["POST"])
+@cart_api
+def cart_api_update(request):
+    variant_id = _cart_variant(request)
+    cart = get_cart(request)
+    if int(variant_id) not in cart.data:
+        return JsonResponse({'error': 'Товара нет в корзине.', 'cart': cart.summary()}, status=404)
+    cart.set(variant_id, parse_quantity(request.POST.get('quantity')))
+    return JsonResponse({'cart': cart.summary()})
+
+
+@require_http_methods(["POST"])
+@cart_api
+def cart_api_remove(request):
+    cart = get_cart(request)
+    cart.remove(_cart_variant(request))
+    return JsonResponse({'message': "Товар удален из корзины.", 'cart': cart.summary()})
 
 @login_required
 def checkout(request):
+    cart = get_cart(request)
     if request.method == 'POST':
         form = OrderForm(request.POST)
         if form.is_valid():
             order = form.save(commit=False)
             order.user = request.user
-            cart = request.session.get('cart', {})
-            total_price = Decimal('0')
-            
-            for variant_id, quantity in cart.items():
-                variant = get_object_or_404(ProductVariant, id=variant_id)
-                total_price += variant.price * Decimal(quantity)
-            
-            order.total_price = total_price
             order.status = 'pending_payment'
             order.is_completed = False
-            order.save()
-
-            for variant_id, quantity in cart.items():
-                variant = get_object_or_404(ProductVariant, id=variant_id)
-                OrderItem.objects.create(
-                    order=order,
-                    product_variant=variant,
-                    quantity=quantity,
-                    price=variant.price
-                )
+            try:
+                place_order(order, cart.data)
+            except OrderError as e:
+                messages.error(request, str(e))
+                return redirect('cart')
             
             payment_method = order.payment_method
             if payment_method.name == "По реквизитам":
                 return redirect('payment_by_requisites', order_id=order.id)
             elif payment_method.name == "ЮKassa":
-                payment_url = create_payment(order, payment_method)
-                if payment_url:
-                    return redirect(payment_url)
-                else:
-                    messages.error(request, "Ошибка при создан��и платежа. Пожалуйста, попробуйте позже.")
-                    return redirect('cart')
+                payments.start_payment(order)
+                return redirect('order_payment', order_id=order.id)
             
             else:
                 # Для других методов оплаты
-                request.session['cart'] = {}
+                cart.clear()
                 messages.success(request, "Заказ успешно оформлен.")
                 return redirect('order_confirmation', order_id=order.id)
     else:
         form = OrderForm()
     
-    cart = request.session.get('cart', {})
-    total_price = Decimal('0')
-    for variant_id, quantity in cart.items():
-        variant = get_object_or_404(ProductVariant, id=variant_id)
-        total_price += variant.price * Decimal(quantity)
-    
-    return render(request, 'nut_shop/checkout.html', {'form': form, 'total_price': total_price})
+    return render(request, 'nut_shop/checkout.html', {'form': form, 'items': cart.lines(), 'total_price': cart.total})
+
 
+@login_required
+def order_payment(request, order_id):
+    """Ожидание ссылки на оплату ЮKassa, которую создает фоновая задача."""
+    order = get_object_or_404(Order.objects.select_related('payment_method'), id=order_id, user=request.user)
+    if order.status != 'pending_payment':
+        messages.error(request, "Этот заказ уже оплачен или отменен.")
+        return redirect('order_history')
+    if order.payment_url:
+        return redirect(order.payment_url)
+
+    task = tasks.latest(payments.task_key(order.id))
+    if task is None or task.status == 'done':
+        # Платежа еще не было или прежний платеж отменен
+        task = payments.start_payment(order)
+        order.refresh_from_db()
+        if order.payment_url:
+            return redirect(order.payment_url)
+    if task.status == 'failed':
+        messages.error(request, "Ошибка при создании платежа. Пожалуйста, попробуйте позже.")
+        return redirect('cart')
+    return render(request, 'nut_shop/payment_pending.html', {'order': order})
 
 @login_required
 def payment_success(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
-    order.status = 'processing'
-    order.save()
-    request.session['cart'] = {}  # Очищаем корзину после успешной оплаты
-    messages.success(request, "Оплата прошла успешно. Ваш заказ обрабатывается.")
+    get_cart(request).clear()  # Очищаем корзину после возврата с оплаты
+    if order.status == 'pending_payment' and order.payment_id:
+        # Возврат на эту страницу не подтверждает оплату: сверяем платеж с ЮKassa
+        tasks.enqueue('sport_shop.payments.sync_payment', args=[order.id], key=f'payment-sync:{order.id}')
+        order.refresh_from_db()
+    if order.status == 'pending_payment':
+        messages.info(request, "Оплата проверяется. Статус заказа обновится, как только ЮKassa подтвердит платеж.")
+    else:
+        messages.success(request, "Оплата прошла успешно. Ваш заказ обрабатывается.")
     return render(request, 'nut_shop/payment_success.html', {'order': order})
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def yookassa_webhook(request):
+    """Уведомления ЮKassa о платежах (см. payments.py)."""
+    if not payments.webhook_ip_allowed(payments.webhook_client_ip(request)):
+        return JsonResponse({'error': 'forbidden'}, status=403)
+    try:
+        payments.receive_notification(json.loads(request.body))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    # 200 и для повторной доставки, иначе ЮKassa будет повторять уведомление
+    return JsonResponse({'status': 'ok'})
+
 @login_required
 def order_confirmation(request, order_id):
     order = get_object_or_404(
@@ -374,43 +515,12 @@ def payment_by_requisites(request, order_id):
 def confirm_payment(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     if order.status == 'pending_payment':
-        order.status = 'processing'
-        order.save()
-        messages.success(request, "Оплата подтверждена. Ваш заказ обрабатывается.")
+        # Поступление оплаты проверяет магазин и меняет статус в панели управления
+        messages.success(request, "Спасибо! Заказ будет передан в обработку, как только оплата поступит на счет.")
     else:
         messages.error(request, "Невозможно подтвердить оплату для этого заказа.")
     return redirect('order_history')
 
-def create_payment(order, payment_method):
-    if not payment_method.shop_id or not payment_method.secret_key:
-        print(f"Ошибка: отсутствует shop_id или secret_key для метода оплаты {payment_method.name}")
-        return None
-
-    Configuration.account_id = payment_method.shop_id
-    Configuration.secret_key = payment_method.secret_key
-
-    try:
-        payment = Payment.create({
-            "amount": {
-                "value": str(order.total_price),
-                "currency": "RUB"
-            },
-            "confirmation": {
-                "type": "redirect",
-                "return_url": f"{settings.SITE_DOMAIN}/payment-success/{order.id}/"
-            },
-            "capture": True,
-            "description": f"Оплата заказа №{order.id} в Орех Маркет",
-            "metadata": {
-                "order_id": order.id
-            }
-        }, uuid.uuid4())
-
-        return payment.confirmation.confirmation_url
-    except Exception as e:
-        print(f"Ошибка при созданииии платежа: {e}")
-        return None
-
 @login_required
 def add_review(request, product_id):
     product = get_object_or_404(Product, pk=product_id)
@@ -465,40 +575,31 @@ def panel_access_required(view_func):
     return wrapper
 
 
+@panel_access_required
+def panel_cache_stats(request):
+    """Счетчики кэша по пространствам имен (JSON)."""
+    if request.method == 'POST':
+        cache_backends.reset_metrics()
+    return JsonResponse({'backend': settings.CACHE_BACKEND, 'namespaces': cache_backends.get_metrics()})
+
+
 @panel_access_required
 def panel_dashboard(request):
-    """Главная страница панели управления."""
-    from django.db.models import Count, Sum
-    from datetime import datetime, timedelta
-    
-    # Статистика
-    total_products = Product.objects.count()
-    total_orders = Order.objects.count()
-    total_users = User.objects.filter(is_staff=False).count()
-    
-    # Заказы за последние 7 дней
-    week_ago = datetime.now() - timedelta(days=7)
-    recent_orders = Order.objects.filter(created_at__gte=week_ago).count()
-    recent_revenue = Order.objects.filter(
-        created_at__gte=week_ago,
-        status__in=['delivered', 'shipped']
-    ).aggregate(Sum('total_price'))['total_price__sum'] or 0
-    
-    # Заказы по статусам
-    orders_by_status = Order.objects.values('status').annotate(count=Count('id'))
-    
-    # Последние заказы
-    latest_orders = Order.objects.select_related('user').order_by('-created_at')[:10]
-    
-    context = {
-        'total_products': total_products,
-        'total_orders': total_orders,
-        'total_users': total_users,
-        'recent_orders': recent_orders,
-        'recent_revenue': recent_revenue,
-        'orders_by_status': orders_by_status,
-        'latest_orders': latest_orders,
-    }
+    """Главная страница панели управления (показатели из дневных сводок, см. rollups.py)."""
+    try:
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        days = 7
+    if days not in rollups.PERIODS:
+        days = 7
+
+    context = rollups.dashboard(days)
+    context.update({
+        'total_products': Product.objects.count(),
+        'latest_orders': Order.objects.select_related('user').order_by('-created_at')[:10],
+        'days': days,
+        'periods': rollups.PERIODS,
+    })
     return render(request, 'panel/dashboard.html', context)
 
 
@@ -509,7 +610,7 @@ def panel_dashboard(request):
 @panel_access_required
 def panel_products(request):
     """Список товаров."""
-    products = Product.objects.select_related('category').prefetch_related('variants', 'images').all()
+    products = Product.objects.with_card_data().prefetch_related('variants', 'images')
     
     # Поиск
     search_query = request.GET.get('search', '')